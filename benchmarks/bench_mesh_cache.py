@@ -0,0 +1,53 @@
+"""cold vs warm mesh loading through core.mesh_cache
+
+run from the repository root:
+
+> python3 -m benchmarks.bench_mesh_cache models/donut.obj
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from core.mesh_cache import MeshCache
+from core.utils import load_obj_arrays
+from benchmarks.bench_parse_obj import synthetic_obj
+
+
+def timed_load(cache: MeshCache, path: str) -> float:
+    start = time.perf_counter()
+    arrays = cache.load(path, load_obj_arrays)
+    for array in arrays.values():
+        array.sum()  # touch the mapped pages like an upload would
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "paths", nargs="*", default=[os.path.join("models", "donut.obj")]
+    )
+    parser.add_argument("--faces", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic = os.path.join(directory, "synthetic.obj")
+        with open(synthetic, "wb") as f:
+            f.write(synthetic_obj(args.faces))
+
+        cache = MeshCache(os.path.join(directory, "cache"))
+        for path in [*args.paths, synthetic]:
+            cold = []
+            for _ in range(args.repeat):
+                cache.clear()
+                cold.append(timed_load(cache, path))
+            warm = [timed_load(cache, path) for _ in range(args.repeat)]
+            print(
+                f"{os.path.basename(path):>16}: cold {min(cold) * 1000:9.1f} ms"
+                f"  warm {min(warm) * 1000:9.1f} ms  x{min(cold) / min(warm):.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
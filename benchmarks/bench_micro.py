@@ -0,0 +1,272 @@
+"""micro benchmarks of the engine hot paths: obj loading, transforms and uploads
+
+the GL cases run on a headless context (see core.headless), --no-gl skips
+them. Run from the repository root:
+
+> python3 -m benchmarks.bench_micro --save micro.json
+> python3 -m benchmarks.bench_micro --baseline micro.json
+"""
+
+import core.headless  # selects the PyOpenGL platform before OpenGL is imported
+import argparse
+import io
+import os
+import time
+from typing import Callable
+import numpy as np
+import pygame
+from OpenGL.GL import *
+import core.transformations as transform
+from core import light_clusters, normals
+from core.camera import Camera
+from core.graphics_data import GraphicsDataInterleaved, VertexLayout
+from core.mesh import InstancedMesh, default_mesh_cache
+from core.shader import Shader
+from core.transform_component import Transform
+from core.uniform import UniformMat3, UniformMat4, UniformSampler2D
+from core.uniform_buffer import (
+    FRAME_DATA_BINDING,
+    FRAME_DATA_DTYPE,
+    LIGHT_DATA_BINDING,
+    LIGHT_DATA_DTYPE,
+    UniformBuffer,
+)
+from core.utils import form_vertices, index_vertices, load_obj_arrays, parse_obj
+from benchmarks import results
+from benchmarks.bench_parse_obj import synthetic_obj
+
+
+def timed(func: Callable[[], object], min_time: float, repeat: int) -> dict:
+    """per call microseconds, calls are batched so one batch takes min_time"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 24:
+            break
+        number *= max(2, min(int(min_time / max(elapsed, 1e-9)), 10))
+    batches = [elapsed]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        batches.append(time.perf_counter() - start)
+    per_call = np.array(batches) / number * 1e6
+    return {
+        "median_us": float(np.median(per_call)),
+        "min_us": float(per_call.min()),
+        "number": number,
+    }
+
+
+def obj_cases(faces: int) -> dict[str, Callable[[], object]]:
+    with open(os.path.join("models", "donut.obj"), "rb") as f:
+        donut = f.read()
+    synthetic = synthetic_obj(faces)
+    coordinates, _, _, triangles, textures_ids, normals_ids = parse_obj(synthetic)
+    first_corners, _ = index_vertices(triangles, textures_ids, normals_ids)
+    arrays = load_obj_arrays(synthetic)
+    return {
+        "parse_obj donut": lambda: parse_obj(io.BytesIO(donut)),
+        f"parse_obj {faces} faces": lambda: parse_obj(io.BytesIO(synthetic)),
+        f"form_vertices {faces} faces": lambda: form_vertices(coordinates, triangles),
+        f"index_vertices {faces} faces": lambda: index_vertices(
+            triangles, textures_ids, normals_ids
+        ),
+        f"form_vertices indexed {faces} faces": lambda: form_vertices(
+            coordinates, triangles[first_corners]
+        ),
+        f"load_obj_arrays {faces} faces": lambda: load_obj_arrays(synthetic),
+        f"smooth_normals {faces} faces": lambda: normals.smooth_normals(
+            coordinates, triangles
+        ),
+        f"flat_normals {faces} faces": lambda: normals.flat_normals(
+            coordinates, triangles
+        ),
+        f"vertex_tangents {faces} faces": lambda: normals.vertex_tangents(
+            arrays["vertices"],
+            arrays["vertex_normals"],
+            arrays["vertex_textures"],
+            arrays["indices"],
+        ),
+    }
+
+
+def transform_cases() -> dict[str, Callable[[], object]]:
+    vector = pygame.Vector3(1, 2, 3)
+    axis = pygame.Vector3(0.5, 1, 0.5)
+    matrix = transform.identity_matrix()
+    moving = Transform(vector, transform.Rotation(30, axis), pygame.Vector3(2, 2, 2))
+    moving.add_velocity(vector)
+    moving.add_angular_velocity(transform.Rotation(45, axis))
+    moving.update(1 / 60)  # keeps the state interpolated_matrix blends from
+
+    def compose() -> np.ndarray:
+        moving.mark_dirty()
+        return moving.matrix
+
+    rng = np.random.default_rng(0)
+    translations = rng.normal(size=(1000, 3))
+    rotations = transform.axis_angle_quaternions(
+        rng.normal(size=(1000, 3)), rng.uniform(-180, 180, 1000)
+    )
+    turns = transform.axis_angle_quaternions(rng.normal(size=(1000, 3)), 5.0)
+    scales = rng.uniform(0.5, 2, size=(1000, 3))
+    matrices = np.empty((1000, 4, 4), dtype=np.float32)
+    products = np.empty((1000, 4))
+
+    return {
+        "translate_matrix": lambda: transform.translate_matrix(vector),
+        "scale_matrix": lambda: transform.scale_matrix(vector),
+        "rotate_axis_matrix": lambda: transform.rotate_axis_matrix(30, axis),
+        "rotateA": lambda: transform.rotateA(matrix, 30, axis),
+        "look_at_matrix": lambda: transform.look_at_matrix(vector, axis),
+        "compose_matrix": lambda: transform.compose_matrix(
+            vector, moving.rotation, vector
+        ),
+        "compose_matrices 1000": lambda: transform.compose_matrices(
+            translations, rotations, scales, out=matrices
+        ),
+        "multiply_quaternions 1000": lambda: transform.multiply_quaternions(
+            rotations, turns, out=products
+        ),
+        "slerp_quaternions 1000": lambda: transform.slerp_quaternions(
+            rotations, turns, 0.5, out=products
+        ),
+        "Transform.matrix": compose,
+        "Transform.update": lambda: moving.update(1 / 60),
+        "Transform.interpolated_matrix": lambda: moving.interpolated_matrix(0.5),
+    }
+
+
+def gl_cases() -> dict[str, Callable[[], object]]:
+    core.headless.create_egl_context()
+    core.headless.Framebuffer(64, 64).bind()
+    shader = Shader.from_file(
+        "shaders/textruedvert.vs",
+        "shaders/texturedfrag.vs",
+        "position",
+        "vertex_color",
+        "model_mat",
+        "projection_mat",
+        "view_mat",
+        "tex",
+        "vertex_uv",
+        "vertex_normal",
+    )
+    shader.use()
+    mat4 = UniformMat4(transform.identity_matrix())
+    mat4.find_variable(shader, shader.mvp_matrix_var)
+    mat3 = UniformMat3(np.eye(3, dtype=np.float32))
+    mat3.find_variable(shader, shader.normal_matrix_var)
+    sampler = UniformSampler2D([glGenTextures(1), 1])
+    sampler.find_variable(shader, shader.vertex_tex_var)
+    frame_data = UniformBuffer(FRAME_DATA_DTYPE, FRAME_DATA_BINDING)
+    light_data = UniformBuffer(LIGHT_DATA_DTYPE, LIGHT_DATA_BINDING)
+
+    arrays = default_mesh_cache.load(
+        os.path.join("models", "donut.obj"), load_obj_arrays
+    )
+    attributes = {
+        "position": arrays["vertices"],
+        "color": np.ones((len(arrays["vertices"]), 4), dtype=np.float32),
+        "normal": arrays["vertex_normals"],
+        "uv": arrays["vertex_textures"],
+    }
+    layout = VertexLayout.from_arrays(attributes)
+    vertex_data = GraphicsDataInterleaved(layout.pack(attributes), layout)
+    vertex_data.find_variables(shader)
+    vao = glGenVertexArrays(1)
+
+    def load_vertex_data() -> None:
+        glBindVertexArray(vao)
+        vertex_data.load_data()
+
+    instanced_shader = Shader.from_file(
+        "shaders/instanced_vertexcolvert.vs",
+        "shaders/vertexcolfrag.vs",
+        "position",
+        "vertex_color",
+        "model_mat",
+        "projection_mat",
+        "view_mat",
+    )
+    instanced = InstancedMesh(
+        arrays["vertices"], indices=arrays["indices"], shader=instanced_shader
+    )
+    matrices = np.tile(transform.identity_matrix(), (1000, 1, 1))
+    instanced.set_instances(0, matrices)
+
+    def flush_instances() -> None:
+        instanced.instance_dirty[: instanced.instance_count] = True
+        instanced.flush_instances()
+
+    def finished(func: Callable[[], object]) -> Callable[[], None]:
+        # the driver may only queue the copy, wait so the batch pays for it
+        def call() -> None:
+            func()
+            glFinish()
+
+        return call
+
+    return {
+        "UniformMat4.load_data": mat4.load_data,
+        "UniformMat3.load_data": mat3.load_data,
+        "UniformSampler2D.load_data": sampler.load_data,
+        "frame data UniformBuffer.load_data": frame_data.load_data,
+        "light data UniformBuffer.load_data": light_data.load_data,
+        "VertexLayout.pack donut": lambda: layout.pack(attributes),
+        "GraphicsDataInterleaved.load_data donut": finished(load_vertex_data),
+        "InstancedMesh.set_instances 1000": lambda: instanced.set_instances(
+            0, matrices
+        ),
+        "InstancedMesh.flush_instances 1000": finished(flush_instances),
+    }
+
+
+def light_cases() -> dict[str, Callable[[], object]]:
+    projection = Camera(800, 600).projection_mat
+    rng = np.random.default_rng(0)
+    centers = rng.uniform((-40, -5, -80), (40, 5, -1), size=(1024, 3))
+    radii = rng.uniform(1, 4, 1024)
+    return {
+        "assign_lights 1024": lambda: light_clusters.assign_lights(
+            centers, radii, projection
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--faces", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time", type=float, default=0.1, help="seconds per timed batch"
+    )
+    parser.add_argument("--filter", default="", help="only cases containing this")
+    parser.add_argument("--no-gl", action="store_true")
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    cases = {**obj_cases(args.faces), **transform_cases(), **light_cases()}
+    env = results.environment()
+    if not args.no_gl:
+        cases.update(gl_cases())
+        env["renderer"] = glGetString(GL_RENDERER).decode()
+
+    measured = {}
+    for name, func in cases.items():
+        if args.filter not in name:
+            continue
+        measured[name] = timed(func, args.min_time, args.repeat)
+        print(
+            f"{name:>42}: {measured[name]['median_us']:11.2f} us"
+            f"  (min {measured[name]['min_us']:.2f})"
+        )
+    results.finish(args, "micro", measured, env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""parse_obj benchmark against the original per-line parser
+
+run from the repository root:
+
+> python3 -m benchmarks.bench_parse_obj --faces 2000000
+"""
+
+import argparse
+import io
+import os
+import time
+import numpy as np
+from core.utils import form_vertices, parse_obj
+
+
+def legacy_parse_obj(content: io.BytesIO):
+    """per-line parser the engine shipped with, kept only as a baseline"""
+    coordinates = []
+    normals = []
+    textures = []
+    triangles = []
+    textures_ids = []
+    normals_ids = []
+
+    while line := content.readline():
+        if line.startswith(b"v "):
+            _, vx, vy, vz = line.split(b" ")
+            coordinates.append((float(vx), float(vy), float(vz)))
+        elif line.startswith(b"vn"):
+            _, nx, ny, nz = line.split(b" ")
+            normals.append((float(nx), float(ny), float(nz)))
+        elif line.startswith(b"vt"):
+            _, tx, ty = line.split(b" ")
+            textures.append((float(tx), float(ty)))
+        elif line.startswith(b"f "):
+            _, t1, t2, t3 = line.split(b" ")
+            for t in [t1, t2, t3]:
+                v, t, n = map(int, t.split(b"/"))
+                triangles.append(v - 1)
+                textures_ids.append(t - 1)
+                normals_ids.append(n - 1)
+
+    return coordinates, normals, textures, triangles, textures_ids, normals_ids
+
+
+def legacy_form_vertices(coordinates, triangles):
+    allTriangles = []
+    for t in range(0, len(triangles), 3):
+        allTriangles.extend(
+            [
+                coordinates[triangles[t]],
+                coordinates[triangles[t + 1]],
+                coordinates[triangles[t + 2]],
+            ]
+        )
+    return np.array(allTriangles, np.float32)
+
+
+def load(parse, form, content: io.BytesIO) -> None:
+    """what Mesh.from_stream does before touching the GPU"""
+    coordinates, normals, textures, triangles, textures_ids, normals_ids = parse(
+        content
+    )
+    form(coordinates, triangles)
+    form(normals, normals_ids)
+    form(textures, textures_ids)
+
+
+def synthetic_obj(faces: int) -> bytes:
+    """triangulated grid in the v/t/n layout both parsers understand"""
+    side = max(int(np.sqrt(faces / 2)), 1)
+    u, v = np.meshgrid(np.arange(side + 1), np.arange(side + 1))
+    u = u.ravel() / side
+    v = v.ravel() / side
+    grid = np.arange((side + 1) ** 2).reshape(side + 1, side + 1)
+    a = grid[:-1, :-1].ravel() + 1
+    b = grid[:-1, 1:].ravel() + 1
+    c = grid[1:, :-1].ravel() + 1
+    d = grid[1:, 1:].ravel() + 1
+    corners = np.stack((a, b, c, c, b, d), axis=1).reshape(-1, 3)
+
+    out = io.StringIO()
+    np.savetxt(out, np.stack((u, np.sin(u * 6) * 0.1, v), axis=1), "v %.6f %.6f %.6f")
+    np.savetxt(out, np.stack((u, v), axis=1), "vt %.6f %.6f")
+    np.savetxt(out, np.tile((0.0, 1.0, 0.0), (len(u), 1)), "vn %.6f %.6f %.6f")
+    np.savetxt(out, np.repeat(corners, 3, axis=1), "f %d/%d/%d %d/%d/%d %d/%d/%d")
+    return out.getvalue().encode()
+
+
+def measure(func, data: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(io.BytesIO(data))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(name: str, data: bytes, repeat: int, legacy: bool) -> None:
+    print(f"{name} ({len(data) / 2**20:.1f} MiB)")
+    cases = {
+        "parse_obj": (parse_obj, legacy_parse_obj),
+        "parse_obj + form_vertices": (
+            lambda content: load(parse_obj, form_vertices, content),
+            lambda content: load(legacy_parse_obj, legacy_form_vertices, content),
+        ),
+    }
+    for case, (new_func, old_func) in cases.items():
+        new = measure(new_func, data, repeat)
+        line = f"  {case:>26}: {new * 1000:9.1f} ms"
+        if legacy:
+            old = measure(old_func, data, repeat)
+            line += f"  legacy {old * 1000:9.1f} ms  speedup x{old / new:.1f}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--faces", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    with open(os.path.join("models", "donut.obj"), "rb") as f:
+        report("models/donut.obj", f.read(), args.repeat, True)
+
+    data = synthetic_obj(args.faces)
+    report(f"synthetic {args.faces} faces", data, args.repeat, not args.skip_legacy)
+
+
+if __name__ == "__main__":
+    main()
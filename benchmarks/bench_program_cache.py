@@ -0,0 +1,63 @@
+"""shader startup time without, with a cold and with a warm program binary cache
+
+needs a display for the hidden GL window, run from the repository root:
+
+> python3 -m benchmarks.bench_program_cache
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import pygame
+from pygame.locals import *
+from core.program_cache import ProgramCache, ProgramRegistry, binaries_supported
+from core.utils import read_file
+
+SHADERS = [
+    ("shaders/textruedvert.vs", "shaders/texturedfrag.vs"),
+    ("shaders/vertexcolvert.vs", "shaders/vertexcolfrag.vs"),
+    ("shaders/instanced_texturedvert.vs", "shaders/texturedfrag.vs"),
+    ("shaders/instanced_vertexcolvert.vs", "shaders/vertexcolfrag.vs"),
+]
+
+
+def startup(registry: ProgramRegistry, sources: list[tuple[str, str]]) -> float:
+    start = time.perf_counter()
+    for vertex_shader, fragment_shader in sources:
+        registry.get(vertex_shader, fragment_shader)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.gl_set_attribute(
+        pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE
+    )
+    pygame.display.set_mode((64, 64), DOUBLEBUF | OPENGL | HIDDEN)
+    if not binaries_supported():
+        print("the driver exposes no program binary formats")
+    sources = [(read_file(vs), read_file(fs)) for vs, fs in SHADERS]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ProgramCache(os.path.join(directory, "programs"))
+        cases = {
+            "no cache": lambda: ProgramRegistry(cache, use_binaries=False),
+            "cold cache": lambda: (cache.clear(), ProgramRegistry(cache))[1],
+            "warm cache": lambda: ProgramRegistry(cache),
+        }
+        for name, make_registry in cases.items():
+            times = []
+            for _ in range(args.repeat):
+                registry = make_registry()
+                times.append(startup(registry, sources))
+            print(f"{name:>10}: {min(times) * 1000:8.1f} ms  {registry.report()}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
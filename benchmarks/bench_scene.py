@@ -0,0 +1,221 @@
+"""scene benchmarks: N meshes and N lights rendered headless along a camera path
+
+every scene runs in a fresh process on a headless context (see core.headless),
+the camera follows the same orbit each run and objects advance by a fixed
+step per frame, so runs only differ in timing. Run from the repository root:
+
+> python3 -m benchmarks.bench_scene --save scene.json
+> python3 -m benchmarks.bench_scene --meshes 1000 --lights 16 --baseline scene.json
+"""
+
+import core.headless  # selects the PyOpenGL platform before OpenGL is imported
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pygame
+from OpenGL.GL import *
+from core.camera import Camera, CameraPath
+from core.light import Light
+from core.lod import DEFAULT_LOD_RATIOS
+from core.mesh import Mesh
+from core.shader import Shader
+from core.texture_manager import TextureManager
+from core.transformations import Rotation
+from benchmarks import results
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+MODEL = os.path.join("models", "donut.obj")
+IMAGE = os.path.join("images", "crate.png")
+SPACING = 4.0
+STEP = 1 / 60
+# light reach in light grid spacings
+LIGHT_RADIUS_SPACINGS = 1.0
+LIGHT_HEIGHT = 1.5
+
+
+def peak_rss_mib() -> float | None:
+    if resource is None:
+        return None
+    # kilobytes on linux, bytes on macos
+    scale = 2**20 if os.uname().sysname == "Darwin" else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def build_scene(
+    screen: core.headless.HeadlessScreen,
+    meshes: int,
+    lights: int,
+    textured: bool,
+    lod: bool = False,
+) -> None:
+    """meshes spinning on a square grid and point lights on a grid above them"""
+    if textured:
+        shader = Shader.from_file(
+            "shaders/textruedvert.vs",
+            "shaders/texturedfrag.vs",
+            "position",
+            "vertex_color",
+            "model_mat",
+            "projection_mat",
+            "view_mat",
+            "tex",
+            "vertex_uv",
+            "vertex_normal",
+        )
+        texture = TextureManager(max_workers=1).load(IMAGE)
+    else:
+        shader = Shader.from_file(
+            "shaders/vertexcolvert.vs",
+            "shaders/vertexcolfrag.vs",
+            "position",
+            "vertex_color",
+            "model_mat",
+            "projection_mat",
+            "view_mat",
+        )
+        texture = None
+    np.random.seed(0)  # vertex colors
+    side = int(np.ceil(np.sqrt(meshes)))
+    offset = (side - 1) * SPACING / 2
+    for index in range(meshes):
+        row, column = divmod(index, side)
+        mesh = Mesh.from_file(
+            MODEL,
+            shader=shader,
+            texture=texture,
+            lod_ratios=DEFAULT_LOD_RATIOS if lod else None,
+            translation=pygame.Vector3(
+                column * SPACING - offset, 0, row * SPACING - offset
+            ),
+        )
+        mesh.rotate(Rotation(45 + index % 90, pygame.Vector3(0.5, 1, 0.5)))
+        screen.add_object(mesh)
+    # lights on a square grid above the meshes, each reaching about its
+    # neighbours so every fragment is lit by a few however many there are
+    light_side = int(np.ceil(np.sqrt(lights))) if lights else 1
+    half = max(offset, SPACING / 2)
+    light_spacing = 2 * half / light_side
+    for index in range(lights):
+        row, column = divmod(index, light_side)
+        screen.add_light(
+            Light(
+                pygame.Vector3(
+                    (column + 0.5) * light_spacing - half,
+                    LIGHT_HEIGHT,
+                    (row + 0.5) * light_spacing - half,
+                ),
+                color=pygame.Vector3(0.5, 0.5, 0.5),
+                light_number=index,
+                radius=LIGHT_RADIUS_SPACINGS * light_spacing,
+            )
+        )
+
+
+def run_scene(
+    meshes: int,
+    lights: int,
+    textured: bool,
+    frames: int,
+    warmup: int,
+    width: int,
+    height: int,
+    lod: bool = False,
+    occlusion: bool = False,
+) -> dict:
+    camera = Camera(width, height)
+    screen = core.headless.HeadlessScreen(width, height, camera, capture=False)
+    screen.occlusion_culling = occlusion
+    build_scene(screen, meshes, lights, textured, lod)
+    extent = int(np.ceil(np.sqrt(meshes))) * SPACING
+    path = CameraPath.orbit((0, 0, 0), extent * 0.8 + 6, extent * 0.3 + 3, 8.0)
+
+    frame_times = []
+    submit_times = []
+    draws = []
+    triangles = []
+    occluded = []
+    for frame in range(warmup + frames):
+        camera.look_at(*path.sample(frame * STEP))
+        start = time.perf_counter()
+        screen.update_objects(STEP)
+        screen.display_objects()
+        submitted = time.perf_counter()
+        glFinish()
+        end = time.perf_counter()
+        if frame >= warmup:
+            frame_times.append(end - start)
+            submit_times.append(submitted - start)
+            draws.append(screen.stats.draws)
+            triangles.append(screen.stats.triangles)
+            occluded.append(screen.stats.occluded)
+    result = results.percentiles(frame_times)
+    result["submit_mean_ms"] = float(np.mean(submit_times)) * 1000
+    result["draw_calls"] = float(np.mean(draws))
+    result["triangles"] = float(np.mean(triangles))
+    result["occluded"] = float(np.mean(occluded))
+    result["peak_rss_mib"] = peak_rss_mib()
+    result["renderer"] = glGetString(GL_RENDERER).decode()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--meshes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--lights", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--textured", choices=("yes", "no", "both"), default="both")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    parser.add_argument("--lod", action="store_true", help="meshes with lods")
+    parser.add_argument(
+        "--occlusion", action="store_true", help="hardware occlusion culling"
+    )
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    textured = {"yes": [True], "no": [False], "both": [False, True]}[args.textured]
+    measured = {}
+    renderer = None
+    # one process per scene: no GL objects or memory carried over
+    spawn = multiprocessing.get_context("spawn")
+    for meshes, lights, with_texture in itertools.product(
+        args.meshes, args.lights, textured
+    ):
+        name = f"{meshes} meshes {lights} lights"
+        name += " textured" * with_texture + " lod" * args.lod
+        name += " occlusion" * args.occlusion
+        with ProcessPoolExecutor(1, mp_context=spawn) as executor:
+            result = executor.submit(
+                run_scene,
+                meshes,
+                lights,
+                with_texture,
+                args.frames,
+                args.warmup,
+                *args.size,
+                args.lod,
+                args.occlusion,
+            ).result()
+        renderer = result.pop("renderer")
+        measured[name] = result
+        print(
+            f"{name:>32}: mean {result['mean_ms']:8.2f} ms"
+            f"  p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f}"
+            f"  {result['draw_calls']:6.0f} draws"
+            f"  {result['triangles']:8.0f} tris"
+            f"  {result['occluded']:6.0f} occluded"
+            f"  {result['peak_rss_mib'] or 0:7.1f} MiB"
+        )
+    results.finish(args, "scene", measured, results.environment(renderer=renderer))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""benchmark results as json, compared against a baseline to flag regressions
+
+the bench_micro and bench_scene scripts write results with --save and check
+them with --baseline, two saved files are compared with:
+
+> python3 -m benchmarks.results new.json baseline.json --threshold 0.1
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import numpy as np
+
+FORMAT_VERSION = 1
+# metrics where lower is better, everything else is only reported
+COMPARED_SUFFIXES = ("_us", "_ms", "_mib", "draw_calls")
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """mean, p50, p95 and p99 of samples in seconds, as milliseconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(**extra: str) -> dict[str, str | None]:
+    """what a result depends on besides the code, stored next to it"""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "system": platform.platform(),
+        "revision": git_revision(),
+        **extra,
+    }
+
+
+def save(path: str, suite: str, results: dict[str, dict], env: dict) -> None:
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "format": FORMAT_VERSION,
+                "suite": suite,
+                "environment": env,
+                "results": results,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a format {FORMAT_VERSION} benchmark result")
+    return data
+
+
+def compare(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """one line per metric that got worse than baseline by more than threshold"""
+    regressions = []
+    for case, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            if not metric.endswith(COMPARED_SUFFIXES):
+                continue
+            old = baseline.get(case, {}).get(metric)
+            if not old or not isinstance(value, (int, float)):
+                continue
+            change = value / old - 1
+            if change > threshold:
+                regressions.append(
+                    f"{case} {metric}: {old:.4g} -> {value:.4g} (+{change:.0%})"
+                )
+    return regressions
+
+
+def check(
+    results: dict[str, dict], baseline_path: str, threshold: float, env: dict
+) -> bool:
+    """prints the regressions against a saved baseline, True if there are none"""
+    baseline = load(baseline_path)
+    for key in ("renderer", "machine"):
+        old = baseline["environment"].get(key)
+        if old and env.get(key) and env[key] != old:
+            print(f"warning: baseline {key} {old!r} differs from {env[key]!r}")
+    regressions = compare(results, baseline["results"], threshold)
+    for line in regressions:
+        print(f"regression: {line}")
+    if not regressions:
+        print(f"no regressions over {threshold:.0%} against {baseline_path}")
+    return not regressions
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--save", metavar="PATH", help="write the results as json")
+    parser.add_argument("--baseline", metavar="PATH", help="json to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression",
+    )
+
+
+def finish(args: argparse.Namespace, suite: str, results: dict, env: dict) -> None:
+    """--save and --baseline handling shared by the benchmark scripts"""
+    if args.save:
+        save(args.save, suite, results, env)
+    if args.baseline and not check(results, args.baseline, args.threshold, env):
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("results")
+    parser.add_argument("baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+    data = load(args.results)
+    if not check(data["results"], args.baseline, args.threshold, data["environment"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+from numpy.typing import NDArray
+from core.mesh import Mesh, default_mesh_cache
+from core.mesh_cache import MeshCache
+from core.screen import Screen
+from core.scene_graph import SceneNode
+from core.texture import Texture
+from core.transform_component import Transform
+from core.texture_manager import TextureManager, default_texture_manager
+from core.lod import obj_builder
+
+DEFAULT_UPLOAD_BUDGET = 0.004  # seconds of GL uploads per frame
+TRANSFORM_KWARGS = ("translation", "rotation", "scale")
+
+
+class AssetLoader:
+    """loads meshes and textures without blocking the frame
+
+    Obj parsing (through the mesh cache) and image decoding run on worker
+    threads. Their results wait until update(), called once per frame from the
+    GL thread, uploads them within upload_budget seconds. Every load returns a
+    Future that completes on the GL thread once the asset can be drawn, or
+    holds the exception of a failed decode, parse or upload.
+    """
+
+    def __init__(
+        self,
+        upload_budget: float = DEFAULT_UPLOAD_BUDGET,
+        max_workers: int | None = None,
+        mesh_cache: MeshCache | None = None,
+        texture_manager: TextureManager | None = None,
+    ):
+        self.upload_budget = upload_budget
+        self.executor = ThreadPoolExecutor(max_workers, "asset-load")
+        self.mesh_cache = mesh_cache or default_mesh_cache
+        self.texture_manager = texture_manager or default_texture_manager
+        # GL work that is ready to run, filled from the worker threads
+        self._uploads: queue.SimpleQueue[Callable[[], None]] = queue.SimpleQueue()
+        self.in_flight = 0
+        self.uploaded_last_frame = 0
+
+    @staticmethod
+    def _notify(
+        result: Future,
+        callback: Callable[[Any], None] | None,
+        error_callback: Callable[[BaseException], None] | None,
+    ) -> None:
+        """callback(asset) once result succeeds, error_callback(error) if it fails"""
+
+        def done(future: Future) -> None:
+            if (error := future.exception()) is None:
+                if callback is not None:
+                    callback(future.result())
+            elif error_callback is not None:
+                error_callback(error)
+
+        result.add_done_callback(done)
+
+    def _when_done(self, future: Future, upload: Callable[[Any], None]) -> None:
+        """queues upload(result) for the GL thread once future is done"""
+        future.add_done_callback(lambda done: self._uploads.put(lambda: upload(done)))
+
+    def _run(self, result: Future, upload: Callable[[Future], Any]) -> Callable:
+        def finish(done: Future) -> None:
+            try:
+                result.set_result(upload(done))
+            except Exception as error:
+                result.set_exception(error)
+            self.in_flight -= 1
+
+        self.in_flight += 1
+        return finish
+
+    def load_texture(
+        self,
+        path: str,
+        callback: Callable[[Texture], None] | None = None,
+        error_callback: Callable[[BaseException], None] | None = None,
+    ) -> Future[Texture]:
+        result: Future[Texture] = Future()
+        self._notify(result, callback, error_callback)
+        if self.texture_manager.loaded(path):
+            result.set_result(self.texture_manager.load(path))
+            return result
+        finish = self._run(result, lambda done: self._upload_texture(path, done))
+        self._when_done(self.texture_manager.decode(path), finish)
+        return result
+
+    def _upload_texture(self, path: str, decoded: Future) -> Texture:
+        decoded.result()  # raises decode errors
+        return self.texture_manager.load(path)
+
+    def load_mesh(
+        self,
+        path: str,
+        texture_path: str | None = None,
+        screen: Screen | None = None,
+        parent: Mesh | SceneNode | None = None,
+        placeholder: Mesh | None = None,
+        callback: Callable[[Mesh], None] | None = None,
+        error_callback: Callable[[BaseException], None] | None = None,
+        mesh_class: type[Mesh] = Mesh,
+        lod_ratios: tuple[float, ...] | None = None,
+        normals: str | None = "smooth",
+        **mesh_kwargs,
+    ) -> Future[Mesh]:
+        """mesh of an obj file, added to screen once uploaded
+
+        The placeholder is shown on the screen until then, placed by the
+        translation/rotation/scale mesh_kwargs when given, and hands its scene
+        node and transform to the mesh, see Screen.replace_object. When
+        parsing or uploading fails the placeholder is removed again and
+        error_callback gets the exception, callback only gets loaded meshes.
+        Levels of detail for lod_ratios and missing normals are built on the
+        worker, see Mesh.from_file.
+        """
+        result: Future[Mesh] = Future()
+        if screen is not None and placeholder is not None:
+            if mesh_kwargs.keys() & TRANSFORM_KWARGS:
+                placeholder.transform = Transform(
+                    *(mesh_kwargs.get(name) for name in TRANSFORM_KWARGS)
+                )
+            screen.add_object(placeholder, parent)
+            self._notify(result, None, lambda _: screen.remove_object(placeholder))
+        self._notify(result, callback, error_callback)
+
+        texture = None
+        if texture_path is not None:
+            texture = self.load_texture(texture_path)
+        arrays = self.executor.submit(
+            self.mesh_cache.load, path, *obj_builder(lod_ratios, normals)
+        )
+
+        def upload(done: Future[dict[str, NDArray]]) -> Mesh:
+            if texture is not None:
+                mesh_kwargs["texture"] = texture.result()
+            mesh = mesh_class.from_arrays(done.result(), **mesh_kwargs)
+            if screen is not None and placeholder is not None:
+                screen.replace_object(placeholder, mesh)
+            elif screen is not None:
+                screen.add_object(mesh, parent)
+            return mesh
+
+        finish = self._run(result, upload)
+        if texture is None:
+            self._when_done(arrays, finish)
+        else:
+            # uploads run in order, so the mesh goes after its texture
+            texture.add_done_callback(lambda _: self._when_done(arrays, finish))
+        return result
+
+    def update(self) -> None:
+        """runs queued uploads until the frame's budget is spent"""
+        start = time.perf_counter()
+        self.uploaded_last_frame = 0
+        while time.perf_counter() - start < self.upload_budget:
+            try:
+                upload = self._uploads.get_nowait()
+            except queue.Empty:
+                break
+            upload()
+            self.uploaded_last_frame += 1
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
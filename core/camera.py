@@ -1,40 +1,127 @@
 import math
 import pygame
 from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
 from numpy.typing import NDArray
 import numpy as np
 from core.shader import Shader
 import core.transformations as transform
 from core.uniform import UniformMat4
+from core.uniform_buffer import FRAME_DATA_BLOCK
+
+
+class CameraPath:
+    """scripted camera motion through keyframes, for unattended runs
+
+    positions and targets are (N, 3) keyframes spread evenly over duration
+    seconds and linearly interpolated, a single target is looked at throughout.
+    """
+
+    def __init__(
+        self,
+        positions: NDArray,
+        targets: NDArray,
+        duration: float,
+        loop: bool = True,
+    ):
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.targets = np.broadcast_to(
+            np.asarray(targets, dtype=np.float32).reshape(-1, 3),
+            self.positions.shape,
+        )
+        self.duration = duration
+        self.loop = loop
+        self.time = 0.0
+
+    @classmethod
+    def orbit(
+        cls,
+        center: NDArray,
+        radius: float,
+        height: float,
+        duration: float,
+        steps: int = 64,
+    ) -> "CameraPath":
+        angles = np.linspace(0, 2 * np.pi, steps + 1)
+        positions = np.stack(
+            (
+                np.cos(angles) * radius,
+                np.full_like(angles, height),
+                np.sin(angles) * radius,
+            ),
+            axis=1,
+        ) + np.asarray(center, dtype=np.float32)
+        return cls(positions, center, duration)
+
+    def sample(self, t: float) -> tuple[NDArray, NDArray]:
+        """(position, target) t seconds into the path"""
+        if len(self.positions) == 1:
+            return self.positions[0], self.targets[0]
+        t = t % self.duration if self.loop else min(t, self.duration)
+        position = (len(self.positions) - 1) * t / self.duration
+        index = min(int(position), len(self.positions) - 2)
+        weight = position - index
+        return (
+            self.positions[index] * (1 - weight) + self.positions[index + 1] * weight,
+            self.targets[index] * (1 - weight) + self.targets[index + 1] * weight,
+        )
+
+    def advance(self, dt: float) -> tuple[NDArray, NDArray]:
+        self.time += dt
+        return self.sample(self.time)
 
 
 class Camera:
     def __init__(self, width: int, height: int, fov: int = 60):
-        self.transfromation = transform.identity_matrix()
+        # world -> camera space, the camera's own world transform is its inverse
+        self.view_mat = transform.identity_matrix()
+        # grows whenever view_mat changes
+        self.version = 0
         self.last_mouse = pygame.math.Vector2(0, 0)
         self.mouse_sensativity = 0.2
+        self.move_speed = 12.0  # units per second
         self.projection_mat = self.perspective_matrix(width / height, fov, 0.01, 10000)
         self.projection = UniformMat4(self.projection_mat)
+        self.view = UniformMat4(self.view_mat)
         self.screen_width = width
         self.screen_height = height
+        # a path replaces mouse and keyboard input, see CameraPath
+        self.path: CameraPath | None = None
+        self.interactive = True
+
+    @property
+    def world_matrix(self) -> NDArray:
+        """camera to world transform, the rigid inverse of view_mat"""
+        world = transform.identity_matrix()
+        rotation = self.view_mat[:3, :3].T
+        world[:3, :3] = rotation
+        world[:3, 3] = -rotation @ self.view_mat[:3, 3]
+        return world
+
+    @property
+    def position(self) -> NDArray:
+        return -self.view_mat[:3, :3].T @ self.view_mat[:3, 3]
 
     def rotate(self, yaw: int, pitch: int) -> None:
-        forward = pygame.math.Vector3(
-            self.transfromation[0][2],
-            self.transfromation[1][2],
-            self.transfromation[2][2],
-        )
+        """yaw about the world up axis, pitch about the camera's own x axis"""
+        # rows of the view rotation are the camera axes in world space
+        forward = pygame.math.Vector3(*self.view_mat[2, :3].tolist())
         up = pygame.Vector3(0, 1, 0)
         angle = forward.angle_to(up)
-        self.transfromation = transform.rotate(
-            self.transfromation, yaw, "y", local=False
-        )
+        self.view_mat = transform.rotate(self.view_mat, -yaw, "y", local=True)
         if angle < 170.0 and pitch > 0 or angle > 30.0 and pitch < 0:
-            self.transfromation = transform.rotate(
-                self.transfromation, pitch, "x", local=True
-            )
+            self.view_mat = transform.rotate(self.view_mat, -pitch, "x", local=False)
+        self.version += 1
+
+    def look_at(self, position: NDArray, target: NDArray) -> None:
+        self.view_mat = transform.look_at_matrix(
+            pygame.Vector3(*position.tolist()), pygame.Vector3(*target.tolist())
+        )
+        self.version += 1
+
+    def move(self, offset: pygame.Vector3) -> None:
+        """moves along the camera's own axes"""
+        self.view_mat = transform.translate(self.view_mat, -offset, local=False)
+        self.version += 1
 
     def perspective_matrix(
         self, aspect: float, fov: int, zNear: int, zFar: int
@@ -49,8 +136,31 @@ class Camera:
             dtype=np.float32,
         )
 
-    def update(self, shader: Shader) -> None:
-        if pygame.mouse.get_visible():
+    def frustum_planes(self) -> NDArray:
+        """(6, 4) normalized planes, a point p is inside when planes @ [p, 1] >= 0"""
+        clip = self.projection_mat @ self.view_mat
+        planes = np.array(
+            [
+                clip[3] + clip[0],
+                clip[3] - clip[0],
+                clip[3] + clip[1],
+                clip[3] - clip[1],
+                clip[3] + clip[2],
+                clip[3] - clip[2],
+            ]
+        )
+        return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+    def update(self, dt: float) -> None:
+        """mouse look and arrow key movement, once per frame of dt seconds
+
+        Follows self.path instead when one is set and does nothing for
+        non-interactive cameras.
+        """
+        if self.path is not None:
+            self.look_at(*self.path.advance(dt))
+            return
+        if not self.interactive or pygame.mouse.get_visible():
             return
         pygame.mouse.set_visible(False)
         mouse_pos = pygame.mouse.get_pos()
@@ -63,35 +173,26 @@ class Camera:
         )
 
         keys = pygame.key.get_pressed()
+        step = self.move_speed * dt
 
         if keys[pygame.K_DOWN]:
-            self.transfromation = transform.translate(
-                self.transfromation,
-                pygame.Vector3(0, 0, self.mouse_sensativity),
-                local=True,
-            )
+            self.move(pygame.Vector3(0, 0, step))
         elif keys[pygame.K_UP]:
-            self.transfromation = transform.translate(
-                self.transfromation,
-                pygame.Vector3(0, 0, -self.mouse_sensativity),
-                local=True,
-            )
-
+            self.move(pygame.Vector3(0, 0, -step))
         elif keys[pygame.K_RIGHT]:
-            self.transfromation = transform.translate(
-                self.transfromation,
-                pygame.Vector3(self.mouse_sensativity, 0, 0),
-                local=True,
-            )
+            self.move(pygame.Vector3(step, 0, 0))
         elif keys[pygame.K_LEFT]:
-            self.transfromation = transform.translate(
-                self.transfromation,
-                pygame.Vector3(-self.mouse_sensativity, 0, 0),
-                local=True,
-            )
-        self.projection.find_variable(shader.program_id, shader.projection_matrix_var)
+            self.move(pygame.Vector3(-step, 0, 0))
+
+    def load(self, shader: Shader) -> None:
+        """uploads projection and view to the shader, the shader must be in use
+
+        Shaders reading the FrameData block get them from Screen.frame_data.
+        """
+        if FRAME_DATA_BLOCK in shader.uniform_blocks:
+            return
+        self.projection.find_variable(shader, shader.projection_matrix_var)
         self.projection.load_data()
-        lookat_mat = self.transfromation
-        lookat = UniformMat4(lookat_mat)
-        lookat.find_variable(shader.program_id, shader.view_matrix_var)
-        lookat.load_data()
+        self.view.data = self.view_mat
+        self.view.find_variable(shader, shader.view_matrix_var)
+        self.view.load_data()
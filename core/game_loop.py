@@ -1,7 +1,10 @@
+import time
 from typing import Protocol, Callable
-from collections import defaultdict
+from collections import defaultdict, deque
+import numpy as np
 import pygame
 from pygame.locals import *
+from core.profiler import profiler
 
 
 class BaseGameLoop(Protocol):
@@ -9,11 +12,23 @@ class BaseGameLoop(Protocol):
     def register_display_function(self, func: Callable) -> None:
         pass
 
+    def register_update_function(self, func: Callable[[float], None]) -> None:
+        pass
+
+    def register_render_function(self, func: Callable[[float], None]) -> None:
+        pass
+
     def register_event_handler(
         self, func: Callable[[pygame.event.Event], None], event_type: int
     ) -> None:
         pass
 
+    def toggle_profiler(self) -> None:
+        pass
+
+    def report_profile(self, now: float) -> None:
+        pass
+
     def quit(self) -> None:
         pass
 
@@ -25,10 +40,36 @@ class BaseGameLoop(Protocol):
 
 
 class GameLoop:
+    """fixed rate simulation with variable rate rendering
+
+    Update functions get the fixed step in seconds and run as often as needed
+    to catch up with real time, at most max_updates_per_frame times per frame
+    (the rest is dropped rather than falling further behind). Render
+    functions get alpha, the share of the next step that has already passed,
+    to interpolate between the last two simulation states. fps=None renders
+    uncapped, or at the display rate when the screen uses vsync. Headless
+    loops simulate frame_step seconds per frame (1 / fps, or one update step
+    when uncapped) instead of real time, so their renders are reproducible
+    frame for frame.
+    """
 
-    def __init__(self, fps: int = 60) -> None:
+    def __init__(
+        self,
+        fps: int | None = 60,
+        update_rate: int = 60,
+        max_updates_per_frame: int = 5,
+        frame_history: int = 600,
+        summary_interval: float = 2.0,
+        trace_path: str = "frame_trace.json",
+        headless: bool = False,
+        max_frames: int | None = None,
+    ) -> None:
         self._fps = fps
-        self._display_functions = []
+        self.dt = 1.0 / update_rate
+        self.frame_step = 1.0 / fps if fps else self.dt
+        self.max_updates_per_frame = max_updates_per_frame
+        self._update_functions: list[Callable[[float], None]] = []
+        self._render_functions: list[Callable[[float], None]] = []
         self._event_handlers: dict[int, list[Callable[[pygame.event.Event], None]]] = (
             defaultdict(list)
         )
@@ -38,34 +79,124 @@ class GameLoop:
             lambda event: self.quit() if event.key == pygame.K_ESCAPE else None
         )
         self.clock = pygame.time.Clock()
+        # headless loops have no window: no events, mouse grab or buffer flip
+        self.headless = headless
+        self.max_frames = max_frames
+        self.frame = 0
+        # seconds per rendered frame, newest last
+        self.frame_times: deque[float] = deque(maxlen=frame_history)
+        self.dropped_time = 0.0
+        # F3 toggles the profiler, its summary is printed every summary_interval
+        # and F4 writes the recorded frames to trace_path for chrome://tracing
+        self.summary_interval = summary_interval
+        self.trace_path = trace_path
+        self._last_summary = 0.0
+        self._event_handlers[pygame.KEYDOWN].append(
+            lambda event: self.toggle_profiler() if event.key == pygame.K_F3 else None
+        )
+        self._event_handlers[pygame.KEYDOWN].append(
+            lambda event: (
+                profiler.export_chrome_trace(self.trace_path)
+                if event.key == pygame.K_F4
+                else None
+            )
+        )
 
     def quit(self) -> None:
         self._is_running = False
-        pygame.event.set_grab(False)
-        pygame.mouse.set_visible(True)
+        if not self.headless:
+            pygame.event.set_grab(False)
+            pygame.mouse.set_visible(True)
 
     def is_running(self) -> bool:
         return self._is_running
 
-    def register_display_function(
-        self, func: Callable[[pygame.event.Event], None]
-    ) -> None:
-        self._display_functions.append(func)
+    def toggle_profiler(self) -> None:
+        profiler.toggle()
+        if not profiler.enabled:
+            pygame.display.set_caption("PyEngineGL")
+
+    def report_profile(self, now: float) -> None:
+        """rolling profiler summary on the console and in the window title"""
+        if not profiler.enabled or now - self._last_summary < self.summary_interval:
+            return
+        self._last_summary = now
+        print(profiler.summary())
+        if not self.headless:
+            pygame.display.set_caption(f"PyEngineGL  {profiler.caption()}")
+
+    def register_display_function(self, func: Callable[[], None]) -> None:
+        """render function that does not interpolate"""
+        self._render_functions.append(lambda alpha: func())
+
+    def register_update_function(self, func: Callable[[float], None]) -> None:
+        self._update_functions.append(func)
+
+    def register_render_function(self, func: Callable[[float], None]) -> None:
+        self._render_functions.append(func)
 
     def register_event_handler(self, func: Callable, event_type: int) -> None:
         self._event_handlers[event_type].append(func)
 
+    def frame_time_percentiles(
+        self, percentiles: tuple[float, ...] = (50, 95, 99)
+    ) -> dict[float, float]:
+        """frame time in seconds at each percentile of the recent frames"""
+        if not self.frame_times:
+            return {percentile: 0.0 for percentile in percentiles}
+        values = np.percentile(np.fromiter(self.frame_times, float), percentiles)
+        return dict(zip(percentiles, values.tolist()))
+
+    def step(self, accumulator: float) -> float:
+        """runs the due updates, returns the time left in the accumulator"""
+        updates = 0
+        while accumulator >= self.dt:
+            if updates == self.max_updates_per_frame:
+                # spiral of death guard, the simulation slows down instead
+                self.dropped_time += accumulator - accumulator % self.dt
+                return accumulator % self.dt
+            with profiler.scope("update"):
+                for update_function in self._update_functions:
+                    update_function(self.dt)
+            accumulator -= self.dt
+            updates += 1
+        return accumulator
+
     def run(self) -> None:
-        pygame.event.set_grab(True)
-        pygame.mouse.set_visible(False)
+        if not self.headless:
+            pygame.event.set_grab(True)
+            pygame.mouse.set_visible(False)
         self._is_running = True
+        accumulator = 0.0
+        previous = time.perf_counter()
         while self._is_running:
-            for event in pygame.event.get():
-                if event.type in self._event_handlers:
-                    for event_handler in self._event_handlers[event.type]:
-                        event_handler(event)
-            for display_function in self._display_functions:
-                display_function()
-            pygame.display.flip()
-            self.clock.tick(self._fps)
+            profiler.begin_frame()
+            with profiler.scope("events"):
+                for event in [] if self.headless else pygame.event.get():
+                    if event.type in self._event_handlers:
+                        for event_handler in self._event_handlers[event.type]:
+                            event_handler(event)
+            now = time.perf_counter()
+            self.frame_times.append(now - previous)
+            if self.headless:
+                elapsed = self.frame_step if self.frame else 0.0
+            else:
+                elapsed = now - previous
+            accumulator = self.step(accumulator + elapsed)
+            previous = now
+            alpha = accumulator / self.dt
+            with profiler.scope("render"):
+                for render_function in self._render_functions:
+                    render_function(alpha)
+            if not self.headless:
+                with profiler.scope("flip"):
+                    pygame.display.flip()
+            if self._fps:
+                with profiler.scope("frame cap"):
+                    self.clock.tick(self._fps)
+            profiler.end_frame()
+            self.report_profile(now)
+            self.frame += 1
+            if self.max_frames is not None and self.frame >= self.max_frames:
+                self._is_running = False
         pygame.quit()
@@ -1,8 +1,13 @@
+import ctypes
+import dataclasses
 from numbers import Number
 from typing import Protocol, Iterable
 from OpenGL.GL import *
 import numpy as np
 from numpy.typing import NDArray
+from core.shader import Shader
+from core.profiler import profiler
+from core.utils import get_attrib_location
 
 
 def load_vec(
@@ -17,6 +22,139 @@ def load_vec(
     glEnableVertexAttribArray(variable_id)
 
 
+GL_TYPES = {
+    np.dtype(np.float32): GL_FLOAT,
+    np.dtype(np.int8): GL_BYTE,
+    np.dtype(np.uint8): GL_UNSIGNED_BYTE,
+    np.dtype(np.int16): GL_SHORT,
+    np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+    np.dtype(np.int32): GL_INT,
+    np.dtype(np.uint32): GL_UNSIGNED_INT,
+}
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class VertexAttribute:
+    name: str
+    components: int
+    dtype: np.dtype = np.dtype(np.float32)
+    normalized: bool = False
+
+
+class VertexLayout:
+    """interleaved vertex format, one numpy structured dtype field per attribute"""
+
+    def __init__(self, attributes: Iterable[VertexAttribute]):
+        self.attributes = tuple(attributes)
+        self.dtype = np.dtype(
+            [
+                (attribute.name, attribute.dtype, (attribute.components,))
+                for attribute in self.attributes
+            ]
+        )
+        self.stride = self.dtype.itemsize
+        self.offsets = {
+            attribute.name: self.dtype.fields[attribute.name][1]
+            for attribute in self.attributes
+        }
+
+    @classmethod
+    def from_dtype(cls, dtype: np.dtype) -> "VertexLayout":
+        """layout of a record array packed by another layout, e.g. a mapped one"""
+        return cls(
+            VertexAttribute(name, dtype[name].shape[0], dtype[name].base)
+            for name in dtype.names
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, NDArray]) -> "VertexLayout":
+        attributes = []
+        for name, array in arrays.items():
+            dtype = np.asarray(array).dtype
+            if dtype not in GL_TYPES:
+                dtype = np.dtype(np.float32)
+            attributes.append(VertexAttribute(name, np.shape(array)[1], dtype))
+        return cls(attributes)
+
+    def pack(self, arrays: dict[str, NDArray]) -> NDArray:
+        data = np.empty(len(next(iter(arrays.values()))), dtype=self.dtype)
+        for name, array in arrays.items():
+            data[name] = array
+        return data
+
+
+# load_obj_arrays keys of the per vertex arrays and their layout attribute names
+VERTEX_RECORD_FIELDS = {
+    "vertices": "position",
+    "vertex_normals": "normal",
+    "vertex_textures": "uv",
+    "vertex_tangents": "tangent",
+}
+
+
+def pack_vertex_records(arrays: dict[str, NDArray]) -> dict[str, NDArray]:
+    """arrays with the per vertex ones interleaved into vertex_records, which
+    Mesh uploads as is, e.g. straight from the mesh cache"""
+    attributes = {
+        name: arrays[key] for key, name in VERTEX_RECORD_FIELDS.items() if key in arrays
+    }
+    packed = {
+        key: array for key, array in arrays.items() if key not in VERTEX_RECORD_FIELDS
+    }
+    packed["vertex_records"] = VertexLayout.from_arrays(attributes).pack(attributes)
+    return packed
+
+
+def unpack_vertex_records(arrays: dict[str, NDArray]) -> dict[str, NDArray]:
+    """arrays with the per vertex ones as views into vertex_records, no copies"""
+    if "vertex_records" not in arrays:
+        return arrays
+    records = arrays["vertex_records"]
+    unpacked = dict(arrays)
+    for key, name in VERTEX_RECORD_FIELDS.items():
+        if name in records.dtype.names:
+            unpacked[key] = records[name]
+    return unpacked
+
+
+class GraphicsDataInterleaved:
+    def __init__(self, data: NDArray, layout: VertexLayout):
+        self.data = data
+        self.layout = layout
+        self.buffer_ref = glGenBuffers(1)
+        self.variable_ids: dict[str, int] = {}
+
+    def find_variables(self, shader: Shader, skip: Iterable[str] = ()):
+        """resolves layout attribute names through shader.attribute_variables,
+        the skipped attributes stay in the buffer but are not bound"""
+        variable_names = shader.attribute_variables
+        self.variable_ids = {
+            name: shader.attribute_location(variable_names[name])
+            for name in self.layout.offsets
+            if name in variable_names and name not in skip
+        }
+
+    def load_data(self):
+        """uploads all attributes in one buffer and binds them to the current vao"""
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer_ref)
+        # raw byte view, the GL array handlers do not know structured dtypes
+        glBufferData(GL_ARRAY_BUFFER, self.data.view(np.uint8), GL_STATIC_DRAW)
+        profiler.count("bytes uploaded", self.data.nbytes)
+        for attribute in self.layout.attributes:
+            variable_id = self.variable_ids.get(attribute.name, -1)
+            if variable_id < 0:
+                continue  # not used by the shader
+            glVertexAttribPointer(
+                variable_id,
+                attribute.components,
+                GL_TYPES[np.dtype(attribute.dtype)],
+                attribute.normalized,
+                self.layout.stride,
+                ctypes.c_void_p(self.layout.offsets[attribute.name]),
+            )
+            glEnableVertexAttribArray(variable_id)
+
+
 class GraphicsData(Protocol):
     data: NDArray[np.float32]
     buffer_ref: int
@@ -34,12 +172,30 @@ class GraphicsData(Protocol):
 
 class GraphicsDataVec:
     def __init__(self, data: Iterable[Number] | NDArray):
-        self.data = np.array(data, dtype=np.float32)
+        # no copy for float32 arrays, e.g. memory-mapped ones from the mesh cache
+        self.data = np.asarray(data, dtype=np.float32)
         self.buffer_ref = glGenBuffers(1)
         self.variable_id = None
 
     def find_variable(self, program_id: int, variable_name: str):
-        self.variable_id = glGetAttribLocation(program_id, variable_name)
+        self.variable_id = get_attrib_location(program_id, variable_name)
 
     def load_data(self):
         load_vec(self.data, self.buffer_ref, self.variable_id)
+
+
+class GraphicsDataIndex:
+    def __init__(self, data: Iterable[Number] | NDArray):
+        self.data = np.asarray(data)
+        if self.data.dtype not in (np.uint16, np.uint32):
+            self.data = self.data.astype(np.uint32)
+        self.gl_type = (
+            GL_UNSIGNED_SHORT if self.data.dtype == np.uint16 else GL_UNSIGNED_INT
+        )
+        self.buffer_ref = glGenBuffers(1)
+
+    def load_data(self):
+        """binds to the currently bound vertex array"""
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.buffer_ref)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.data, GL_STATIC_DRAW)
+        profiler.count("bytes uploaded", self.data.nbytes)
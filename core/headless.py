@@ -0,0 +1,268 @@
+"""offscreen rendering without a window, e.g. on render boxes and in CI
+
+PyOpenGL picks its platform on first import, so import this module before
+anything that imports OpenGL or set PYOPENGL_PLATFORM to egl (default here)
+or osmesa yourself. Mesa's llvmpipe works for both.
+"""
+
+import os
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import ctypes
+from collections import deque
+from numpy.typing import NDArray
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as raw_glReadPixels
+from core.camera import Camera
+from core.profiler import profiler
+from core.screen import Screen
+
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+
+def create_egl_context(major: int = 3, minor: int = 3) -> tuple:
+    """(display, context) of a current core profile context without surface"""
+    from OpenGL import EGL
+    from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+
+    display = EGL.EGL_NO_DISPLAY
+    if b"EGL_MESA_platform_surfaceless" in (
+        EGL.eglQueryString(EGL.EGL_NO_DISPLAY, EGL.EGL_EXTENSIONS) or b""
+    ):
+        display = eglGetPlatformDisplayEXT(
+            EGL_PLATFORM_SURFACELESS_MESA, EGL.EGL_DEFAULT_DISPLAY, None
+        )
+    if not display:
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    if not EGL.eglInitialize(display, None, None):
+        raise RuntimeError("EGL could not be initialized")
+
+    config_attributes = (EGL.EGLint * 5)(
+        EGL.EGL_RENDERABLE_TYPE,
+        EGL.EGL_OPENGL_BIT,
+        EGL.EGL_SURFACE_TYPE,
+        0,
+        EGL.EGL_NONE,
+    )
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    EGL.eglChooseConfig(
+        display, config_attributes, ctypes.pointer(config), 1, ctypes.pointer(count)
+    )
+    if not count.value:
+        raise RuntimeError("no EGL config for desktop OpenGL")
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context_attributes = (EGL.EGLint * 7)(
+        EGL.EGL_CONTEXT_MAJOR_VERSION,
+        major,
+        EGL.EGL_CONTEXT_MINOR_VERSION,
+        minor,
+        EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK,
+        EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+        EGL.EGL_NONE,
+    )
+    context = EGL.eglCreateContext(
+        display, config, EGL.EGL_NO_CONTEXT, context_attributes
+    )
+    if not context or not EGL.eglMakeCurrent(
+        display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context
+    ):
+        raise RuntimeError(f"no OpenGL {major}.{minor} core context through EGL")
+    return display, context
+
+
+def create_osmesa_context(
+    width: int, height: int, major: int = 3, minor: int = 3
+) -> tuple:
+    """(context, buffer) of a current OSMesa core profile context"""
+    from OpenGL import osmesa
+
+    attributes = np.array(
+        [
+            osmesa.OSMESA_FORMAT,
+            osmesa.OSMESA_RGBA,
+            osmesa.OSMESA_DEPTH_BITS,
+            24,
+            osmesa.OSMESA_PROFILE,
+            osmesa.OSMESA_CORE_PROFILE,
+            osmesa.OSMESA_CONTEXT_MAJOR_VERSION,
+            major,
+            osmesa.OSMESA_CONTEXT_MINOR_VERSION,
+            minor,
+            0,
+        ],
+        dtype=np.int32,
+    )
+    context = osmesa.OSMesaCreateContextAttribs(attributes, None)
+    buffer = np.zeros((height, width, 4), dtype=np.uint8)
+    if not context or not osmesa.OSMesaMakeCurrent(
+        context, buffer, GL_UNSIGNED_BYTE, width, height
+    ):
+        raise RuntimeError(f"no OpenGL {major}.{minor} core context through OSMesa")
+    return context, buffer
+
+
+class Framebuffer:
+    """color and depth renderbuffers to draw into instead of a window"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.framebuffer_id = glGenFramebuffers(1)
+        self.color, self.depth = glGenRenderbuffers(2)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer_id)
+        for renderbuffer, storage, attachment in (
+            (self.color, GL_RGBA8, GL_COLOR_ATTACHMENT0),
+            (self.depth, GL_DEPTH24_STENCIL8, GL_DEPTH_STENCIL_ATTACHMENT),
+        ):
+            glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+            glRenderbufferStorage(GL_RENDERBUFFER, storage, width, height)
+            glFramebufferRenderbuffer(
+                GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, renderbuffer
+            )
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"incomplete framebuffer: {status}")
+
+    def bind(self) -> None:
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer_id)
+        glViewport(0, 0, self.width, self.height)
+
+
+class PixelReadback:
+    """asynchronous glReadPixels through a ring of pixel pack buffers
+
+    capture() only queues the copy of the bound framebuffer, poll() maps the
+    buffers whose copy has finished. Frames come out in capture order as
+    (height, width, 4) RGBA arrays with the top row first. capture() waits
+    for the oldest copy only when every buffer is in flight.
+    """
+
+    def __init__(self, width: int, height: int, buffers: int = 3):
+        self.width = width
+        self.height = height
+        self.size = width * height * 4
+        self.free = deque(np.atleast_1d(glGenBuffers(buffers)).tolist())
+        self.pending: deque[tuple[int, object]] = deque()
+        for buffer in self.free:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.ready: list[NDArray] = []
+
+    def capture(self) -> None:
+        if not self.free:
+            # poll() hands over and replaces self.ready, extend the new list
+            frames = self.poll(wait_for_one=True)
+            self.ready.extend(frames)
+        buffer = self.free.popleft()
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+        glPixelStorei(GL_PACK_ALIGNMENT, 4)
+        raw_glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.pending.append((buffer, fence))
+
+    def poll(self, wait_for_one: bool = False) -> list[NDArray]:
+        """frames whose copy has finished, wait_for_one blocks until the oldest
+        copy finishes however long it takes"""
+        frames, self.ready = self.ready, []
+        wait = wait_for_one
+        while self.pending:
+            buffer, fence = self.pending[0]
+            timeout = 10**9 if wait else 0
+            status = glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, timeout)
+            # a slow frame can take longer than the timeout, keep waiting
+            while wait and status == GL_TIMEOUT_EXPIRED:
+                status = glClientWaitSync(fence, 0, timeout)
+            if status == GL_WAIT_FAILED:
+                raise RuntimeError("waiting for a pixel readback failed")
+            if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            wait = False
+            self.pending.popleft()
+            glDeleteSync(fence)
+            frames.append(self._read(buffer))
+            self.free.append(buffer)
+        return frames
+
+    def _read(self, buffer: int) -> NDArray:
+        frame = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+        address = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.size, GL_MAP_READ_BIT)
+        ctypes.memmove(frame.ctypes.data, address, self.size)
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        profiler.count("bytes read back", self.size)
+        return frame[::-1]
+
+    def finish(self) -> list[NDArray]:
+        """every captured frame that has not been returned yet"""
+        frames = []
+        while self.pending or self.ready:
+            frames.extend(self.poll(wait_for_one=True))
+        return frames
+
+
+class HeadlessScreen(Screen):
+    """Screen drawing into a Framebuffer of an EGL or OSMesa context
+
+    The camera is made non-interactive, give it a CameraPath to move it.
+    The path advances frame_step seconds per frame instead of the wall clock,
+    so frame n shows it at n * frame_step whatever the render speed, like
+    GameLoop(headless=True) steps the simulation. Captured frames are collected
+    in self.frames, at most max_frames of them.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        camera: Camera,
+        capture: bool = True,
+        readback_buffers: int = 3,
+        max_frames: int | None = None,
+        frame_step: float = 1 / 60,
+    ):
+        self.frame_step = frame_step
+        self.frame_index = 0
+        self.capture = capture
+        self.readback_buffers = readback_buffers
+        self.frames: deque[NDArray] = deque(maxlen=max_frames)
+        camera.interactive = False
+        super().__init__(0, 0, width, height, camera)
+
+    def create_context(self, screen_pos_x: int, screen_pos_y: int, vsync: bool) -> None:
+        platform = os.environ.get("PYOPENGL_PLATFORM")
+        if platform == "egl":
+            self.context = create_egl_context()
+        elif platform == "osmesa":
+            self.context = create_osmesa_context(self.screen_width, self.screen_height)
+        else:
+            raise RuntimeError(
+                "headless rendering needs PYOPENGL_PLATFORM=egl or osmesa"
+                " before OpenGL is imported"
+            )
+        self.framebuffer = Framebuffer(self.screen_width, self.screen_height)
+        self.framebuffer.bind()
+        self.readback = PixelReadback(
+            self.screen_width, self.screen_height, self.readback_buffers
+        )
+
+    def frame_seconds(self) -> float:
+        dt = self.frame_step if self.frame_index else 0.0
+        self.frame_index += 1
+        return dt
+
+    def display_objects(self, alpha: float = 1.0) -> None:
+        super().display_objects(alpha)
+        if self.capture:
+            with profiler.scope("readback"):
+                self.readback.capture()
+                self.frames.extend(self.readback.poll())
+
+    def finish(self) -> None:
+        """waits for the frames still being read back"""
+        self.frames.extend(self.readback.finish())
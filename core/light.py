@@ -1,17 +1,29 @@
+import itertools
 import pygame
+from numpy.typing import NDArray
+import numpy as np
 import core.transformations as transform
+from core.shader import Shader
 from core.uniform import UniformVec3
 
 
 class Light:
+    """point light, radius limits its reach for clustered shading
+
+    Without a radius the light reaches everything and lands in every cluster,
+    with one it fades out towards the radius, see core.light_clusters.
+    """
+
     def __init__(
         self,
         position: pygame.Vector3,
         color: pygame.Vector3 | None = None,
         light_number: int = 0,
+        radius: float | None = None,
     ):
         if color is None:
             color = pygame.Vector3(1, 1, 1)
+        self.radius = radius
         self.transformation = transform.identity_matrix()
         self.color = color
         self.position = position
@@ -20,8 +32,29 @@ class Light:
         self.light_pos = UniformVec3(self.position)
         self.color = color = UniformVec3(self.color)
 
-    def update(self, program_id: int) -> None:
-        self.light_pos.find_variable(program_id, self.light_variable)
+    def update(self, shader: Shader) -> None:
+        self.light_pos.find_variable(shader, self.light_variable)
         self.light_pos.load_data()
-        self.color.find_variable(program_id, self.color_variable)
+        self.color.find_variable(shader, self.color_variable)
         self.color.load_data()
+
+
+def light_arrays(lights: list[Light]) -> tuple[NDArray, NDArray, NDArray]:
+    """(N, 3) positions, (N, 3) colors and (N,) radii, inf without a radius"""
+    count = len(lights)
+    positions = np.fromiter(
+        itertools.chain.from_iterable(light.position for light in lights),
+        np.float64,
+        3 * count,
+    ).reshape(count, 3)
+    colors = np.fromiter(
+        itertools.chain.from_iterable(light.color.data for light in lights),
+        np.float64,
+        3 * count,
+    ).reshape(count, 3)
+    radii = np.fromiter(
+        (np.inf if light.radius is None else light.radius for light in lights),
+        np.float64,
+        count,
+    )
+    return positions, colors, radii
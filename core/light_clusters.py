@@ -0,0 +1,267 @@
+"""clustered forward lighting: lights binned into view frustum clusters
+
+The frustum is split into CLUSTER_TILES screen tiles times CLUSTER_SLICES
+depth slices, spaced exponentially over CLUSTER_DEPTH_RANGE. Every frame the
+lights are assigned to the clusters their sphere overlaps on the cpu, and
+shaders declaring the ClusterData block only shade the lights of their
+fragment's cluster (see shaders/texturedfrag.vs), so the cost per fragment
+depends on the lights nearby instead of all lights.
+"""
+
+import math
+from numpy.typing import NDArray
+import numpy as np
+from OpenGL.GL import *
+from core.profiler import profiler
+from core.uniform_buffer import (
+    CLUSTER_DATA_BINDING,
+    CLUSTER_DATA_DTYPE,
+    TEXTURE_BUFFER_UNITS,
+    UniformBuffer,
+)
+
+CLUSTER_TILES = (32, 18)
+# thin slices matter more than many tiles, a slice spans depth * 10% here
+CLUSTER_SLICES = 64
+# nearer fragments use the first slice, farther ones the last
+CLUSTER_DEPTH_RANGE = (1.0, 500.0)
+# stands in for the unbounded far side of the last slice
+_FAR_AWAY = 1e30
+
+
+def depth_slicing(slices: int, near: float, far: float) -> tuple[float, float]:
+    """(scale, bias) with the slice of a view depth = log(depth) * scale + bias"""
+    scale = slices / math.log(far / near)
+    return scale, -math.log(near) * scale
+
+
+def slice_depths(slices: int, near: float, far: float) -> NDArray:
+    """(slices + 1,) view depths between the slices, from 0 to far away"""
+    depths = near * (far / near) ** (np.arange(slices + 1) / slices)
+    depths[0], depths[-1] = 0.0, _FAR_AWAY
+    return depths
+
+
+def _ranks(counts: NDArray) -> NDArray:
+    """position of every element of np.repeat(..., counts) within its run"""
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def _tile_range(
+    low: NDArray, high: NDArray, near: NDArray, far: NDArray, scale: float, count: int
+) -> tuple[NDArray, NDArray]:
+    """first and last of count screen tiles the view space span [low, high] at
+    depths between near and far projects to, scale is the projection's"""
+    low, high = low * scale, high * scale
+    low = np.minimum(low / near, low / far)
+    high = np.maximum(high / near, high / far)
+    first = np.floor((low + 1) / 2 * count)
+    last = np.floor((high + 1) / 2 * count)
+    return (
+        np.clip(first, 0, count - 1).astype(np.int64),
+        np.clip(last, 0, count - 1).astype(np.int64),
+    )
+
+
+def assign_lights(
+    centers: NDArray,
+    radii: NDArray,
+    projection: NDArray,
+    tiles: tuple[int, int] = CLUSTER_TILES,
+    slices: int = CLUSTER_SLICES,
+    depth_range: tuple[float, float] = CLUSTER_DEPTH_RANGE,
+) -> tuple[NDArray, NDArray]:
+    """(grid, indices) of the lights reaching every cluster
+
+    centers are (N, 3) view space light positions and radii their reach, inf
+    for lights without one. grid is (C, 2) offset and count into indices,
+    which lists the light numbers cluster after cluster. Cluster (tile x,
+    tile y, slice) has the index (slice * tiles y + tile y) * tiles x + tile
+    x, tile (0, 0) is the bottom left one like gl_FragCoord. Every light gets
+    the slices its sphere spans, then in every slice the tiles the part of
+    the sphere inside the slice projects to.
+    """
+    tiles_x, tiles_y = tiles
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    radii = np.asarray(radii, dtype=np.float64)
+    bounded = np.isfinite(radii)
+    reach = np.where(bounded, radii, 0.0)
+    depth = -centers[:, 2]
+    # spheres reaching this close to the camera plane can cover any tile
+    closest = depth_range[0] * 1e-3
+
+    scale, bias = depth_slicing(slices, *depth_range)
+    first_slice = np.log(np.maximum(depth - reach, closest)) * scale + bias
+    last_slice = np.log(np.maximum(depth + reach, closest)) * scale + bias
+    first_slice = np.clip(np.floor(first_slice), 0, slices - 1).astype(np.int64)
+    last_slice = np.clip(np.floor(last_slice), 0, slices - 1).astype(np.int64)
+    first_slice[~bounded], last_slice[~bounded] = 0, slices - 1
+    in_front = ~bounded | (depth + reach > 0)
+    slice_counts = (last_slice - first_slice + 1) * in_front
+    lights = np.repeat(np.arange(len(radii)), slice_counts)
+    cluster_slices = first_slice[lights] + _ranks(slice_counts)
+
+    # the sphere inside a slice lies within a circle of the radius left at
+    # the slice face nearest to its center
+    depths = slice_depths(slices, *depth_range)
+    slice_near, slice_far = depths[cluster_slices], depths[cluster_slices + 1]
+    center, radius = centers[lights], reach[lights]
+    gap = np.maximum(
+        np.maximum(slice_near - depth[lights], depth[lights] - slice_far), 0
+    )
+    circle = np.sqrt(np.maximum(radius**2 - gap**2, 0))
+    near = np.maximum(slice_near, depth[lights] - radius)
+    far = np.minimum(slice_far, depth[lights] + radius)
+    around = ~bounded[lights] | (near <= closest)
+    near = np.maximum(near, closest)
+    ranges = []
+    for axis, count in ((0, tiles_x), (1, tiles_y)):
+        first, last = _tile_range(
+            center[:, axis] - circle,
+            center[:, axis] + circle,
+            near,
+            far,
+            projection[axis, axis],
+            count,
+        )
+        ranges.append((np.where(around, 0, first), np.where(around, count - 1, last)))
+    (first_x, last_x), (first_y, last_y) = ranges
+
+    size_x = last_x - first_x + 1
+    tile_counts = size_x * (last_y - first_y + 1)
+    pairs = np.repeat(np.arange(len(lights)), tile_counts)
+    cell_y, cell_x = np.divmod(_ranks(tile_counts), size_x[pairs])
+    clusters = (
+        (cluster_slices[pairs] * tiles_y + first_y[pairs] + cell_y) * tiles_x
+        + first_x[pairs]
+        + cell_x
+    )
+
+    order = np.argsort(clusters, kind="stable")
+    counts = np.bincount(clusters, minlength=tiles_x * tiles_y * slices)
+    # empty clusters keep offset 0, their grid entries do not change as
+    # lights elsewhere move, so less of the grid needs uploading
+    offsets = np.where(counts > 0, np.cumsum(counts) - counts, 0)
+    grid = np.stack((offsets, counts), axis=1)
+    return grid.astype(np.uint32), lights[pairs][order].astype(np.uint32)
+
+
+class TextureBuffer:
+    """buffer texture read with texelFetch, the buffer grows with the data
+
+    Uploads rotate over copies buffer/texture pairs so a frame never writes a
+    buffer the GPU may still be reading for an earlier one, and only the
+    range of 32 bit words that differs from what the pair held is sent.
+    """
+
+    def __init__(self, internal_format: int, unit: int, copies: int = 3):
+        self.internal_format = internal_format
+        self.unit = unit
+        self.buffer_refs = list(np.atleast_1d(glGenBuffers(copies)))
+        self.texture_refs = list(np.atleast_1d(glGenTextures(copies)))
+        self.capacities = [0] * copies
+        self.contents = [np.empty(0, dtype=np.uint32)] * copies
+        self.current = 0
+
+    def load_data(self, data: NDArray) -> None:
+        """data of 4 byte elements, shown by bind() from now on"""
+        self.current = (self.current + 1) % len(self.buffer_refs)
+        slot = self.current
+        words = np.ascontiguousarray(data).view(np.uint32).ravel()
+        old = self.contents[slot]
+        glBindBuffer(GL_TEXTURE_BUFFER, self.buffer_refs[slot])
+        if words.nbytes > self.capacities[slot] or self.capacities[slot] == 0:
+            self.capacities[slot] = max(words.nbytes, 2 * self.capacities[slot], 256)
+            glBufferData(
+                GL_TEXTURE_BUFFER, self.capacities[slot], None, GL_DYNAMIC_DRAW
+            )
+            glBindTexture(GL_TEXTURE_BUFFER, self.texture_refs[slot])
+            glTexBuffer(GL_TEXTURE_BUFFER, self.internal_format, self.buffer_refs[slot])
+            old = np.empty(0, dtype=np.uint32)
+        # words past the old contents count as changed, stale ones past the
+        # new data are never read
+        shared = min(len(words), len(old))
+        changed = np.flatnonzero(words[:shared] != old[:shared])
+        first = int(changed[0]) if len(changed) else shared
+        last = int(changed[-1]) + 1 if len(changed) else shared
+        if len(words) > shared:
+            last = len(words)
+        if last > first:
+            glBufferSubData(
+                GL_TEXTURE_BUFFER, first * 4, (last - first) * 4, words[first:last]
+            )
+            profiler.count("bytes uploaded", (last - first) * 4)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+        self.contents[slot] = words.copy()
+
+    def bind(self) -> None:
+        glActiveTexture(GL_TEXTURE0 + self.unit)
+        glBindTexture(GL_TEXTURE_BUFFER, self.texture_refs[self.current])
+
+
+class LightClusters:
+    """per frame light assignment and the buffers clustered shaders read
+
+    cluster_lights holds two texels per light, position and radius (0 when
+    unbounded) then color, cluster_grid the (offset, count) of every cluster
+    into cluster_indices.
+    """
+
+    def __init__(
+        self,
+        tiles: tuple[int, int] = CLUSTER_TILES,
+        slices: int = CLUSTER_SLICES,
+        depth_range: tuple[float, float] = CLUSTER_DEPTH_RANGE,
+    ):
+        self.tiles = tiles
+        self.slices = slices
+        self.depth_range = depth_range
+        self.cluster_data = UniformBuffer(CLUSTER_DATA_DTYPE, CLUSTER_DATA_BINDING)
+        self.lights = TextureBuffer(GL_RGBA32F, TEXTURE_BUFFER_UNITS["cluster_lights"])
+        self.grid = TextureBuffer(GL_RG32UI, TEXTURE_BUFFER_UNITS["cluster_grid"])
+        self.indices = TextureBuffer(GL_R32UI, TEXTURE_BUFFER_UNITS["cluster_indices"])
+        # light to cluster assignments of the last update
+        self.references = 0
+
+    def update(
+        self,
+        positions: NDArray,
+        colors: NDArray,
+        radii: NDArray,
+        view: NDArray,
+        projection: NDArray,
+        width: int,
+        height: int,
+    ) -> None:
+        """assigns (N, 3) world space lights to the clusters and uploads them"""
+        centers = positions @ view[:3, :3].T + view[:3, 3]
+        grid, indices = assign_lights(
+            centers,
+            radii,
+            projection,
+            self.tiles,
+            self.slices,
+            self.depth_range,
+        )
+        self.references = len(indices)
+        profiler.count("light cluster references", len(indices))
+
+        lights = np.zeros((len(positions), 2, 4), dtype=np.float32)
+        lights[:, 0, :3] = positions
+        lights[:, 0, 3] = np.where(np.isfinite(radii), radii, 0)
+        lights[:, 1, :3] = colors
+        self.lights.load_data(lights)
+        self.grid.load_data(grid)
+        self.indices.load_data(indices)
+
+        data = self.cluster_data.data
+        data["grid_size"] = (*self.tiles, self.slices, len(positions))
+        tiles_x, tiles_y = self.tiles
+        data["slicing"] = (
+            *depth_slicing(self.slices, *self.depth_range),
+            width / tiles_x,
+            height / tiles_y,
+        )
+        self.cluster_data.load_data()
+        for buffer in (self.lights, self.grid, self.indices):
+            buffer.bind()
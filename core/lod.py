@@ -0,0 +1,227 @@
+import functools
+import io
+from typing import Callable
+from numpy.typing import NDArray
+import numpy as np
+from core.graphics_data import pack_vertex_records
+from core.utils import index_dtype, load_obj_arrays
+
+# bump when simplify() output changes, it is part of the mesh cache key
+LOD_VERSION = 1
+# triangle share of every level after the full resolution one
+DEFAULT_LOD_RATIOS = (0.5, 0.25, 0.1)
+# projected height (share of the screen) below which each of those levels is used
+DEFAULT_SCREEN_SIZES = (0.3, 0.15, 0.06)
+# relative band around a screen size in which the level does not change
+LOD_HYSTERESIS = 0.15
+
+
+def _sum_by(groups: NDArray, values: NDArray, count: int) -> NDArray:
+    """sum of the (N, 4, 4) values per group, bincount is much faster than add.at"""
+    flat = values.reshape(len(values), -1)
+    sums = [np.bincount(groups, flat[:, k], count) for k in range(flat.shape[1])]
+    return np.stack(sums, axis=1).reshape(count, *values.shape[1:])
+
+
+def vertex_quadrics(vertices: NDArray, indices: NDArray) -> NDArray:
+    """(N, 4, 4) sum of the area weighted plane quadrics around every vertex"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(indices, dtype=np.intp).reshape(-1, 3)
+    a, b, c = (vertices[triangles[:, corner]] for corner in range(3))
+    normals = np.cross(b - a, c - a)
+    double_areas = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(double_areas, 1e-12)[:, np.newaxis]
+    planes = np.concatenate(
+        (normals, -(normals * a).sum(axis=1, keepdims=True)), axis=1
+    )
+    face_quadrics = planes[:, :, np.newaxis] * planes[:, np.newaxis, :]
+    face_quadrics *= double_areas[:, np.newaxis, np.newaxis] / 2
+    return _sum_by(
+        triangles.ravel(), np.repeat(face_quadrics, 3, axis=0), len(vertices)
+    )
+
+
+def cluster_vertices(
+    vertices: NDArray, indices: NDArray, quadrics: NDArray, resolution: int
+) -> NDArray:
+    """triangles after merging the vertices of every grid cell into one
+
+    The grid has resolution cells along the longest side of the bounding box.
+    Each cell keeps the one of its vertices with the smallest error under the
+    summed quadric of the cell, so no vertex is created and the result indexes
+    the original vertex buffer. Collapsed and duplicate triangles are dropped.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    low = vertices.min(axis=0)
+    extent = vertices.max(axis=0) - low
+    cell_size = max(float(extent.max()), 1e-12) / resolution
+    counts = np.floor(extent / cell_size).astype(np.int64) + 1
+    cells = np.minimum(np.floor((vertices - low) / cell_size), counts - 1)
+    cells = cells.astype(np.int64)
+    cell_ids = (cells[:, 0] * counts[1] + cells[:, 1]) * counts[2] + cells[:, 2]
+    _, cluster = np.unique(cell_ids, return_inverse=True)
+    cluster = cluster.ravel()
+
+    cluster_quadrics = _sum_by(cluster, quadrics, cluster.max() + 1)
+    points = np.concatenate((vertices, np.ones((len(vertices), 1))), axis=1)
+    errors = np.einsum("ni,nij,nj->n", points, cluster_quadrics[cluster], points)
+    order = np.lexsort((errors, cluster))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cluster[order][1:] != cluster[order][:-1]
+    representative = order[first]  # one per cluster, in cluster order
+
+    triangles = representative[cluster[np.asarray(indices, dtype=np.intp)]]
+    triangles = triangles.reshape(-1, 3)
+    kept = (
+        (triangles[:, 0] != triangles[:, 1])
+        & (triangles[:, 1] != triangles[:, 2])
+        & (triangles[:, 0] != triangles[:, 2])
+    )
+    triangles = triangles[kept]
+    corners = np.sort(triangles, axis=1).astype(np.int64)
+    if len(vertices) < 2**21:  # one int64 key per triangle
+        size = len(vertices)
+        corners = (corners[:, 0] * size + corners[:, 1]) * size + corners[:, 2]
+    _, unique = np.unique(
+        corners, axis=0 if corners.ndim > 1 else None, return_index=True
+    )
+    return triangles[np.sort(unique)].ravel()
+
+
+def simplify(
+    vertices: NDArray,
+    indices: NDArray,
+    target_triangles: int,
+    quadrics: NDArray | None = None,
+    max_steps: int = 8,
+    tolerance: float = 0.1,
+) -> NDArray:
+    """indices of at most target_triangles triangles approximating the mesh
+
+    Searches the finest clustering grid that gets under the target, see
+    cluster_vertices. Surface triangle counts grow about with the square of
+    the grid resolution, which gives the next guess. The search stops within
+    tolerance under the target or after max_steps clusterings with the best
+    grid found so far.
+    """
+    if quadrics is None:
+        quadrics = vertex_quadrics(vertices, indices)
+    low, high = 1, max(int(np.cbrt(len(vertices))) * 8, 2)
+    best, best_resolution = None, 0
+    resolution = min(max(int(np.sqrt(target_triangles / 2)), 1), high)
+    for _ in range(max_steps):
+        triangles = cluster_vertices(vertices, indices, quadrics, resolution)
+        count = len(triangles) // 3
+        if count <= target_triangles:
+            low = resolution
+            if resolution > best_resolution:
+                best, best_resolution = triangles, resolution
+            if count >= target_triangles * (1 - tolerance):
+                break
+        else:
+            high = resolution - 1
+        if low >= high:
+            break
+        guess = round(resolution * np.sqrt(target_triangles / max(count, 1)))
+        resolution = min(max(guess, low + 1), high)
+    if best is None:
+        best = cluster_vertices(vertices, indices, quadrics, low)
+    return best.astype(index_dtype(len(vertices)))
+
+
+def build_lods(
+    vertices: NDArray, indices: NDArray, ratios: tuple[float, ...] = DEFAULT_LOD_RATIOS
+) -> list[NDArray]:
+    """index arrays of the coarser levels, levels that save nothing are left out"""
+    quadrics = vertex_quadrics(vertices, indices)
+    full = len(indices) // 3
+    levels = []
+    previous = full
+    for ratio in ratios:
+        level = simplify(vertices, indices, int(full * ratio), quadrics)
+        if len(level) == 0 or len(level) // 3 >= previous:
+            break
+        levels.append(level)
+        previous = len(level) // 3
+    return levels
+
+
+def load_obj_lods(
+    content: io.BytesIO | bytes,
+    ratios: tuple[float, ...] = DEFAULT_LOD_RATIOS,
+    normals: str | None = "smooth",
+) -> dict[str, NDArray]:
+    """load_obj_arrays plus lod_indices (coarser levels back to back) and
+    lod_counts (indices per level)"""
+    arrays = load_obj_arrays(content, normals)
+    levels = build_lods(arrays["vertices"], arrays["indices"], ratios)
+    dtype = arrays["indices"].dtype
+    arrays["lod_indices"] = np.concatenate(
+        [level.astype(dtype) for level in levels] or [np.empty(0, dtype)]
+    )
+    arrays["lod_counts"] = np.array([len(level) for level in levels], np.int64)
+    return arrays
+
+
+def lod_variant(ratios: tuple[float, ...]) -> str:
+    """mesh cache variant of load_obj_lods output"""
+    return f"lod{LOD_VERSION}:" + ",".join(f"{ratio:g}" for ratio in ratios)
+
+
+def _packed(
+    build: Callable[[bytes], dict[str, NDArray]], content: bytes
+) -> dict[str, NDArray]:
+    return pack_vertex_records(build(content))
+
+
+def obj_builder(
+    ratios: tuple[float, ...] | None,
+    normals: str | None = "smooth",
+) -> tuple[Callable[[bytes], dict[str, NDArray]], str]:
+    """(build, variant) for MeshCache.load, with lods when ratios are given
+    and normals generated as in load_obj_arrays, the per vertex arrays are
+    stored interleaved as Mesh uploads them, see pack_vertex_records"""
+    variant = "records"
+    if ratios:
+        build = functools.partial(load_obj_lods, ratios=tuple(ratios), normals=normals)
+        variant += f";{lod_variant(ratios)}"
+    else:
+        build = functools.partial(load_obj_arrays, normals=normals)
+    if normals != "smooth":
+        variant += f";normals:{normals}"
+    return functools.partial(_packed, build), variant
+
+
+def split_lods(arrays: dict[str, NDArray]) -> list[NDArray]:
+    """the coarser level index arrays stored by load_obj_lods"""
+    if "lod_counts" not in arrays:
+        return []
+    ends = np.cumsum(arrays["lod_counts"])
+    return np.split(arrays["lod_indices"], ends[:-1]) if len(ends) else []
+
+
+def screen_sizes(radii: NDArray, distances: NDArray, projection: NDArray) -> NDArray:
+    """projected height of bounding spheres as a share of the screen height"""
+    return radii * projection[1, 1] / np.maximum(distances, 1e-6)
+
+
+def select_levels(
+    current: NDArray,
+    sizes: NDArray,
+    level_counts: NDArray,
+    thresholds: tuple[float, ...] = DEFAULT_SCREEN_SIZES,
+    hysteresis: float = LOD_HYSTERESIS,
+) -> NDArray:
+    """next lod level of every object from its projected size
+
+    Level i + 1 is used below thresholds[i]. A level only becomes coarser once
+    the size is hysteresis below the threshold and finer once it is hysteresis
+    above it, so objects near a threshold do not switch every frame.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    sizes = np.asarray(sizes)[:, np.newaxis]
+    coarser = (sizes < thresholds * (1 - hysteresis)).sum(axis=1)
+    finer = (sizes < thresholds * (1 + hysteresis)).sum(axis=1)
+    levels = np.where(coarser > current, coarser, current)
+    levels = np.where(finer < current, finer, levels)
+    return np.minimum(levels, np.asarray(level_counts) - 1)
@@ -1,18 +1,31 @@
+import ctypes
 import io
-from typing import Self, Callable
+from typing import Self
 from OpenGL.GL import *
 import pygame
 from numpy.typing import NDArray
 import numpy as np
-from core.uniform import UniformSampler2D, UniformMat4
+from core.uniform import UniformSampler2D, UniformMat3, UniformMat4
 import core.transformations as transform
 from core.texture import Texture
-from core.graphics_data import GraphicsDataVec
+from core.texture_array import PackedTexture
+from core.graphics_data import (
+    GraphicsDataIndex,
+    GraphicsDataInterleaved,
+    VertexLayout,
+    unpack_vertex_records,
+)
 from core.shader import Shader
-from core.utils import parse_obj
 from core.light import Light
 from core.camera import Camera
-from core.utils import form_vertices
+from core.transform_component import Transform
+from core.scene_graph import SceneNode
+from core.utils import bounding_volumes, load_obj_arrays
+from core.lod import obj_builder, split_lods
+from core.mesh_cache import MeshCache
+from core.profiler import profiler
+
+default_mesh_cache = MeshCache()
 
 
 class Mesh:
@@ -29,77 +42,109 @@ class Mesh:
         scale: pygame.Vector3 | None = None,
         shader: Shader | None = None,
         lights: list[Light] | None = None,
+        indices: NDArray | None = None,
+        blended: bool = False,
+        texture: Texture | PackedTexture | None = None,
+        lods: list[NDArray] | None = None,
+        vertex_tangents: NDArray | None = None,
+        vertex_records: NDArray | None = None,
     ):
         self.shader = shader
+        self.blended = blended
         self.vertices = vertices
+        self.aabb_min, self.aabb_max, self.bounds_center, self.bounds_radius = (
+            bounding_volumes(vertices)
+        )
+        self.bounds_version = 0
+        self.indices = None
         self.draw_type = draw_type
         self.vao_ref = glGenVertexArrays(1)
         self.vertex_normals = vertex_normals
         self.vertex_textures = vertex_textures
+        self.vertex_tangents = vertex_tangents
         self.texture = None
         self.texture_var = None
-        self.init_translation = translation
-        self.init_rotation = rotation
-        self.init_scale = scale
         self.lights = lights or []
-        self.init_translation = translation or pygame.Vector3(0, 0, 0)
-        self.init_rotation = rotation or transform.Rotation(0, pygame.Vector3(0, 1, 0))
-        self.init_scale = scale or pygame.Vector3(1, 1, 1)
-        self.actions: list[Callable] = []
+        self.transform = Transform(translation, rotation, scale)
+        self.node: SceneNode | None = None  # set when added to a screen
+        self.synced_version = -1  # transform version last written to the node
 
         self.colors = (
             colors
             if colors is not None
             else np.random.uniform(0, 1, (len(vertices), 4)).astype(np.float32)
         )
-        glBindVertexArray(self.vao_ref)
-
-        position = GraphicsDataVec(self.vertices)
-        position.find_variable(
-            self.shader.program_id, self.shader.vertex_position_var
-        )  # TODO: refactor hardcoded variable
-        position.load_data()
-        colors = GraphicsDataVec(self.colors)
-        colors.find_variable(self.shader.program_id, self.shader.vertex_color_var)
-        colors.load_data()
-        if vertex_normals is not None:
-            v_normals = GraphicsDataVec(self.vertex_normals)
-            v_normals.find_variable(
-                self.shader.program_id, self.shader.vertex_normal_Var
-            )
-            v_normals.load_data()
-        self.transformation_mat = transform.rotateA(
-            transform.identity_matrix(),
-            self.init_rotation.angle,
-            self.init_rotation.axis,
-        )
-        self.transformation_mat = transform.translate(
-            self.transformation_mat,
-            self.init_translation,
-        )
-        self.transformation_mat = transform.do_scale(
-            self.transformation_mat, self.init_scale
-        )
-        self.transformation = UniformMat4(self.transformation_mat)
-        self.transformation.find_variable(
-            self.shader.program_id, self.shader.model_matrix_var
+        textured = vertex_textures is not None and (
+            teximage is not None or texture is not None
         )
-        if teximage is not None and vertex_textures is not None:
-            textures = GraphicsDataVec(self.vertex_textures)
-            textures.find_variable(
-                self.shader.program_id, self.shader.vertex_tex_uv_var
+        attributes = {"color": self.colors}
+        if textured and isinstance(texture, PackedTexture):
+            attributes.update(texture.vertex_attributes(self.vertex_textures))
+        # geometry packed ahead of time (vertex_records) is uploaded as is, the
+        # per mesh attributes then go into a second buffer
+        self.extra_vertex_data = None
+        if vertex_records is None:
+            geometry = {"position": self.vertices}
+            if vertex_normals is not None:
+                geometry["normal"] = self.vertex_normals
+            # only uploaded for shaders that read them, e.g. for normal maps
+            if vertex_tangents is not None and (
+                self.shader.attribute_location(self.shader.vertex_tangent_var) >= 0
+            ):
+                geometry["tangent"] = self.vertex_tangents
+            if textured:
+                geometry["uv"] = self.vertex_textures
+            attributes = geometry | attributes
+            vertex_records = VertexLayout.from_arrays(attributes).pack(attributes)
+        else:
+            layout = VertexLayout.from_arrays(attributes)
+            self.extra_vertex_data = GraphicsDataInterleaved(
+                layout.pack(attributes), layout
             )
-            textures.load_data()
-            self.texture = Texture(teximage)
-            self.texture_var = UniformSampler2D([self.texture.texture_id, 1])
-            self.texture_var.find_variable(
-                self.shader.program_id, self.shader.vertex_tex_var
+            self.extra_vertex_data.find_variables(self.shader)
+        self.layout = VertexLayout.from_dtype(vertex_records.dtype)
+        self.vertex_data = GraphicsDataInterleaved(vertex_records, self.layout)
+        self.vertex_data.find_variables(self.shader, () if textured else ("uv",))
+        glBindVertexArray(self.vao_ref)
+        self.vertex_data.load_data()
+        if self.extra_vertex_data is not None:
+            self.extra_vertex_data.load_data()
+        # (byte offset, count) of every level of detail in the element buffer,
+        # coarser levels follow the full one, see core.lod
+        self.lod_ranges = [(0, len(vertices))]
+        self.lod_level = 0
+        if indices is not None:
+            levels = [np.asarray(indices), *(lods or [])]
+            self.indices = GraphicsDataIndex(np.concatenate(levels))
+            self.indices.load_data()
+            counts = [len(level) for level in levels]
+            starts = np.cumsum([0, *counts[:-1]]) * self.indices.data.itemsize
+            self.lod_ranges = list(zip(starts.tolist(), counts))
+        self.transformation = UniformMat4(self.transform.matrix)
+        self.mvp = UniformMat4(transform.identity_matrix())
+        self.normal_matrix = UniformMat3(np.eye(3, dtype=np.float32))
+        # camera version the mvp was last computed for
+        self.frame_version = -1
+        self.object_uniforms = []
+        for uniform, variable in (
+            (self.transformation, self.shader.model_matrix_var),
+            (self.mvp, self.shader.mvp_matrix_var),
+            (self.normal_matrix, self.shader.normal_matrix_var),
+        ):
+            if variable in self.shader.uniforms:
+                uniform.find_variable(self.shader, variable)
+                self.object_uniforms.append(uniform)
+        if textured:
+            self.texture = (texture or Texture(teximage)).acquire()
+            self.texture_var = UniformSampler2D(
+                [self.texture.texture_id, 1], self.texture.target
             )
+            self.texture_var.find_variable(self.shader, self.shader.vertex_tex_var)
 
     @classmethod
-    def from_stream(
+    def from_arrays(
         cls,
-        source: io.BytesIO,
+        arrays: dict[str, NDArray],
         teximage: pygame.Surface | None = None,
         colors: NDArray | None = None,
         draw_type: int = GL_TRIANGLES,
@@ -107,24 +152,54 @@ class Mesh:
         rotation: transform.Rotation | None = None,
         scale: pygame.Vector3 | None = None,
         shader: Shader | None = None,
+        texture: Texture | PackedTexture | None = None,
     ) -> Self:
-        coordinates, normals, textures, triangles, textures_ids, normals_ids = (
-            parse_obj(source)
-        )
-        vertices = form_vertices(coordinates, triangles)
-        vertex_normals = form_vertices(normals, normals_ids)
-        vertex_textures = form_vertices(textures, textures_ids)
+        """builds a mesh from the output of core.utils.load_obj_arrays, with
+        the levels of detail of core.lod.load_obj_lods when present, the per
+        vertex arrays may be packed into vertex_records (see core.lod.obj_builder)
+        """
+        arrays = unpack_vertex_records(arrays)
         return cls(
-            vertices,
+            arrays["vertices"],
             teximage=teximage,
             colors=colors,
             draw_type=draw_type,
-            vertex_normals=vertex_normals,
-            vertex_textures=vertex_textures,
+            vertex_normals=arrays.get("vertex_normals"),
+            vertex_textures=arrays.get("vertex_textures"),
             translation=translation,
             rotation=rotation,
             scale=scale,
             shader=shader,
+            indices=arrays.get("indices"),
+            texture=texture,
+            lods=split_lods(arrays),
+            vertex_tangents=arrays.get("vertex_tangents"),
+            vertex_records=arrays.get("vertex_records"),
+        )
+
+    @classmethod
+    def from_stream(
+        cls,
+        source: io.BytesIO,
+        teximage: pygame.Surface | None = None,
+        colors: NDArray | None = None,
+        draw_type: int = GL_TRIANGLES,
+        translation: pygame.Vector3 | None = None,
+        rotation: transform.Rotation | None = None,
+        scale: pygame.Vector3 | None = None,
+        shader: Shader | None = None,
+        texture: Texture | PackedTexture | None = None,
+    ) -> Self:
+        return cls.from_arrays(
+            load_obj_arrays(source),
+            teximage,
+            colors,
+            draw_type,
+            translation,
+            rotation,
+            scale,
+            shader,
+            texture,
         )
 
     @classmethod
@@ -138,60 +213,152 @@ class Mesh:
         rotation: transform.Rotation | None = None,
         scale: pygame.Vector3 | None = None,
         shader: Shader | None = None,
+        cache: MeshCache | None = None,
+        texture: Texture | PackedTexture | None = None,
+        lod_ratios: tuple[float, ...] | None = None,
+        normals: str | None = "smooth",
     ) -> Self:
-        with open(path, "rb") as f:
-            return cls.from_stream(
-                f, teximage, colors, draw_type, translation, rotation, scale, shader
-            )
+        """loads an obj file through the mesh cache, see core.mesh_cache
+
+        lod_ratios adds simplified levels with those shares of the triangles,
+        e.g. core.lod.DEFAULT_LOD_RATIOS, they are cached with the mesh.
+        normals ("smooth", "flat" or None) is used when the file has none,
+        see core.normals.
+        """
+        cache = cache or default_mesh_cache
+        return cls.from_arrays(
+            cache.load(path, *obj_builder(lod_ratios, normals)),
+            teximage,
+            colors,
+            draw_type,
+            translation,
+            rotation,
+            scale,
+            shader,
+            texture,
+        )
+
+    @property
+    def dedupe_ratio(self) -> float:
+        """triangle corners per uploaded vertex, 1.0 for non-indexed meshes"""
+        if self.indices is None:
+            return 1.0
+        return self.lod_ranges[0][1] / len(self.vertices)
+
+    @property
+    def triangle_count(self) -> int:
+        """triangles of the current level of detail"""
+        if self.draw_type != GL_TRIANGLES:
+            return 0
+        return self.lod_ranges[self.lod_level][1] // 3
+
+    @property
+    def submitted_triangles(self) -> int:
+        """triangles one draw_geometry() call submits"""
+        return self.triangle_count
+
+    def release(self) -> None:
+        """drops the texture reference, see Texture.release"""
+        if self.texture is not None:
+            self.texture.release()
+            self.texture = None
+            self.texture_var = None
 
     def add_lights(self, lights: list[Light]) -> None:
         self.lights.extend(lights)
 
-    def rotate(self, rotation: transform.Rotation) -> None:
-        def func() -> None:
-            self.transformation_mat = transform.rotateA(
-                self.transformation_mat,
-                rotation.angle,
-                rotation.axis,
-            )
-            self.transformation = UniformMat4(self.transformation_mat)
-            self.transformation.find_variable(
-                self.shader.program_id, self.shader.model_matrix_var
-            )
-            self.transformation.load_data()
+    def bounding_sphere(self) -> tuple[NDArray, float]:
+        """local bounding sphere, bounds_version grows when it changes"""
+        return self.bounds_center, self.bounds_radius
 
-        self.actions.append(func)
+    def bounding_box(self) -> tuple[NDArray, NDArray]:
+        """local aabb min and max, changes along with bounding_sphere"""
+        return self.aabb_min, self.aabb_max
 
-    def translate(self, translation: pygame.Vector3) -> None:
-        def func() -> None:
-            self.transformation_mat = transform.translate(
-                self.transformation_mat, translation
-            )
-            self.transformation = UniformMat4(self.transformation_mat)
-            self.transformation.load_data()
+    @property
+    def transformation_mat(self) -> NDArray:
+        return self.transform.matrix
+
+    @property
+    def model_matrix(self) -> NDArray:
+        """world matrix from the scene graph, the local transform if there is none"""
+        if self.node is not None:
+            return self.node.world
+        return self.transform.matrix
 
-        self.actions.append(func)
+    @property
+    def model_version(self) -> int:
+        if self.node is not None:
+            return self.node.version
+        return self.transform.version
+
+    def rotate(self, rotation: transform.Rotation) -> None:
+        """keeps rotating by rotation.angle degrees per second"""
+        self.transform.add_angular_velocity(rotation)
+
+    def translate(self, translation: pygame.Vector3) -> None:
+        """keeps moving by translation per second"""
+        self.transform.add_velocity(translation)
 
     def scale(self, scale: pygame.Vector3) -> None:
-        def func() -> None:
-            self.transformation_mat = transform.do_scale(self.transformation_mat, scale)
-            self.transformation = UniformMat4(self.transformation_mat)
-            self.transformation.load_data()
+        """keeps scaling by a factor of scale per second"""
+        self.transform.add_scale_rate(scale)
+
+    def update(self, dt: float) -> None:
+        self.transform.update(dt)
 
-        self.actions.append(func)
+    @property
+    def state_key(self) -> tuple[int, int, int]:
+        """(program, texture, vao) this mesh binds to draw"""
+        texture_id = self.texture.texture_id if self.texture is not None else 0
+        return self.shader.program_id, texture_id, self.vao_ref
+
+    def set_frame_matrices(
+        self, mvp: NDArray, normal_matrix: NDArray, camera_version: int
+    ) -> None:
+        """matrices precomputed for this frame, Screen does it for all meshes at once"""
+        self.mvp.data = mvp
+        self.normal_matrix.data = normal_matrix
+        self.frame_version = camera_version
+
+    def compute_frame_matrices(self, camera: Camera) -> None:
+        model = self.model_matrix
+        self.set_frame_matrices(
+            camera.projection_mat @ camera.view_mat @ model,
+            np.linalg.inv(model[:3, :3]).T,
+            camera.version,
+        )
 
     def draw(self, camera: Camera) -> None:
+        """draws with the full state setup, see core.render_queue for batches"""
+        self.compute_frame_matrices(camera)
         self.shader.use()
-        camera.update(self.shader)
+        camera.load(self.shader)
         for light in self.lights:
-            light.update(self.shader.program_id)
+            light.update(self.shader)
         if self.texture_var:
             self.texture_var.load_data()
-        for action in self.actions:
-            action()
-        self.transformation.load_data()
         glBindVertexArray(self.vao_ref)
-        glDrawArrays(self.draw_type, 0, len(self.vertices))
+        self.draw_geometry()
+
+    def load_model(self) -> None:
+        model_state = (self, self.model_version, self.frame_version)
+        if self.shader.loaded_model != model_state:
+            self.transformation.data = self.model_matrix
+            for uniform in self.object_uniforms:
+                uniform.load_data()
+            self.shader.loaded_model = model_state
+
+    def draw_geometry(self) -> None:
+        """model upload and draw call, program, textures and vao must be bound"""
+        self.load_model()
+        start, count = self.lod_ranges[self.lod_level]
+        if self.indices is not None:
+            glDrawElements(
+                self.draw_type, count, self.indices.gl_type, ctypes.c_void_p(start)
+            )
+        else:
+            glDrawArrays(self.draw_type, 0, count)
 
 
 class Cube(Mesh):
@@ -290,3 +457,209 @@ class Axes(Mesh):
             draw_type=GL_LINES,
             translation=translation,
         )
+
+
+# per-instance attributes, matrices are stored column-major like GLSL expects
+INSTANCE_DTYPE = np.dtype(
+    [
+        ("model_mat", np.float32, (4, 4)),
+        ("normal_mat", np.float32, (3, 4)),
+        ("tint", np.float32, (4,)),
+    ]
+)
+
+
+class InstancedMesh(Mesh):
+    """one geometry upload drawn many times with a single instanced draw call
+
+    Every instance has a model matrix (applied before the mesh transform), the
+    matching normal matrix and a color tint. They live in a numpy backed
+    instance buffer, changed instances are uploaded in contiguous runs before
+    the next draw. The shader needs the attributes named below, see
+    shaders/instanced_*.vs.
+    """
+
+    model_attribute = "instance_model"
+    normal_attribute = "instance_normal"
+    tint_attribute = "instance_tint"
+    # above this many separate changed runs the whole changed span is uploaded
+    max_upload_runs = 8
+
+    def __init__(self, vertices: NDArray, *args, capacity: int = 16, **kwargs):
+        super().__init__(vertices, *args, **kwargs)
+        self.instance_count = 0
+        self.instance_data = np.zeros(max(capacity, 1), dtype=INSTANCE_DTYPE)
+        self.instance_dirty = np.zeros(len(self.instance_data), dtype=bool)
+        self.instance_buffer = glGenBuffers(1)
+        self._instance_bounds: tuple[NDArray, float] | None = None
+        self._allocate_instances()
+
+    @property
+    def instances(self) -> NDArray:
+        return self.instance_data[: self.instance_count]
+
+    def _allocate_instances(self) -> None:
+        glBindVertexArray(self.vao_ref)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        glBufferData(
+            GL_ARRAY_BUFFER, self.instance_data.view(np.uint8), GL_DYNAMIC_DRAW
+        )
+        profiler.count("bytes uploaded", self.instance_data.nbytes)
+        stride = INSTANCE_DTYPE.itemsize
+        for name, field, columns, components in (
+            (self.model_attribute, "model_mat", 4, 4),
+            (self.normal_attribute, "normal_mat", 3, 3),
+            (self.tint_attribute, "tint", 1, 4),
+        ):
+            variable_id = self.shader.attribute_location(name)
+            if variable_id < 0:
+                continue
+            offset = INSTANCE_DTYPE.fields[field][1]
+            for column in range(columns):
+                glVertexAttribPointer(
+                    variable_id + column,
+                    components,
+                    GL_FLOAT,
+                    False,
+                    stride,
+                    ctypes.c_void_p(offset + column * 16),
+                )
+                glEnableVertexAttribArray(variable_id + column)
+                glVertexAttribDivisor(variable_id + column, 1)
+        glBindVertexArray(0)
+        self.instance_dirty[:] = False
+
+    def _reserve(self, count: int) -> None:
+        if count <= len(self.instance_data):
+            return
+        capacity = max(count, 2 * len(self.instance_data))
+        data = np.zeros(capacity, dtype=INSTANCE_DTYPE)
+        data[: self.instance_count] = self.instances
+        self.instance_data = data
+        self.instance_dirty = np.zeros(capacity, dtype=bool)
+        self._allocate_instances()
+
+    def set_instances(
+        self,
+        start: int,
+        matrices: NDArray | None = None,
+        tints: NDArray | None = None,
+    ) -> None:
+        """updates (or appends) the instances from start on, (N, 4, 4) matrices
+
+        Instances with a singular matrix, e.g. hidden with a zero scale, get the
+        pseudo-inverse as normal matrix.
+        """
+        if matrices is None and tints is None:
+            raise ValueError("set_instances needs matrices, tints or both")
+        if matrices is not None:
+            matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+        if tints is not None:
+            tints = np.asarray(tints, dtype=np.float32).reshape(-1, 4)
+        if matrices is not None and tints is not None and len(matrices) != len(tints):
+            raise ValueError(
+                f"{len(matrices)} matrices and {len(tints)} tints for set_instances"
+            )
+        count = len(matrices) if matrices is not None else len(tints)
+        end = start + count
+        self._reserve(end)
+        if end > self.instance_count:
+            new = slice(self.instance_count, end)
+            self.instance_data["model_mat"][new] = np.eye(4, dtype=np.float32)
+            self.instance_data["normal_mat"][new] = np.eye(3, 4, dtype=np.float32)
+            self.instance_data["tint"][new] = 1.0
+            self.instance_count = end
+        if matrices is not None:
+            self.instance_data["model_mat"][start:end] = matrices.transpose(0, 2, 1)
+            try:
+                inverse = np.linalg.inv(matrices[:, :3, :3])
+            except np.linalg.LinAlgError:
+                inverse = np.linalg.pinv(matrices[:, :3, :3])
+            # columns of the inverse transpose are the rows of the inverse
+            self.instance_data["normal_mat"][start:end, :, :3] = inverse
+            self._instance_bounds = None
+            self.bounds_version += 1
+        if tints is not None:
+            self.instance_data["tint"][start:end] = tints
+        self.instance_dirty[start:end] = True
+
+    def add_instance(
+        self, matrix: NDArray | None = None, tint: NDArray | None = None
+    ) -> int:
+        index = self.instance_count
+        matrix = transform.identity_matrix() if matrix is None else matrix
+        self.set_instances(
+            index,
+            np.asarray(matrix)[np.newaxis],
+            None if tint is None else np.asarray(tint)[np.newaxis],
+        )
+        return index
+
+    def set_instance(
+        self, index: int, matrix: NDArray | None = None, tint: NDArray | None = None
+    ) -> None:
+        self.set_instances(
+            index,
+            None if matrix is None else np.asarray(matrix)[np.newaxis],
+            None if tint is None else np.asarray(tint)[np.newaxis],
+        )
+
+    def flush_instances(self) -> None:
+        dirty = self.instance_dirty[: self.instance_count]
+        if not dirty.any():
+            return
+        edges = np.flatnonzero(np.diff(dirty.view(np.int8), prepend=0, append=0))
+        runs = list(zip(edges[::2], edges[1::2]))
+        if len(runs) > self.max_upload_runs:
+            runs = [(runs[0][0], runs[-1][1])]
+        stride = INSTANCE_DTYPE.itemsize
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        for start, end in runs:
+            glBufferSubData(
+                GL_ARRAY_BUFFER,
+                int(start) * stride,
+                self.instance_data[start:end].view(np.uint8),
+            )
+            profiler.count("bytes uploaded", int(end - start) * stride)
+        self.instance_dirty[:] = False
+
+    @property
+    def submitted_triangles(self) -> int:
+        return self.triangle_count * self.instance_count
+
+    def bounding_sphere(self) -> tuple[NDArray, float]:
+        """sphere around every instance of the local bounding sphere"""
+        if self.instance_count == 0:
+            return self.bounds_center, 0.0
+        if self._instance_bounds is None:
+            matrices = self.instances["model_mat"].transpose(0, 2, 1)
+            centers = matrices[:, :3, :3] @ self.bounds_center + matrices[:, :3, 3]
+            scales = np.sqrt((matrices[:, :3, :3] ** 2).sum(axis=1)).max(axis=1)
+            center = (centers.min(axis=0) + centers.max(axis=0)) / 2
+            radius = np.linalg.norm(centers - center, axis=1) + scales * (
+                self.bounds_radius
+            )
+            self._instance_bounds = center, float(radius.max())
+        return self._instance_bounds
+
+    def bounding_box(self) -> tuple[NDArray, NDArray]:
+        """cube around bounding_sphere"""
+        center, radius = self.bounding_sphere()
+        return center - radius, center + radius
+
+    def draw_geometry(self) -> None:
+        self.flush_instances()
+        if self.instance_count == 0:
+            return
+        self.load_model()
+        start, count = self.lod_ranges[self.lod_level]
+        if self.indices is not None:
+            glDrawElementsInstanced(
+                self.draw_type,
+                count,
+                self.indices.gl_type,
+                ctypes.c_void_p(start),
+                self.instance_count,
+            )
+        else:
+            glDrawArraysInstanced(self.draw_type, 0, count, self.instance_count)
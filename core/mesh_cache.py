@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from typing import Callable
+from numpy.typing import NDArray
+import numpy as np
+from core.utils import OBJ_PARSER_VERSION
+
+MAGIC = b"AUCHMESH"
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+
+def default_cache_dir(name: str = "meshes") -> str:
+    if directory := os.environ.get("AUCHENGINE_CACHE_DIR"):
+        return os.path.join(directory, name)
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join("~", ".cache")
+    return os.path.join(os.path.expanduser(base), "auchengine", name)
+
+
+def write_arrays(path: str, arrays: dict[str, NDArray]) -> None:
+    """writes arrays as <magic><header size><json header><aligned array data>,
+    record arrays keep their fields"""
+    entries = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        entries.append(
+            {
+                "name": name,
+                "dtype": np.lib.format.dtype_to_descr(array.dtype),
+                "shape": array.shape,
+                "offset": offset,
+            }
+        )
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({"version": FORMAT_VERSION, "arrays": entries}).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for entry, array in zip(entries, arrays.values()):
+            f.seek(data_start + entry["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(f.name, path)
+
+
+def map_arrays(path: str) -> dict[str, NDArray]:
+    """memory-maps a file written by write_arrays, arrays are read-only views"""
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(mapped[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a mesh cache file")
+    (header_size,) = struct.unpack("<I", mapped[len(MAGIC) : len(MAGIC) + 4])
+    header_start = len(MAGIC) + 4
+    header = json.loads(bytes(mapped[header_start : header_start + header_size]))
+    if header["version"] != FORMAT_VERSION:
+        raise ValueError(f"{path} has an unsupported format version")
+    data_start = -(-(header_start + header_size) // ALIGNMENT) * ALIGNMENT
+
+    arrays = {}
+    for entry in header["arrays"]:
+        dtype = np.lib.format.descr_to_dtype(entry["dtype"])
+        start = data_start + entry["offset"]
+        size = int(np.prod(entry["shape"])) * dtype.itemsize
+        arrays[entry["name"]] = (
+            mapped[start : start + size].view(dtype).reshape(entry["shape"])
+        )
+    return arrays
+
+
+class MeshCache:
+    """on-disk cache of processed mesh arrays
+
+    Entries are named <source path hash>-<content hash>, the content hash also
+    covers the parser and file format versions. Builds producing different
+    arrays from the same file (e.g. with lods) pass a variant, which is part
+    of the source hash. Writing a new entry for a source removes its stale
+    entries, and the least recently used entries are removed once the cache
+    grows past max_bytes.
+    """
+
+    def __init__(
+        self, directory: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def entry_path(self, path: str, content: bytes, variant: str = "") -> str:
+        source = os.path.abspath(path) + (f"|{variant}" if variant else "")
+        source_id = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+        content_hash = hashlib.blake2b(content, digest_size=16)
+        content_hash.update(f"{OBJ_PARSER_VERSION}.{FORMAT_VERSION}".encode())
+        return os.path.join(
+            self.directory, f"{source_id}-{content_hash.hexdigest()}.mesh"
+        )
+
+    def load(
+        self,
+        path: str,
+        build: Callable[[bytes], dict[str, NDArray]],
+        variant: str = "",
+    ) -> dict[str, NDArray]:
+        """mapped arrays for the file at path, built and stored on a cache miss"""
+        with open(path, "rb") as f:
+            content = f.read()
+        entry = self.entry_path(path, content, variant)
+        try:
+            arrays = map_arrays(entry)
+            os.utime(entry)
+            return arrays
+        except (OSError, ValueError):
+            pass
+
+        arrays = build(content)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._remove_stale(entry)
+            write_arrays(entry, arrays)
+            self.prune()
+        except OSError:
+            pass  # the cache is an optimisation only, e.g. on read-only media
+        return arrays
+
+    def _remove_stale(self, entry: str) -> None:
+        source_id = os.path.basename(entry).split("-")[0]
+        for name in os.listdir(self.directory):
+            if name.startswith(source_id + "-") and name.endswith(".mesh"):
+                os.remove(os.path.join(self.directory, name))
+
+    def prune(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".mesh"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self) -> None:
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".mesh"):
+                    os.remove(os.path.join(self.directory, name))
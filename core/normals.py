@@ -0,0 +1,197 @@
+from numpy.typing import NDArray
+import numpy as np
+
+# smooth normals are not averaged across edges sharper than this, in degrees
+DEFAULT_CREASE_ANGLE = 60.0
+NORMAL_MODES = ("smooth", "flat")
+
+
+def _sum_by(groups: NDArray, values: NDArray, count: int) -> NDArray:
+    """(count, 3) sums of the (N, 3) values per group"""
+    return np.stack(
+        [np.bincount(groups, values[:, k], count) for k in range(values.shape[1])],
+        axis=1,
+    )
+
+
+def _normalized(vectors: NDArray) -> NDArray:
+    """unit vectors, zero ones stay zero"""
+    lengths = np.sqrt(np.einsum("...i,...i->...", vectors, vectors))[..., np.newaxis]
+    return vectors / np.maximum(lengths, 1e-20)
+
+
+def _gather(values: NDArray, triangles: NDArray) -> NDArray:
+    """(F, 3, K) float32 values at the corners of every triangle"""
+    return np.asarray(values, dtype=np.float32)[
+        np.asarray(triangles, dtype=np.intp).reshape(-1, 3)
+    ]
+
+
+def _triangle_geometry(corners: NDArray) -> tuple[NDArray, NDArray, NDArray]:
+    """(edges, face normals, corner angles) of (F, 3, 3) triangle corners,
+    edge k runs from corner k to corner k + 1"""
+    edges = np.roll(corners, -1, axis=1) - corners
+    normals = _normalized(np.cross(edges[:, 0], -edges[:, 2]))
+    directions = _normalized(edges)
+    cosines = -np.einsum("fci,fci->fc", directions, np.roll(directions, 1, axis=1))
+    return edges, normals, np.arccos(np.clip(cosines, -1.0, 1.0))
+
+
+def face_normals(coordinates: NDArray, triangles: NDArray) -> NDArray:
+    """(F, 3) unit normals of counter-clockwise triangles, zero when degenerate"""
+    return _triangle_geometry(_gather(coordinates, triangles))[1]
+
+
+def corner_angles(coordinates: NDArray, triangles: NDArray) -> NDArray:
+    """(F, 3) interior angle in radians at every triangle corner"""
+    return _triangle_geometry(_gather(coordinates, triangles))[2]
+
+
+def flat_normals(coordinates: NDArray, triangles: NDArray) -> tuple[NDArray, NDArray]:
+    """(normals, normals_ids) with every triangle's own normal at its corners"""
+    normals = face_normals(coordinates, triangles).astype(np.float32)
+    return normals, np.repeat(np.arange(len(normals), dtype=np.int64), 3)
+
+
+def smooth_normals(
+    coordinates: NDArray,
+    triangles: NDArray,
+    crease_angle: float = DEFAULT_CREASE_ANGLE,
+) -> tuple[NDArray, NDArray]:
+    """(normals, normals_ids) averaged over the triangles around each vertex
+
+    Triangles are weighted by their angle at the vertex, so the result does
+    not depend on how a surface is triangulated. At vertices where the
+    triangle normals spread wider than crease_angle every corner only
+    averages the triangles within crease_angle of its own, which keeps hard
+    edges hard. The output has the layout of the normals and normals_ids of
+    parse_obj, index_vertices splits vertices on the creases.
+    """
+    triangles = np.asarray(triangles, dtype=np.intp)
+    vertex_count = len(coordinates)
+    _, faces, weights = _triangle_geometry(_gather(coordinates, triangles))
+    weights = weights.ravel()
+    corner_normals = np.repeat(faces, 3, axis=0)
+    contributions = corner_normals * weights[:, np.newaxis]
+    vertex_normals = _normalized(_sum_by(triangles, contributions, vertex_count))
+    if crease_angle >= 180:
+        return vertex_normals.astype(np.float32), triangles.astype(np.int64)
+
+    # no two triangles deviating at most half the crease angle from the
+    # average can be a crease apart, only the other vertices need pairs
+    limit = np.cos(np.radians(crease_angle))
+    deviation = np.einsum("ci,ci->c", corner_normals, vertex_normals[triangles])
+    spread = (deviation < np.cos(np.radians(crease_angle) / 2)) & (weights > 0)
+    creased = np.bincount(triangles[spread], minlength=vertex_count) > 0
+    creased_corners = np.flatnonzero(creased[triangles])
+    normals_ids = triangles.astype(np.int64)
+    if len(creased_corners) == 0:
+        return vertex_normals.astype(np.float32), normals_ids
+
+    # every ordered pair of corners around the same creased vertex
+    order = creased_corners[np.argsort(triangles[creased_corners], kind="stable")]
+    _, group_starts, group_sizes = np.unique(
+        triangles[order], return_index=True, return_counts=True
+    )
+    sizes = np.repeat(group_sizes, group_sizes)
+    starts = np.repeat(group_starts, group_sizes)
+    first = np.repeat(np.arange(len(order)), sizes)
+    second = (
+        starts[first]
+        + np.arange(len(first))
+        - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    )
+    a, b = order[first], order[second]
+    close = np.einsum("ci,ci->c", corner_normals[a], corner_normals[b])
+    close = close >= limit
+    creased_normals = _normalized(
+        _sum_by(first[close], contributions[b[close]], len(order))
+    )
+    # corners of degenerate triangles fall back to the vertex normal
+    missing = ~creased_normals.any(axis=1)
+    creased_normals[missing] = vertex_normals[triangles[order[missing]]]
+
+    # corners around a vertex that averaged the same triangles share a normal
+    quantized = np.round(creased_normals * 2**20).astype(np.int64)
+    keys = np.column_stack((triangles[order], quantized))
+    _, first_use, inverse = np.unique(
+        keys, axis=0, return_index=True, return_inverse=True
+    )
+    normals_ids[order] = vertex_count + inverse.ravel()
+    normals = np.concatenate((vertex_normals, creased_normals[first_use]))
+    return normals.astype(np.float32), normals_ids
+
+
+def generate_normals(
+    coordinates: NDArray,
+    triangles: NDArray,
+    mode: str = "smooth",
+    crease_angle: float = DEFAULT_CREASE_ANGLE,
+) -> tuple[NDArray, NDArray]:
+    """(normals, normals_ids) of smooth_normals or flat_normals"""
+    if mode == "smooth":
+        return smooth_normals(coordinates, triangles, crease_angle)
+    if mode == "flat":
+        return flat_normals(coordinates, triangles)
+    raise ValueError(f"unknown normal mode {mode!r}, expected one of {NORMAL_MODES}")
+
+
+def _uv_frames(edges: NDArray, uv: NDArray) -> tuple[NDArray, NDArray]:
+    """(F, 3) unit object space direction of growing u on every triangle and
+    whether its uvs are mirrored, from _triangle_geometry edges and uvs"""
+    edge1, edge2 = edges[:, 0], -edges[:, 2]
+    du1, dv1 = (uv[:, 1] - uv[:, 0]).T
+    du2, dv2 = (uv[:, 2] - uv[:, 0]).T
+    # only the direction matters, so the 1 / determinant is left out but its sign
+    mirrored = du1 * dv2 - du2 * dv1 < 0
+    sign = np.where(mirrored, -1, 1).astype(np.float32)
+    u = edge1 * (dv2 * sign)[:, np.newaxis] - edge2 * (dv1 * sign)[:, np.newaxis]
+    return _normalized(u), mirrored
+
+
+def corner_handedness(uvs: NDArray, uv_triangles: NDArray) -> NDArray:
+    """1 at the corners of triangles with mirrored (clockwise) uvs, else 0
+
+    Passed to index_vertices so mirrored and regular triangles do not share
+    vertices, their tangent frames would cancel out.
+    """
+    uv = _gather(uvs, uv_triangles)
+    du1, dv1 = (uv[:, 1] - uv[:, 0]).T
+    du2, dv2 = (uv[:, 2] - uv[:, 0]).T
+    mirrored = du1 * dv2 - du2 * dv1 < 0
+    return np.repeat(mirrored.astype(np.int64), 3)
+
+
+def vertex_tangents(
+    vertices: NDArray, normals: NDArray, uvs: NDArray, indices: NDArray
+) -> NDArray:
+    """(N, 4) tangents of indexed vertices, MikkTSpace style
+
+    xyz is the unit direction of growing u, orthogonal to the normal, w is
+    the handedness so shaders get the bitangent as cross(normal, xyz) * w.
+    Every triangle adds its normalized u direction weighted by the corner
+    angle, the sum is then made orthogonal to the vertex normal. Vertices
+    should not be shared by mirrored and regular triangles, see
+    corner_handedness.
+    """
+    triangles = np.asarray(indices, dtype=np.intp)
+    normals = np.asarray(normals, dtype=np.float32)
+    edges, _, weights = _triangle_geometry(_gather(vertices, triangles))
+    weights = weights.ravel()
+    directions, mirrored = _uv_frames(edges, _gather(uvs, triangles))
+
+    contributions = np.repeat(directions, 3, axis=0) * weights[:, np.newaxis]
+    tangents = _sum_by(triangles, contributions, len(vertices))
+    tangents -= normals * np.einsum("ni,ni->n", normals, tangents)[:, np.newaxis]
+    tangents = _normalized(tangents)
+    # vertices without usable uvs get any direction in their tangent plane
+    missing = ~tangents.any(axis=1)
+    if missing.any():
+        helper = np.where(
+            np.abs(normals[missing, :1]) < 0.9, [[1.0, 0, 0]], [[0, 1.0, 0]]
+        )
+        tangents[missing] = _normalized(np.cross(helper, normals[missing]))
+
+    votes = np.where(np.repeat(mirrored, 3), -weights, weights)
+    handedness = np.where(np.bincount(triangles, votes, len(vertices)) < 0, -1.0, 1.0)
+    return np.column_stack((tangents, handedness)).astype(np.float32)
@@ -0,0 +1,190 @@
+"""hardware occlusion culling with bounding box queries and conditional rendering
+
+Screen draws the meshes that passed their last test as usual, then the
+bounding boxes of the meshes to test against that depth buffer, each inside a
+GL_ANY_SAMPLES_PASSED query, and then those meshes with
+glBeginConditionalRender, so the GPU drops the ones whose box was hidden
+without waiting for the result. Results are read back a frame later: hidden
+meshes are tested and drawn conditionally every frame, visible ones only every
+retest_interval frames (temporal coherence), which keeps most of them in the
+regular sorted draws.
+"""
+
+import ctypes
+from numpy.typing import NDArray
+import numpy as np
+from OpenGL.GL import *
+from core.profiler import profiler
+from core.program_cache import Program, ProgramRegistry, default_program_registry
+
+# frames between two tests of a mesh that was visible at its last one
+OCCLUSION_RETEST_INTERVAL = 8
+
+BOX_VERTEX_SHADER = """#version 330 core
+layout(std140) uniform FrameData {
+    mat4 projection_mat;
+    mat4 view_mat;
+    mat4 inv_view_mat;
+    vec4 camera_position;
+};
+in vec3 position;
+void main() {
+    gl_Position = projection_mat * view_mat * vec4(position, 1.0);
+}
+"""
+BOX_FRAGMENT_SHADER = """#version 330 core
+out vec4 FragColor;
+void main() {
+    FragColor = vec4(1.0);
+}
+"""
+# corner k of a box takes its x, y, z from the max side where bit 0, 1, 2 is set
+_BOX_CORNERS = np.array([[k & 1, k >> 1 & 1, k >> 2 & 1] for k in range(8)], bool)
+_BOX_TRIANGLES = np.array(
+    [
+        *(0, 2, 1, 1, 2, 3),  # -z
+        *(4, 5, 6, 5, 7, 6),  # +z
+        *(0, 1, 4, 1, 5, 4),  # -y
+        *(2, 6, 3, 3, 6, 7),  # +y
+        *(0, 4, 2, 2, 4, 6),  # -x
+        *(1, 3, 5, 3, 7, 5),  # +x
+    ],
+    dtype=np.uint8,
+)
+
+
+def box_corners(boxes: NDArray, matrices: NDArray) -> NDArray:
+    """(N, 8, 3) world space corners of (N, 2, 3) local min/max boxes"""
+    corners = np.where(_BOX_CORNERS, boxes[:, 1:2], boxes[:, 0:1])
+    return (
+        np.einsum("nij,nkj->nki", matrices[:, :3, :3], corners)
+        + matrices[:, np.newaxis, :3, 3]
+    )
+
+
+class OcclusionCuller:
+    """per object occlusion state and the queries of the last tested frame
+
+    occluded[i] is the last read result of Screen.objects[i], a mesh with a
+    query still in flight keeps its state and is drawn unconditionally.
+    """
+
+    def __init__(
+        self,
+        retest_interval: int = OCCLUSION_RETEST_INTERVAL,
+        registry: ProgramRegistry | None = None,
+    ):
+        self.retest_interval = retest_interval
+        self.registry = registry or default_program_registry
+        self.frame = 0
+        self.occluded = np.zeros(0, dtype=bool)
+        self.pending = np.zeros(0, dtype=bool)
+        self.queries = np.zeros(0, dtype=np.uint32)
+        self.program: Program | None = None
+        self.vao_ref = self.vertex_ref = self.index_ref = None
+        self._tested = np.empty(0, dtype=np.int64)
+        self._corners = np.empty((0, 8, 3), dtype=np.float32)
+
+    def resize(self, count: int) -> None:
+        """state for count objects, new ones start out visible"""
+        added = count - len(self.occluded)
+        if added <= 0:
+            return
+        self.occluded = np.concatenate((self.occluded, np.zeros(added, bool)))
+        self.pending = np.concatenate((self.pending, np.zeros(added, bool)))
+        queries = np.asarray(glGenQueries(added), dtype=np.uint32).reshape(added)
+        self.queries = np.concatenate((self.queries, queries))
+
+    def remove(self, index: int) -> None:
+        """drops the state of a removed object, later ones move down"""
+        if index >= len(self.occluded):
+            return
+        glDeleteQueries(1, [int(self.queries[index])])
+        self.occluded = np.delete(self.occluded, index)
+        self.pending = np.delete(self.pending, index)
+        self.queries = np.delete(self.queries, index)
+
+    def collect(self) -> None:
+        """reads the results that arrived, never waits for the GPU"""
+        available = np.zeros(1, dtype=np.int32)
+        passed = np.zeros(1, dtype=np.int32)
+        for index in np.flatnonzero(self.pending).tolist():
+            query = int(self.queries[index])
+            glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, available)
+            if not available[0]:
+                continue
+            glGetQueryObjectiv(query, GL_QUERY_RESULT, passed)
+            self.occluded[index] = not passed[0]
+            self.pending[index] = False
+
+    def select(self, indices: NDArray, inside: NDArray) -> NDArray:
+        """mask of the visible indices to test this frame
+
+        Hidden ones are tested every frame, visible ones every
+        retest_interval frames, spread over the frames by index. Meshes whose
+        bounds contain the camera (inside) count as visible, their box would
+        be clipped by the near plane.
+        """
+        self.occluded[indices[inside]] = False
+        due = self.occluded[indices] | (
+            (indices + self.frame) % self.retest_interval == 0
+        )
+        return due & ~inside & ~self.pending[indices]
+
+    def prepare(self, tested: NDArray, boxes: NDArray, matrices: NDArray) -> None:
+        """world space boxes of the meshes issue_queries tests"""
+        self._tested = tested
+        self._corners = box_corners(boxes, matrices).astype(np.float32)
+
+    def _create_objects(self) -> None:
+        self.program = self.registry.get(BOX_VERTEX_SHADER, BOX_FRAGMENT_SHADER)
+        self.vao_ref = glGenVertexArrays(1)
+        self.vertex_ref, self.index_ref = glGenBuffers(2)
+        glBindVertexArray(self.vao_ref)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_ref)
+        glBufferData(
+            GL_ELEMENT_ARRAY_BUFFER,
+            _BOX_TRIANGLES.nbytes,
+            _BOX_TRIANGLES,
+            GL_STATIC_DRAW,
+        )
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_ref)
+        location = self.program.attributes["position"].location
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        glBindVertexArray(0)
+
+    def issue_queries(self) -> None:
+        """draws the prepared boxes against the current depth buffer, one
+        query each, without writing color or depth"""
+        if len(self._tested) == 0:
+            return
+        if self.program is None:
+            self._create_objects()
+        glUseProgram(self.program.program_id)
+        glBindVertexArray(self.vao_ref)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_ref)
+        glBufferData(
+            GL_ARRAY_BUFFER, self._corners.nbytes, self._corners, GL_STREAM_DRAW
+        )
+        profiler.count("bytes uploaded", self._corners.nbytes)
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glDepthMask(GL_FALSE)
+        glDisable(GL_CULL_FACE)
+        count = len(_BOX_TRIANGLES)
+        for slot, query in enumerate(self.queries[self._tested].tolist()):
+            glBeginQuery(GL_ANY_SAMPLES_PASSED, query)
+            glDrawElementsBaseVertex(
+                GL_TRIANGLES, count, GL_UNSIGNED_BYTE, ctypes.c_void_p(0), 8 * slot
+            )
+            glEndQuery(GL_ANY_SAMPLES_PASSED)
+        glEnable(GL_CULL_FACE)
+        glDepthMask(GL_TRUE)
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+        glBindVertexArray(0)
+        self.pending[self._tested] = True
+        profiler.count("occlusion queries", len(self._tested))
+        self._tested = np.empty(0, dtype=np.int64)
+
+    def end_frame(self) -> None:
+        self.frame += 1
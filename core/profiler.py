@@ -0,0 +1,237 @@
+import contextlib
+import ctypes
+import json
+import time
+from collections import Counter, defaultdict, deque
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+
+# frames between ending a gpu query and reading it back, so reads never stall
+GPU_LATENCY = 2
+
+
+class _CpuScope:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+
+
+class _GpuScope:
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        glBeginQuery(GL_TIME_ELAPSED, self.profiler.gpu_query(self.name))
+
+    def __exit__(self, *exc_info) -> None:
+        glEndQuery(GL_TIME_ELAPSED)
+
+
+class Profiler:
+    """named cpu scopes, gpu timer queries and per frame counters
+
+    When disabled, scope() and gpu_scope() return a shared no-op context and
+    count() returns at once, so instrumented code costs a flag check. GPU
+    scopes use GL_TIME_ELAPSED queries, they can not nest and are read back
+    GPU_LATENCY frames later, results that are not ready then are dropped.
+    Finished frames are kept for summary() and export_chrome_trace().
+    """
+
+    def __init__(
+        self, enabled: bool = False, history: int = 120, max_events: int = 200_000
+    ):
+        self.enabled = enabled
+        self.frame = 0
+        self.frames: deque[dict] = deque(maxlen=history)
+        self.events: deque[tuple] = deque(maxlen=max_events)
+        self.counters: Counter[str] = Counter()
+        self._scopes: defaultdict[str, float] = defaultdict(float)
+        self._frame_start = 0
+        self._epoch = time.perf_counter_ns()
+        # per frame slot: scope name -> query object
+        self._queries: list[dict[str, int]] = [{} for _ in range(GPU_LATENCY)]
+        self._used_queries: list[list[str]] = [[] for _ in range(GPU_LATENCY)]
+        self._null_scope = contextlib.nullcontext()
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        self._frame_start = time.perf_counter_ns()
+
+    def scope(self, name: str) -> contextlib.AbstractContextManager:
+        if not self.enabled:
+            return self._null_scope
+        return _CpuScope(self, name)
+
+    def gpu_scope(self, name: str) -> contextlib.AbstractContextManager:
+        if not self.enabled:
+            return self._null_scope
+        return _GpuScope(self, name)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += value
+
+    def record(self, name: str, start: int, end: int) -> None:
+        self._scopes[name] += (end - start) / 1e6
+        self.events.append((name, start, end - start))
+
+    def gpu_query(self, name: str) -> int:
+        slot = self.frame % GPU_LATENCY
+        queries = self._queries[slot]
+        if name not in queries:
+            queries[name] = int(glGenQueries(1)[0])
+        self._used_queries[slot].append(name)
+        return queries[name]
+
+    def _collect_gpu(self, slot: int) -> None:
+        """results of the queries issued GPU_LATENCY frames ago"""
+        frame = self.frame - GPU_LATENCY
+        available = np.zeros(1, dtype=np.int32)
+        # the wrapped ui64v has no numpy uint64 mapping, so read into a c_uint64
+        elapsed = ctypes.c_uint64()
+        times = {}
+        for name in self._used_queries[slot]:
+            query = self._queries[slot][name]
+            glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, available)
+            if not available[0]:
+                self.counters["gpu results dropped"] += 1
+                continue
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(elapsed))
+            times[name] = times.get(name, 0.0) + elapsed.value / 1e6
+        self._used_queries[slot].clear()
+        for summary in self.frames:
+            if summary["frame"] == frame:
+                summary["gpu"] = times
+                break
+
+    def begin_frame(self) -> None:
+        if not self.enabled:
+            return
+        self._frame_start = time.perf_counter_ns()
+        slot = self.frame % GPU_LATENCY
+        if self._used_queries[slot]:
+            self._collect_gpu(slot)
+
+    def end_frame(self) -> None:
+        if not self.enabled:
+            return
+        end = time.perf_counter_ns()
+        self.record("frame", self._frame_start, end)
+        self.frames.append(
+            {
+                "frame": self.frame,
+                "start": self._frame_start,
+                "cpu": dict(self._scopes),
+                "gpu": {},
+                "counters": dict(self.counters),
+            }
+        )
+        self._scopes.clear()
+        self.counters.clear()
+        self.frame += 1
+
+    def averages(self) -> dict[str, dict[str, float]]:
+        """mean cpu and gpu milliseconds and counters over the kept frames"""
+        totals = {"cpu": defaultdict(float), "gpu": defaultdict(float)}
+        totals["counters"] = defaultdict(float)
+        for summary in self.frames:
+            for kind, values in totals.items():
+                for name, value in summary[kind].items():
+                    values[name] += value
+        frames = max(len(self.frames), 1)
+        return {
+            kind: {name: value / frames for name, value in values.items()}
+            for kind, values in totals.items()
+        }
+
+    def summary(self) -> str:
+        averages = self.averages()
+        lines = [f"last {len(self.frames)} frames, mean per frame:"]
+        for name, ms in sorted(averages["cpu"].items(), key=lambda item: -item[1]):
+            lines.append(f"  cpu {name:<24} {ms:8.3f} ms")
+        for name, ms in sorted(averages["gpu"].items(), key=lambda item: -item[1]):
+            lines.append(f"  gpu {name:<24} {ms:8.3f} ms")
+        for name, value in sorted(averages["counters"].items()):
+            lines.append(f"  {name:<28} {value:10.1f}")
+        return "\n".join(lines)
+
+    def caption(self) -> str:
+        """one line summary for the window title"""
+        averages = self.averages()
+        frame = averages["cpu"].get("frame", 0.0)
+        gpu = sum(averages["gpu"].values())
+        draws = averages["counters"].get("draw calls", 0.0)
+        triangles = averages["counters"].get("triangles", 0.0)
+        return (
+            f"cpu {frame:.2f} ms  gpu {gpu:.2f} ms  {draws:.0f} draws"
+            f"  {triangles / 1000:.0f}k triangles"
+        )
+
+    def export_chrome_trace(self, path: str) -> None:
+        """writes the kept events in the Chrome trace event format
+
+        GPU scopes have no timestamps of their own, they are laid out one
+        after another from the start of their frame on a separate track.
+        """
+        trace = []
+        for name, start, duration in self.events:
+            trace.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self._epoch) / 1e3,
+                    "dur": duration / 1e3,
+                    "pid": 0,
+                    "tid": 0,
+                }
+            )
+        for summary in self.frames:
+            ts = (summary["start"] - self._epoch) / 1e3
+            for name, ms in summary["gpu"].items():
+                trace.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": ts,
+                        "dur": ms * 1e3,
+                        "pid": 0,
+                        "tid": 1,
+                    }
+                )
+                ts += ms * 1e3
+            trace.append(
+                {
+                    "name": "counters",
+                    "ph": "C",
+                    "ts": (summary["start"] - self._epoch) / 1e3,
+                    "pid": 0,
+                    "args": summary["counters"],
+                }
+            )
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 0,
+                "tid": tid,
+                "args": {"name": n},
+            }
+            for tid, n in ((0, "cpu"), (1, "gpu"))
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + trace}, f)
+
+
+profiler = Profiler()
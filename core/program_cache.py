@@ -0,0 +1,169 @@
+import dataclasses
+import hashlib
+import os
+import struct
+import tempfile
+import time
+from OpenGL.GL import *
+from OpenGL.error import Error as GLError
+import core.utils as utils
+from core.mesh_cache import default_cache_dir
+from core.uniform_buffer import TEXTURE_BUFFER_UNITS, UNIFORM_BLOCK_BINDINGS
+
+MAGIC = b"AUCHPROG"
+FORMAT_VERSION = 1
+
+
+@dataclasses.dataclass(slots=True)
+class Program:
+    """linked program shared by every Shader built from the same sources"""
+
+    program_id: int
+    uniforms: dict[str, utils.ShaderVariable]
+    attributes: dict[str, utils.ShaderVariable]
+    uniform_blocks: set[str]
+    # (object, versions) whose per-object matrices the program currently holds
+    loaded_model: tuple | None = None
+
+
+def driver_id() -> bytes:
+    """binaries are only valid for the driver that produced them"""
+    return b"\0".join(
+        glGetString(name) or b"" for name in (GL_VENDOR, GL_RENDERER, GL_VERSION)
+    )
+
+
+def binaries_supported() -> bool:
+    try:
+        return bool(glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS))
+    except GLError:
+        return False
+
+
+class ProgramCache:
+    """on-disk cache of linked program binaries
+
+    Entries are named after a hash of the sources and the driver vendor,
+    renderer and version, so a driver update simply misses the cache.
+    """
+
+    def __init__(self, directory: str | None = None):
+        self.directory = directory or default_cache_dir("programs")
+
+    def entry_path(self, sources: bytes) -> str:
+        key = hashlib.blake2b(sources, digest_size=16)
+        key.update(driver_id())
+        key.update(str(FORMAT_VERSION).encode())
+        return os.path.join(self.directory, f"{key.hexdigest()}.bin")
+
+    def read(self, entry: str) -> tuple[int, bytes] | None:
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if not data.startswith(MAGIC):
+            return None
+        (binary_format,) = struct.unpack_from("<I", data, len(MAGIC))
+        return binary_format, data[len(MAGIC) + 4 :]
+
+    def write(self, entry: str, binary_format: int, binary: bytes) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+                f.write(MAGIC + struct.pack("<I", binary_format) + binary)
+            os.replace(f.name, entry)
+        except OSError:
+            pass  # the cache is an optimisation only, e.g. on read-only media
+
+    def clear(self) -> None:
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".bin"):
+                    os.remove(os.path.join(self.directory, name))
+
+
+class ProgramRegistry:
+    """one linked program per (vertex, fragment, defines) source triple
+
+    Programs are first looked up in memory, then in the binary cache and only
+    compiled from source when both miss or the driver rejects the binary.
+    Program ids belong to one GL context, Screen resets the registry when it
+    creates another.
+    Counts and the time spent per path are kept for startup reports.
+    """
+
+    def __init__(self, cache: ProgramCache | None = None, use_binaries: bool = True):
+        self.cache = cache or ProgramCache()
+        self.use_binaries = use_binaries
+        self.programs: dict[str, Program] = {}
+        self.reused = 0
+        self.compiled = 0
+        self.loaded = 0
+        self.rejected = 0
+        self.compile_seconds = 0.0
+        self.load_seconds = 0.0
+
+    def get(
+        self,
+        vertex_shader: str,
+        fragment_shader: str,
+        defines: dict[str, object] | None = None,
+    ) -> Program:
+        vertex_shader = utils.add_defines(vertex_shader, defines or {})
+        fragment_shader = utils.add_defines(fragment_shader, defines or {})
+        sources = f"{vertex_shader}\0{fragment_shader}".encode()
+        key = hashlib.blake2b(sources, digest_size=16).hexdigest()
+        if (program := self.programs.get(key)) is not None:
+            self.reused += 1
+            return program
+
+        use_binaries = self.use_binaries and binaries_supported()
+        program_id = None
+        if use_binaries:
+            entry = self.cache.entry_path(sources)
+            program_id = self._load_binary(entry)
+        if program_id is None:
+            start = time.perf_counter()
+            program_id = utils.create_program(
+                vertex_shader, fragment_shader, retrievable=use_binaries
+            )
+            self.compile_seconds += time.perf_counter() - start
+            self.compiled += 1
+            if use_binaries:
+                self.cache.write(entry, *utils.program_binary(program_id))
+
+        uniforms, attributes = utils.introspect_program(program_id)
+        uniform_blocks = utils.bind_uniform_blocks(program_id, UNIFORM_BLOCK_BINDINGS)
+        utils.bind_sampler_units(program_id, uniforms, TEXTURE_BUFFER_UNITS)
+        program = Program(program_id, uniforms, attributes, uniform_blocks)
+        self.programs[key] = program
+        return program
+
+    def reset(self) -> None:
+        """forgets the linked programs, e.g. for a new context where their ids
+        are invalid; shaders built before keep theirs"""
+        self.programs.clear()
+
+    def _load_binary(self, entry: str) -> int | None:
+        if (cached := self.cache.read(entry)) is None:
+            return None
+        start = time.perf_counter()
+        try:
+            program_id = utils.load_program_binary(*cached)
+        except Exception:
+            self.rejected += 1  # e.g. a driver that changed without a version bump
+            return None
+        self.load_seconds += time.perf_counter() - start
+        self.loaded += 1
+        return program_id
+
+    def report(self) -> str:
+        return (
+            f"{self.compiled} programs compiled in {self.compile_seconds * 1000:.1f} ms,"
+            f" {self.loaded} loaded from binaries in {self.load_seconds * 1000:.1f} ms,"
+            f" {self.reused} reused, {self.rejected} binaries rejected"
+        )
+
+
+default_program_registry = ProgramRegistry()
@@ -0,0 +1,125 @@
+import dataclasses
+from typing import Callable
+from OpenGL.GL import *
+from core.camera import Camera
+from core.mesh import Mesh
+from core.profiler import profiler
+from core.stats import FrameStats
+from core.uniform_buffer import CLUSTER_DATA_BLOCK, LIGHT_DATA_BLOCK
+
+
+@dataclasses.dataclass(slots=True)
+class DrawItem:
+    mesh: Mesh
+    depth: float
+    # occlusion query the draw is conditional on, 0 for none
+    query: int = 0
+
+    @property
+    def key(self) -> tuple[int, int, int]:
+        return self.mesh.state_key
+
+    @property
+    def sort_key(self) -> tuple[int, int, float]:
+        """(program, texture, depth), every mesh has its own vao so sorting
+        by it would leave nothing for the depth to order"""
+        program, texture, _ = self.mesh.state_key
+        return program, texture, self.depth
+
+
+class RenderQueue:
+    """per-frame list of draws, sorted to bind every program/texture/vao rarely
+
+    Opaque items are grouped by (program, texture) and drawn front to back
+    within a group to reduce overdraw, the vao is only bound when it changes.
+    Blended items are drawn back to front after them. Opaque items submitted
+    with an occlusion query are grouped the same way and drawn between the
+    two, conditional on their query (see core.occlusion).
+    """
+
+    def __init__(self) -> None:
+        self.opaque: list[DrawItem] = []
+        self.conditional: list[DrawItem] = []
+        self.blended: list[DrawItem] = []
+
+    def clear(self) -> None:
+        self.opaque.clear()
+        self.conditional.clear()
+        self.blended.clear()
+
+    def submit(self, mesh: Mesh, depth: float, query: int = 0) -> None:
+        if mesh.blended:
+            self.blended.append(DrawItem(mesh, depth))
+        else:
+            (self.conditional if query else self.opaque).append(
+                DrawItem(mesh, depth, query)
+            )
+
+    def sorted_items(self) -> list[DrawItem]:
+        self.opaque.sort(key=lambda item: item.sort_key)
+        self.conditional.sort(key=lambda item: item.sort_key)
+        self.blended.sort(key=lambda item: -item.depth)
+        return self.opaque + self.conditional + self.blended
+
+    def flush(
+        self,
+        camera: Camera,
+        stats: FrameStats,
+        before_conditional: Callable[[], None] | None = None,
+    ) -> None:
+        """draws and clears the queue, before_conditional runs after the
+        unconditional opaque items, e.g. to issue the occlusion queries"""
+        program = texture = vao = None
+        lights = None
+        conditional = len(self.opaque)
+        for position, item in enumerate(self.sorted_items()):
+            mesh = item.mesh
+            if position == conditional and self.conditional and before_conditional:
+                before_conditional()
+                # the callback may have bound anything
+                program = texture = vao = None
+            item_program, item_texture, item_vao = item.key
+            if item_program != program:
+                mesh.shader.use()
+                camera.load(mesh.shader)
+                program, texture, lights = item_program, None, None
+                stats.program_binds += 1
+            uses_light_block = not mesh.shader.uniform_blocks.isdisjoint(
+                (LIGHT_DATA_BLOCK, CLUSTER_DATA_BLOCK)
+            )
+            if mesh.lights and mesh.lights is not lights and not uses_light_block:
+                for light in mesh.lights:
+                    light.update(mesh.shader)
+                lights = mesh.lights
+            if mesh.texture_var and item_texture != texture:
+                mesh.texture_var.load_data()
+                texture = item_texture
+                stats.texture_binds += 1
+            if item_vao != vao:
+                glBindVertexArray(item_vao)
+                vao = item_vao
+                stats.vao_binds += 1
+            with profiler.scope("draw mesh"):
+                if item.query:
+                    glBeginConditionalRender(item.query, GL_QUERY_NO_WAIT)
+                    mesh.draw_geometry()
+                    glEndConditionalRender()
+                else:
+                    mesh.draw_geometry()
+            stats.draws += 1
+            stats.triangles += mesh.submitted_triangles
+        # what drawing every mesh with its own state setup would have bound
+        unsorted_binds = sum(
+            2 + (item.mesh.texture_var is not None)
+            for item in self.opaque + self.conditional + self.blended
+        )
+        stats.binds_avoided += unsorted_binds - (
+            stats.program_binds + stats.texture_binds + stats.vao_binds
+        )
+        profiler.count("draw calls", stats.draws)
+        profiler.count("triangles", stats.triangles)
+        profiler.count(
+            "state changes",
+            stats.program_binds + stats.texture_binds + stats.vao_binds,
+        )
+        self.clear()
@@ -0,0 +1,122 @@
+from typing import Iterable
+from numpy.typing import NDArray
+import numpy as np
+
+
+class SceneNode:
+    """handle of one node, the transforms themselves live in the SceneGraph arrays"""
+
+    __slots__ = ("graph", "index")
+
+    def __init__(self, graph: "SceneGraph", index: int):
+        self.graph = graph
+        self.index = index
+
+    @property
+    def parent(self) -> "SceneNode | None":
+        parent = self.graph.parent[self.index]
+        return None if parent < 0 else SceneNode(self.graph, int(parent))
+
+    @property
+    def local(self) -> NDArray:
+        return self.graph.local[self.index]
+
+    @property
+    def world(self) -> NDArray:
+        return self.graph.world[self.index]
+
+    @property
+    def version(self) -> int:
+        """grows whenever the world matrix is recomputed"""
+        return int(self.graph.version[self.index])
+
+    def set_local(self, matrix: NDArray) -> None:
+        self.graph.set_local([self.index], matrix[np.newaxis])
+
+    def set_parent(self, parent: "SceneNode | None") -> None:
+        self.graph.set_parent(self, parent)
+
+
+class SceneGraph:
+    """parent/child transforms stored as (N, 4, 4) arrays
+
+    update() recomputes the world matrices of all dirty nodes and their
+    descendants, one batched matmul per tree level.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.count = 0
+        self.local = np.tile(np.eye(4, dtype=np.float32), (capacity, 1, 1))
+        self.world = self.local.copy()
+        self.parent = np.full(capacity, -1, dtype=np.int64)
+        self.dirty = np.zeros(capacity, dtype=bool)
+        self.version = np.zeros(capacity, dtype=np.int64)
+        self._levels: list[NDArray] | None = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _grow(self) -> None:
+        capacity = len(self.parent)
+        self.local = np.concatenate(
+            (self.local, np.tile(np.eye(4, dtype=np.float32), (capacity, 1, 1)))
+        )
+        self.world = np.concatenate((self.world, self.local[capacity:]))
+        self.parent = np.concatenate((self.parent, np.full(capacity, -1)))
+        self.dirty = np.concatenate((self.dirty, np.zeros(capacity, dtype=bool)))
+        self.version = np.concatenate((self.version, np.zeros(capacity, np.int64)))
+
+    def add_node(self, parent: SceneNode | None = None) -> SceneNode:
+        if self.count == len(self.parent):
+            self._grow()
+        node = SceneNode(self, self.count)
+        self.count += 1
+        self.parent[node.index] = -1 if parent is None else parent.index
+        self.dirty[node.index] = True
+        self._levels = None
+        return node
+
+    def set_parent(self, node: SceneNode, parent: SceneNode | None) -> None:
+        ancestor = parent
+        while ancestor is not None:
+            if ancestor.index == node.index:
+                raise ValueError("A node can not be parented to its own subtree")
+            ancestor = ancestor.parent
+        self.parent[node.index] = -1 if parent is None else parent.index
+        self.dirty[node.index] = True
+        self._levels = None
+
+    def set_local(self, indices: Iterable[int] | NDArray, matrices: NDArray) -> None:
+        self.local[indices] = matrices
+        self.dirty[indices] = True
+
+    @property
+    def levels(self) -> list[NDArray]:
+        """node indices grouped by depth, roots first"""
+        if self._levels is None:
+            parent = self.parent[: self.count]
+            depth = np.zeros(self.count, dtype=np.int64)
+            current = parent.copy()
+            while (has_parent := current >= 0).any():
+                depth[has_parent] += 1
+                current[has_parent] = parent[current[has_parent]]
+            order = np.argsort(depth, kind="stable")
+            splits = np.flatnonzero(np.diff(depth[order])) + 1
+            self._levels = np.split(order, splits)
+        return self._levels
+
+    def update(self) -> None:
+        dirty = self.dirty[: self.count]
+        if not dirty.any():
+            return
+        for depth, level in enumerate(self.levels):
+            if depth == 0:
+                changed = level[dirty[level]]
+                self.world[changed] = self.local[changed]
+                continue
+            parents = self.parent[level]
+            dirty[level] |= dirty[parents]
+            changed = level[dirty[level]]
+            self.world[changed] = self.world[self.parent[changed]] @ self.local[changed]
+        self.version[: self.count][dirty] += 1
+        dirty[:] = False
@@ -1,11 +1,32 @@
 import os
+import time
 from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
 import pygame
 from pygame.locals import *
+from numpy.typing import NDArray
 from core.camera import Camera
+import numpy as np
 from core.mesh import Mesh
+from core.scene_graph import SceneGraph, SceneNode
+from core.render_queue import RenderQueue
+from core.stats import FrameStats
+from core.light import Light, light_arrays
+from core.light_clusters import LightClusters
+from core.occlusion import OcclusionCuller
+from core.transform_component import interpolated_states
+import core.transformations as transform
+from core import lod
+from core.profiler import profiler
+from core.program_cache import default_program_registry
+from core.texture_manager import default_texture_manager
+from core.uniform_buffer import (
+    FRAME_DATA_BINDING,
+    FRAME_DATA_DTYPE,
+    LIGHT_DATA_BINDING,
+    LIGHT_DATA_DTYPE,
+    MAX_LIGHTS,
+    UniformBuffer,
+)
 
 
 class Screen:  # TODO: define base class when interface is clear
@@ -16,13 +37,49 @@ class Screen:  # TODO: define base class when interface is clear
         screen_width: int,
         screen_height: int,
         camera: Camera,
+        vsync: bool = False,
     ) -> None:
-        os.environ["SDL_VIDEO_WINDOW_POS"] = "%d,%d" % (screen_pos_x, screen_pos_y)
         self.screen_width = screen_width
         self.screen_height = screen_height
+        self.create_context(screen_pos_x, screen_pos_y, vsync)
+        # programs and textures made for an earlier screen belong to its context
+        default_program_registry.reset()
+        default_texture_manager.reset()
+        glEnable(GL_CULL_FACE)
+        glEnable(GL_BLEND)
+        glEnable(GL_DEPTH_TEST)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.objects: list[Mesh] = []
+        self.scene = SceneGraph()
+        self.stats = FrameStats()
+        self.render_queue = RenderQueue()
+        self.lights: list[Light] = []
+        self.frame_data = UniformBuffer(FRAME_DATA_DTYPE, FRAME_DATA_BINDING)
+        self.light_data = UniformBuffer(LIGHT_DATA_DTYPE, LIGHT_DATA_BINDING)
+        self.light_clusters = LightClusters()
+        # local bounding spheres (x, y, z, radius) and node indices, packed
+        # in add_object order for culling
+        self._bounds = np.empty((0, 4), dtype=np.float32)
+        self._boxes = np.empty((0, 2, 3), dtype=np.float32)
+        self._node_indices = np.empty(0, dtype=np.int64)
+        self._matrices = np.empty((0, 4, 4), dtype=np.float32)  # sync_objects
+        self.camera = camera
+        self._last_frame: float | None = None
+        # projected sizes where meshes switch to coarser levels, see core.lod
+        self.lod_screen_sizes = lod.DEFAULT_SCREEN_SIZES
+        self.lod_hysteresis = lod.LOD_HYSTERESIS
+        # skips meshes hidden behind others with occlusion queries, see
+        # core.occlusion; pays off in scenes with lots of hidden geometry
+        self.occlusion_culling = False
+        self.occlusion = OcclusionCuller()
+
+    def create_context(self, screen_pos_x: int, screen_pos_y: int, vsync: bool) -> None:
+        os.environ["SDL_VIDEO_WINDOW_POS"] = "%d,%d" % (screen_pos_x, screen_pos_y)
         pygame.init()
         self.screen = pygame.display.set_mode(
-            (screen_width, screen_height), DOUBLEBUF | OPENGL
+            (self.screen_width, self.screen_height),
+            DOUBLEBUF | OPENGL,
+            vsync=int(vsync),
         )
         pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
         pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
@@ -30,20 +87,256 @@ class Screen:  # TODO: define base class when interface is clear
             pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE
         )
         pygame.display.set_caption("PyEngineGL")
-        glEnable(GL_CULL_FACE)
-        glEnable(GL_BLEND)
-        glEnable(GL_DEPTH_TEST)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        self.objects: list[Mesh] = []
-        self.camera = camera
 
-    def add_object(self, object: Mesh) -> None:
+    def add_object(self, object: Mesh, parent: Mesh | SceneNode | None = None) -> None:
+        """parent makes the object's transform relative to another object or node"""
+        if isinstance(parent, Mesh):
+            parent = parent.node
+        object.node = self.scene.add_node(parent)
+        object.synced_version = -1
         self.objects.append(object)
+        center, radius = object.bounding_sphere()
+        object.synced_bounds_version = object.bounds_version
+        self._bounds = np.vstack((self._bounds, [*center, radius])).astype(np.float32)
+        self._boxes = np.concatenate(
+            (self._boxes, [object.bounding_box()]), dtype=np.float32
+        )
+        self._node_indices = np.append(self._node_indices, object.node.index)
+
+    def replace_object(self, old: Mesh, new: Mesh) -> None:
+        """new takes over the slot, scene node and transform of old"""
+        index = self.objects.index(old)
+        self.objects[index] = new
+        new.node, old.node = old.node, None
+        new.transform = old.transform
+        new.synced_version = -1
+        center, radius = new.bounding_sphere()
+        new.synced_bounds_version = new.bounds_version
+        self._bounds[index] = [*center, radius]
+        self._boxes[index] = new.bounding_box()
+
+    def remove_object(self, object: Mesh) -> None:
+        """takes object off the screen, its scene node stays for its children"""
+        index = self.objects.index(object)
+        del self.objects[index]
+        object.node = None
+        self._bounds = np.delete(self._bounds, index, axis=0)
+        self._boxes = np.delete(self._boxes, index, axis=0)
+        self._node_indices = np.delete(self._node_indices, index)
+        self.occlusion.remove(index)
+
+    def add_light(self, light: Light) -> None:
+        self.lights.append(light)
+
+    def scene_lights(self) -> list[Light]:
+        """screen lights followed by lights attached to meshes, without duplicates"""
+        lights = {id(light): light for light in self.lights}
+        for object in self.objects:
+            lights.update((id(light), light) for light in object.lights)
+        return list(lights.values())
+
+    def load_frame_data(self) -> None:
+        """camera and light uniforms shared by every shader, one upload each
+
+        LightData gets the first MAX_LIGHTS lights, clustered shaders all of
+        them through self.light_clusters.
+        """
+        frame = self.frame_data.data
+        camera_world = self.camera.world_matrix
+        frame["projection_mat"] = self.camera.projection_mat.T
+        frame["view_mat"] = self.camera.view_mat.T
+        frame["inv_view_mat"] = camera_world.T
+        frame["camera_position"] = camera_world[:, 3]
+        self.frame_data.load_data()
+
+        lights = self.scene_lights()
+        light_data = self.light_data.data
+        light_data["light_count"] = min(len(lights), MAX_LIGHTS)
+        for slot, light in zip(light_data["light_data"], lights):
+            slot["position"][:3] = light.position
+            slot["color"][:3] = light.color.data
+        self.light_data.load_data()
+
+        with profiler.scope("light clusters"):
+            self.light_clusters.update(
+                *light_arrays(lights),
+                self.camera.view_mat,
+                self.camera.projection_mat,
+                self.screen_width,
+                self.screen_height,
+            )
 
     def clear(self) -> None:
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-    def display_objects(self) -> None:
-        self.clear()
+    def update_objects(self, dt: float) -> None:
+        """advances object motion by one simulation step of dt seconds"""
         for object in self.objects:
-            object.draw(self.camera)
+            object.update(dt)
+
+    def sync_objects(self, alpha: float = 1.0) -> None:
+        """writes changed transforms to the scene graph, interpolated by alpha
+
+        alpha is the share of the next simulation step that has already
+        passed, see GameLoop.
+        """
+        changed = []
+        for index, object in enumerate(self.objects):
+            if object.synced_bounds_version != object.bounds_version:
+                object.synced_bounds_version = object.bounds_version
+                center, radius = object.bounding_sphere()
+                self._bounds[index] = [*center, radius]
+                self._boxes[index] = object.bounding_box()
+            if (
+                object.synced_version != object.transform.version
+                or object.transform.interpolating
+            ):
+                object.synced_version = object.transform.version
+                changed.append(object)
+        if changed:
+            if len(self._matrices) < len(changed):
+                self._matrices = np.empty(
+                    (max(len(changed), 2 * len(self._matrices)), 4, 4), np.float32
+                )
+            states = interpolated_states(
+                [object.transform for object in changed], alpha
+            )
+            self.scene.set_local(
+                [object.node.index for object in changed],
+                transform.compose_matrices(*states, out=self._matrices[: len(changed)]),
+            )
+        self.scene.update()
+
+    def cull_objects(self) -> NDArray[np.bool_]:
+        """visibility mask of self.objects against the camera frustum"""
+        world = self.scene.world[self._node_indices]
+        centers = (
+            np.einsum("nij,nj->ni", world[:, :3, :3], self._bounds[:, :3])
+            + world[:, :3, 3]
+        )
+        scales = np.sqrt((world[:, :3, :3] ** 2).sum(axis=1)).max(axis=1)
+        self._world_centers = centers
+        radii = self._bounds[:, 3] * scales
+        self._world_radii = radii
+        planes = self.camera.frustum_planes()
+        distances = centers @ planes[:, :3].T + planes[:, 3]
+        visible = (distances >= -radii[:, np.newaxis]).all(axis=1)
+        self.stats.visible = int(visible.sum())
+        self.stats.culled = len(visible) - self.stats.visible
+        return visible
+
+    def compute_frame_matrices(self, indices: NDArray) -> None:
+        """mvp and normal matrices of the given objects in one batched pass"""
+        world = self.scene.world[self._node_indices[indices]]
+        view_projection = self.camera.projection_mat @ self.camera.view_mat
+        mvp = view_projection @ world
+        normal_matrices = np.linalg.inv(world[:, :3, :3]).transpose(0, 2, 1)
+        for index, object_mvp, normal_matrix in zip(indices, mvp, normal_matrices):
+            self.objects[index].set_frame_matrices(
+                object_mvp, normal_matrix, self.camera.version
+            )
+
+    def select_lods(self, indices: NDArray, distances: NDArray) -> None:
+        """level of detail of the given objects from their projected size"""
+        level_counts = np.fromiter(
+            (len(self.objects[index].lod_ranges) for index in indices),
+            np.int64,
+            len(indices),
+        )
+        with_lods = level_counts > 1
+        if not with_lods.any():
+            return
+        indices = indices[with_lods]
+        current = np.fromiter(
+            (self.objects[index].lod_level for index in indices),
+            np.int64,
+            len(indices),
+        )
+        sizes = lod.screen_sizes(
+            self._world_radii[indices],
+            distances[indices],
+            self.camera.projection_mat,
+        )
+        levels = lod.select_levels(
+            current,
+            sizes,
+            level_counts[with_lods],
+            self.lod_screen_sizes,
+            self.lod_hysteresis,
+        )
+        for index, level in zip(indices.tolist(), levels.tolist()):
+            self.objects[index].lod_level = level
+
+    def select_occlusion_tests(self, indices: NDArray) -> NDArray:
+        """the visible objects to draw conditional on an occlusion query
+
+        Updates the occlusion state with the results that arrived since the
+        last frame and prepares the boxes of the selected objects.
+        """
+        self.occlusion.resize(len(self.objects))
+        self.occlusion.collect()
+        opaque = np.fromiter(
+            (not self.objects[index].blended for index in indices),
+            bool,
+            len(indices),
+        )
+        indices = indices[opaque]
+        world = self.scene.world[self._node_indices[indices]]
+        boxes = self._boxes[indices]
+        # a box around the camera would be clipped, those objects count as
+        # visible; tested against the sphere around the box, plus a margin
+        centers = (
+            np.einsum("nij,nj->ni", world[:, :3, :3], boxes.mean(axis=1))
+            + world[:, :3, 3]
+        )
+        scales = np.sqrt((world[:, :3, :3] ** 2).sum(axis=1)).max(axis=1)
+        radii = np.linalg.norm(boxes[:, 1] - boxes[:, 0], axis=1) / 2 * scales
+        distances = np.linalg.norm(centers - self.camera.position, axis=1)
+        inside = distances <= radii + 0.1
+        selected = self.occlusion.select(indices, inside)
+        tested = indices[selected]
+        self.occlusion.prepare(tested, boxes[selected], world[selected])
+        self.stats.occluded = int(self.occlusion.occluded[tested].sum())
+        profiler.count("occluded", self.stats.occluded)
+        return tested
+
+    def frame_seconds(self) -> float:
+        """seconds since the last displayed frame, the camera moves by them"""
+        now = time.perf_counter()
+        dt = 0.0 if self._last_frame is None else now - self._last_frame
+        self._last_frame = now
+        return dt
+
+    def display_objects(self, alpha: float = 1.0) -> None:
+        dt = self.frame_seconds()
+        with profiler.scope("camera update"):
+            self.camera.update(dt)
+        with profiler.scope("sync objects"):
+            self.sync_objects(alpha)
+        self.clear()
+        self.stats = FrameStats()
+        with profiler.scope("cull"):
+            visible = self.cull_objects()
+            visible_indices = np.flatnonzero(visible)
+        with profiler.scope("frame matrices"):
+            self.compute_frame_matrices(visible_indices)
+        depths = np.linalg.norm(self._world_centers - self.camera.position, axis=1)
+        with profiler.scope("lod"):
+            self.select_lods(visible_indices, depths)
+        queries = np.zeros(len(self.objects), dtype=np.int64)
+        if self.occlusion_culling:
+            with profiler.scope("occlusion"):
+                tested = self.select_occlusion_tests(visible_indices)
+                queries[tested] = self.occlusion.queries[tested]
+        with profiler.scope("submit"):
+            for index in visible_indices:
+                self.render_queue.submit(
+                    self.objects[index], float(depths[index]), int(queries[index])
+                )
+        with profiler.scope("frame data"):
+            self.load_frame_data()
+        with profiler.scope("draw"), profiler.gpu_scope("draw"):
+            self.render_queue.flush(
+                self.camera, self.stats, self.occlusion.issue_queries
+            )
+        self.occlusion.end_frame()
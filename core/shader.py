@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from OpenGL.GL import *
 from typing import Self
 import core.utils as utils
+from core.program_cache import ProgramRegistry, default_program_registry
 
 
 class Shader:  # TODO: looks like dataclass, refactor
@@ -17,6 +18,12 @@ class Shader:  # TODO: looks like dataclass, refactor
         vertex_tex_var: str | None = None,
         vertex_tex_uv_var: str | None = None,
         vertex_normal_Var: str | None = None,
+        mvp_matrix_var: str = "mvp_mat",
+        normal_matrix_var: str = "normal_mat",
+        vertex_layer_var: str = "vertex_layer",
+        defines: dict[str, object] | None = None,
+        registry: ProgramRegistry | None = None,
+        vertex_tangent_var: str = "vertex_tangent",
     ):
         self.vertex_position_var = vertex_position_var
         self.vertex_color_var = vertex_color_var
@@ -26,7 +33,17 @@ class Shader:  # TODO: looks like dataclass, refactor
         self.vertex_tex_var = vertex_tex_var
         self.vertex_tex_uv_var = vertex_tex_uv_var
         self.vertex_normal_Var = vertex_normal_Var
-        self.program_id = utils.create_program(vertex_shader, fragment_shader)
+        self.mvp_matrix_var = mvp_matrix_var
+        self.normal_matrix_var = normal_matrix_var
+        self.vertex_layer_var = vertex_layer_var
+        self.vertex_tangent_var = vertex_tangent_var
+        self.defines = defines or {}
+        registry = registry or default_program_registry
+        self.program = registry.get(vertex_shader, fragment_shader, self.defines)
+        self.program_id = self.program.program_id
+        self.uniforms = self.program.uniforms
+        self.attributes = self.program.attributes
+        self.uniform_blocks = self.program.uniform_blocks
 
     @classmethod
     def from_file(
@@ -41,6 +58,12 @@ class Shader:  # TODO: looks like dataclass, refactor
         vertex_tex_var: str | None = None,
         vertex_tex_uv_var: str | None = None,
         vertex_normal_Var: str | None = None,
+        mvp_matrix_var: str = "mvp_mat",
+        normal_matrix_var: str = "normal_mat",
+        vertex_layer_var: str = "vertex_layer",
+        defines: dict[str, object] | None = None,
+        registry: ProgramRegistry | None = None,
+        vertex_tangent_var: str = "vertex_tangent",
     ) -> Self:
         vertex_shader_program = utils.read_file(vertex_shader_path)
         fragment_shader_program = utils.read_file(fragment_shader_path)
@@ -55,7 +78,44 @@ class Shader:  # TODO: looks like dataclass, refactor
             vertex_tex_var,
             vertex_tex_uv_var,
             vertex_normal_Var,
+            mvp_matrix_var,
+            normal_matrix_var,
+            vertex_layer_var,
+            defines,
+            registry,
+            vertex_tangent_var,
         )
 
+    @property
+    def loaded_model(self) -> tuple | None:
+        """shared with every Shader using the same program"""
+        return self.program.loaded_model
+
+    @loaded_model.setter
+    def loaded_model(self, model_state: tuple | None) -> None:
+        self.program.loaded_model = model_state
+
+    def uniform_location(self, variable_name: str) -> int:
+        """location from the link time table, -1 for inactive uniforms"""
+        variable = self.uniforms.get(variable_name)
+        return -1 if variable is None else variable.location
+
+    def attribute_location(self, variable_name: str) -> int:
+        variable = self.attributes.get(variable_name)
+        return -1 if variable is None else variable.location
+
+    @property
+    def attribute_variables(self) -> dict[str, str]:
+        """shader attribute name of every vertex layout attribute it reads"""
+        variables = {
+            "position": self.vertex_position_var,
+            "color": self.vertex_color_var,
+            "normal": self.vertex_normal_Var,
+            "uv": self.vertex_tex_uv_var,
+            "layer": self.vertex_layer_var,
+            "tangent": self.vertex_tangent_var,
+        }
+        return {name: var for name, var in variables.items() if var is not None}
+
     def use(self):
         glUseProgram(self.program_id)
@@ -0,0 +1,17 @@
+import dataclasses
+
+
+@dataclasses.dataclass(slots=True)
+class FrameStats:
+    """counters of the last displayed frame, see Screen.stats"""
+
+    visible: int = 0
+    culled: int = 0
+    # drawn conditional on an occlusion query that found them hidden
+    occluded: int = 0
+    draws: int = 0
+    triangles: int = 0
+    program_binds: int = 0
+    texture_binds: int = 0
+    vao_binds: int = 0
+    binds_avoided: int = 0
@@ -1,27 +1,160 @@
+import sys
+from typing import Callable, Self
+from numpy.typing import NDArray
+import numpy as np
 import pygame
 from OpenGL.GL import *
+from core.profiler import profiler
+
+# (bytes per pixel, byte index of red) -> (internal format, pixel format)
+UPLOAD_FORMATS = {
+    (4, 0): (GL_RGBA8, GL_RGBA),
+    (4, 2): (GL_RGBA8, GL_BGRA),
+    (3, 0): (GL_RGB8, GL_RGB),
+    (3, 2): (GL_RGB8, GL_BGR),
+}
+
+
+def _byte_index(mask: int, bytesize: int) -> int:
+    shift = (mask & -mask).bit_length() - 1
+    index = shift // 8
+    return index if sys.byteorder == "little" else bytesize - 1 - index
+
+
+def upload_format(surface: pygame.Surface) -> tuple[int, int] | None:
+    """(internal format, pixel format) to upload the surface buffer as is"""
+    bytesize = surface.get_bytesize()
+    red, green, blue, alpha = surface.get_masks()
+    if red == 0:
+        return None  # palette images
+    formats = UPLOAD_FORMATS.get((bytesize, _byte_index(red, bytesize)))
+    if formats is not None and bytesize == 4 and alpha == 0:
+        return GL_RGB8, formats[1]  # padding byte, alpha reads as 1
+    return formats
+
+
+def prepare_surface(surface: pygame.Surface) -> pygame.Surface:
+    """surface flipped to gl row order in a format upload_format accepts
+
+    This is the only pixel copy, it is safe to run on a worker thread.
+    """
+    flipped = pygame.transform.flip(surface, False, True)
+    if upload_format(flipped) is None:
+        rgba = pygame.image.tobytes(flipped, "RGBA")
+        flipped = pygame.image.frombytes(rgba, flipped.get_size(), "RGBA")
+    return flipped
+
+
+def mip_levels(width: int, height: int) -> int:
+    return max(width, height).bit_length()
+
+
+def unpack_surface(surface: pygame.Surface) -> NDArray[np.uint8]:
+    """surface buffer as uploaded, sets the unpack alignment and row length
+
+    The surface stays locked while the returned array is alive.
+    """
+    pitch = surface.get_pitch()
+    bytesize = surface.get_bytesize()
+    alignment = next(a for a in (8, 4, 2, 1) if pitch % a == 0)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, alignment)
+    if pitch % bytesize == 0:
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, pitch // bytesize)
+    return np.frombuffer(surface.get_buffer(), dtype=np.uint8)
+
+
+def reset_unpack() -> None:
+    glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
 
 
 class Texture:
-    def __init__(self, teximage: pygame.Surface):
-        self.surface = teximage
+    """2d texture uploaded straight from the surface buffer
+
+    Storage is immutable (glTexStorage2D) where the driver has it. Users call
+    acquire()/release(), the texture is deleted once the count drops to zero.
+    """
+
+    target = GL_TEXTURE_2D
+
+    def __init__(
+        self, teximage: pygame.Surface, prepared: bool = False, use_pbo: bool = False
+    ):
+        self.surface = teximage if prepared else prepare_surface(teximage)
+        self.width, self.height = self.surface.get_size()
+        self.use_pbo = use_pbo
         self.texture_id = glGenTextures(1)
+        self.refcount = 0
+        self.on_delete: Callable[[Self], None] | None = None
+        self._allocated = False
         self.load()
 
+    def acquire(self) -> Self:
+        self.refcount += 1
+        return self
+
+    def release(self) -> None:
+        self.refcount -= 1
+        if self.refcount <= 0:
+            self.delete()
+
+    def delete(self) -> None:
+        if self.texture_id:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = 0
+            if self.on_delete is not None:
+                self.on_delete(self)
+
+    def _allocate(self, internal_format: int, pixel_format: int) -> None:
+        if bool(glTexStorage2D):
+            levels = mip_levels(self.width, self.height)
+            glTexStorage2D(
+                GL_TEXTURE_2D, levels, internal_format, self.width, self.height
+            )
+        else:  # no immutable storage before gl 4.2, e.g. macos
+            glTexImage2D(
+                GL_TEXTURE_2D,
+                0,
+                internal_format,
+                self.width,
+                self.height,
+                0,
+                pixel_format,
+                GL_UNSIGNED_BYTE,
+                None,
+            )
+        self._allocated = True
+
     def load(self) -> None:
-        pixel_data = pygame.image.tostring(self.surface, "RGBA", 1)
+        internal_format, pixel_format = upload_format(self.surface)
         glBindTexture(GL_TEXTURE_2D, self.texture_id)
-        glTexImage2D(
+        if not self._allocated:
+            self._allocate(internal_format, pixel_format)
+
+        pixels = unpack_surface(self.surface)
+        pbo = None
+        if self.use_pbo:
+            pbo = glGenBuffers(1)
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, pixels.nbytes, pixels, GL_STREAM_DRAW)
+        glTexSubImage2D(
             GL_TEXTURE_2D,
             0,
-            GL_RGBA,
-            self.surface.get_width(),
-            self.surface.get_height(),
             0,
-            GL_RGBA,
+            0,
+            self.width,
+            self.height,
+            pixel_format,
             GL_UNSIGNED_BYTE,
-            pixel_data,
+            None if pbo is not None else pixels,
         )
+        profiler.count("bytes uploaded", pixels.nbytes)
+        del pixels  # unlocks the surface
+        if pbo is not None:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            glDeleteBuffers(1, [pbo])
+        reset_unpack()
+
         glGenerateMipmap(GL_TEXTURE_2D)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
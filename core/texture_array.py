@@ -0,0 +1,225 @@
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Self
+from numpy.typing import NDArray
+import numpy as np
+import pygame
+from OpenGL.GL import *
+from core.profiler import profiler
+from core.texture import (
+    mip_levels,
+    prepare_surface,
+    reset_unpack,
+    unpack_surface,
+    upload_format,
+)
+from core.texture_manager import decode_image
+
+MIN_LAYER_SIZE = 16
+MAX_LAYERS = 256  # the GL_MAX_ARRAY_TEXTURE_LAYERS minimum of gl 3.3
+
+
+def size_class(width: int, height: int) -> int:
+    """power of two layer size an image is packed into"""
+    return max(MIN_LAYER_SIZE, 1 << (max(width, height) - 1).bit_length())
+
+
+def pad_surface(surface: pygame.Surface, size: int) -> pygame.Surface:
+    """surface in the bottom left corner of a transparent size x size surface"""
+    if surface.get_size() == (size, size):
+        return surface
+    padded = pygame.Surface((size, size), surface.get_flags(), surface)
+    padded.fill((0, 0, 0, 0))
+    padded.blit(surface, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
+    return padded
+
+
+class TextureArray:
+    """GL_TEXTURE_2D_ARRAY of size x size layers, refcounted like Texture"""
+
+    target = GL_TEXTURE_2D_ARRAY
+
+    def __init__(self, size: int, surfaces: list[pygame.Surface]):
+        self.size = size
+        self.layers = len(surfaces)
+        self.used_texels = sum(
+            surface.get_width() * surface.get_height() for surface in surfaces
+        )
+        self.texture_id = glGenTextures(1)
+        self.refcount = 0
+        self.on_delete: Callable[[Self], None] | None = None
+        self.load(surfaces)
+
+    @property
+    def efficiency(self) -> float:
+        """share of the allocated level 0 texels covered by images"""
+        return self.used_texels / (self.layers * self.size**2)
+
+    def acquire(self) -> Self:
+        self.refcount += 1
+        return self
+
+    def release(self) -> None:
+        self.refcount -= 1
+        if self.refcount <= 0:
+            self.delete()
+
+    def delete(self) -> None:
+        if self.texture_id:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = 0
+            if self.on_delete is not None:
+                self.on_delete(self)
+
+    def load(self, surfaces: list[pygame.Surface]) -> None:
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.texture_id)
+        if bool(glTexStorage3D):
+            glTexStorage3D(
+                GL_TEXTURE_2D_ARRAY,
+                mip_levels(self.size, self.size),
+                GL_RGBA8,
+                self.size,
+                self.size,
+                self.layers,
+            )
+        else:  # no immutable storage before gl 4.2, e.g. macos
+            glTexImage3D(
+                GL_TEXTURE_2D_ARRAY,
+                0,
+                GL_RGBA8,
+                self.size,
+                self.size,
+                self.layers,
+                0,
+                GL_RGBA,
+                GL_UNSIGNED_BYTE,
+                None,
+            )
+        for layer, surface in enumerate(surfaces):
+            surface = pad_surface(surface, self.size)
+            _, pixel_format = upload_format(surface)
+            pixels = unpack_surface(surface)
+            glTexSubImage3D(
+                GL_TEXTURE_2D_ARRAY,
+                0,
+                0,
+                0,
+                layer,
+                self.size,
+                self.size,
+                1,
+                pixel_format,
+                GL_UNSIGNED_BYTE,
+                pixels,
+            )
+            profiler.count("bytes uploaded", pixels.nbytes)
+            del pixels  # unlocks the surface
+        reset_unpack()
+
+        glGenerateMipmap(GL_TEXTURE_2D_ARRAY)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(
+            GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR
+        )
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_REPEAT)
+
+
+@dataclasses.dataclass(slots=True)
+class PackedTexture:
+    """one image inside a TextureArray, used by Mesh in place of a Texture
+
+    Meshes scale their uvs by uv_scale and add a per vertex layer attribute,
+    uvs outside [0, 1] only repeat for images that fill their layer.
+    """
+
+    array: TextureArray
+    layer: int
+    uv_scale: tuple[float, float]
+
+    target = GL_TEXTURE_2D_ARRAY
+
+    @property
+    def texture_id(self) -> int:
+        return self.array.texture_id
+
+    def acquire(self) -> Self:
+        self.array.acquire()
+        return self
+
+    def release(self) -> None:
+        self.array.release()
+
+    def vertex_attributes(self, vertex_textures: NDArray) -> dict[str, NDArray]:
+        uv = np.asarray(vertex_textures, dtype=np.float32) * np.float32(self.uv_scale)
+        layer = np.full((len(uv), 1), self.layer, dtype=np.float32)
+        return {"uv": uv, "layer": layer}
+
+
+class TextureArrayPacker:
+    """packs images into one texture array per power of two size class
+
+    Meshes textured from the same array share one texture binding, so the
+    render queue binds once per size class instead of once per image.
+    """
+
+    def __init__(self, max_layers: int = MAX_LAYERS):
+        self.max_layers = max_layers
+        self.surfaces: dict[str, pygame.Surface] = {}
+        self.aliases: dict[str, str] = {}
+        self.arrays: list[TextureArray] = []
+
+    def add(self, name: str, surface: pygame.Surface, prepared: bool = False) -> None:
+        self.surfaces[name] = surface if prepared else prepare_surface(surface)
+
+    def add_files(self, paths: Iterable[str]) -> None:
+        """decodes images on a thread pool, identical files share a layer"""
+        paths = list(paths)
+        by_content: dict[str, str] = {}
+        with ThreadPoolExecutor() as executor:
+            for path, (content_hash, surface) in zip(
+                paths, executor.map(decode_image, paths)
+            ):
+                if content_hash in by_content:
+                    self.aliases[path] = by_content[content_hash]
+                else:
+                    by_content[content_hash] = path
+                    self.add(path, surface, prepared=True)
+
+    def pack(self) -> dict[str, PackedTexture]:
+        """uploads the added images, returns where each of them went"""
+        classes: dict[int, list[str]] = {}
+        for name, surface in self.surfaces.items():
+            classes.setdefault(size_class(*surface.get_size()), []).append(name)
+
+        packed = {}
+        for size, names in sorted(classes.items()):
+            for start in range(0, len(names), self.max_layers):
+                chunk = names[start : start + self.max_layers]
+                array = TextureArray(size, [self.surfaces[name] for name in chunk])
+                self.arrays.append(array)
+                for layer, name in enumerate(chunk):
+                    width, height = self.surfaces[name].get_size()
+                    packed[name] = PackedTexture(
+                        array, layer, (width / size, height / size)
+                    )
+        for alias, name in self.aliases.items():
+            packed[alias] = packed[name]
+        self.surfaces.clear()
+        return packed
+
+    @property
+    def efficiency(self) -> float:
+        allocated = sum(array.layers * array.size**2 for array in self.arrays)
+        used = sum(array.used_texels for array in self.arrays)
+        return used / allocated if allocated else 1.0
+
+    def report(self) -> str:
+        lines = [
+            f"{array.size:>5}px x {array.layers:>3} layers: {array.efficiency:6.1%}"
+            for array in self.arrays
+        ]
+        lines.append(
+            f"{len(self.arrays)} arrays, packing efficiency {self.efficiency:.1%}"
+        )
+        return "\n".join(lines)
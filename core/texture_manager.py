@@ -0,0 +1,85 @@
+import hashlib
+import io
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
+import pygame
+from core.texture import Texture, prepare_surface
+
+
+def decode_image(path: str) -> tuple[str, pygame.Surface]:
+    """(content hash, upload ready surface) of an image file, run on workers"""
+    with open(path, "rb") as f:
+        content = f.read()
+    content_hash = hashlib.blake2b(content, digest_size=16).hexdigest()
+    surface = pygame.image.load(io.BytesIO(content), os.path.basename(path))
+    return content_hash, prepare_surface(surface)
+
+
+class TextureManager:
+    """one Texture per image, shared by every mesh that loads it
+
+    Textures are looked up by path and by content hash, so copies of a file
+    also share. Images are decoded on a thread pool, prefetch() starts decoding
+    early and load() only waits for the result and uploads it. Meshes acquire
+    the textures they use, a texture is deleted and forgotten once the last
+    one releases it. Screen resets the manager when it creates another context.
+    """
+
+    def __init__(self, max_workers: int | None = None, use_pbo: bool = False):
+        self.executor = ThreadPoolExecutor(max_workers, "texture-decode")
+        self.use_pbo = use_pbo
+        self.by_path: dict[str, Texture] = {}
+        self.by_content: dict[str, Texture] = {}
+        self.pending: dict[str, Future[tuple[str, pygame.Surface]]] = {}
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            if os.path.abspath(path) not in self.by_path:
+                self.decode(path)
+
+    def decode(self, path: str) -> Future[tuple[str, pygame.Surface]]:
+        """decode of an image file that has not been uploaded yet"""
+        key = os.path.abspath(path)
+        if key not in self.pending:
+            self.pending[key] = self.executor.submit(decode_image, key)
+        return self.pending[key]
+
+    def loaded(self, path: str) -> bool:
+        return os.path.abspath(path) in self.by_path
+
+    def load(self, path: str) -> Texture:
+        """the texture of an image file, decoded and uploaded on first use"""
+        key = os.path.abspath(path)
+        if (texture := self.by_path.get(key)) is not None:
+            return texture
+        content_hash, surface = self.decode(key).result()
+        del self.pending[key]
+        texture = self.by_content.get(content_hash)
+        if texture is None:
+            texture = Texture(surface, prepared=True, use_pbo=self.use_pbo)
+            texture.on_delete = self._forget
+            self.by_content[content_hash] = texture
+        self.by_path[key] = texture
+        return texture
+
+    def _forget(self, texture: Texture) -> None:
+        for table in (self.by_path, self.by_content):
+            for key in [key for key, value in table.items() if value is texture]:
+                del table[key]
+
+    def reset(self) -> None:
+        """forgets the uploaded textures, e.g. for a new context where their ids
+        are invalid; decodes in flight are kept"""
+        self.by_path.clear()
+        self.by_content.clear()
+
+    def __len__(self) -> int:
+        return len(self.by_content)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+        self.pending.clear()
+
+
+default_texture_manager = TextureManager()
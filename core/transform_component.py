@@ -0,0 +1,188 @@
+import itertools
+import pygame
+from numpy.typing import NDArray
+import numpy as np
+import core.transformations as transform
+
+
+class Transform:
+    """translation, rotation and scale of an object plus optional motion
+
+    The model matrix is recomposed lazily after a change only. `version` grows
+    with every change, so users can skip uploads while it stays the same.
+    Velocities are per second and advanced by update(dt), rotations and scales
+    are applied in the local frame like transform.rotateA/do_scale. The
+    rotation is a unit quaternion, renormalized after every product so it does
+    not drift like repeatedly multiplied matrices. The state before the last
+    update is kept so renderers can draw in between two fixed rate updates with
+    interpolated_state(alpha), direct changes snap.
+    """
+
+    def __init__(
+        self,
+        translation: pygame.Vector3 | None = None,
+        rotation: transform.Rotation | None = None,
+        scale: pygame.Vector3 | None = None,
+    ):
+        self.translation = pygame.Vector3(translation or (0, 0, 0))
+        self.rotation = np.array([0, 0, 0, 1], dtype=np.float64)
+        if rotation is not None:
+            self.rotation = rotation.quaternion
+        self.scale = pygame.Vector3(scale or (1, 1, 1))
+        self.velocity = pygame.Vector3(0, 0, 0)
+        self.angular_velocity = pygame.Vector3(0, 0, 0)
+        self.scale_rate = pygame.Vector3(1, 1, 1)
+        self.version = 0
+        self._matrix = transform.identity_matrix()
+        self._dirty = True
+        # (translation, rotation, scale) before update()
+        self._previous: tuple | None = None
+
+    def mark_dirty(self) -> None:
+        self._dirty = True
+        self.version += 1
+        self._previous = None
+
+    @property
+    def interpolating(self) -> bool:
+        return self._previous is not None
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    @property
+    def moving(self) -> bool:
+        return (
+            self.velocity.length_squared() > 0
+            or self.angular_velocity.length_squared() > 0
+            or self.scale_rate != pygame.Vector3(1, 1, 1)
+        )
+
+    def set_translation(self, translation: pygame.Vector3) -> None:
+        self.translation = pygame.Vector3(translation)
+        self.mark_dirty()
+
+    def set_rotation(self, rotation: transform.Rotation) -> None:
+        self.rotation = rotation.quaternion
+        self.mark_dirty()
+
+    def set_scale(self, scale: pygame.Vector3) -> None:
+        self.scale = pygame.Vector3(scale)
+        self.mark_dirty()
+
+    def translate(self, translation: pygame.Vector3) -> None:
+        self.translation += translation
+        self.mark_dirty()
+
+    def rotate(self, rotation: transform.Rotation) -> None:
+        self._turn(rotation.quaternion)
+        self.mark_dirty()
+
+    def do_scale(self, scale: pygame.Vector3) -> None:
+        self.scale = self.scale.elementwise() * scale
+        self.mark_dirty()
+
+    def add_velocity(self, velocity: pygame.Vector3) -> None:
+        self.velocity += velocity
+
+    def add_angular_velocity(self, rotation: transform.Rotation) -> None:
+        """rotation.angle degrees per second about rotation.axis"""
+        self.angular_velocity += rotation.axis.normalize() * rotation.angle
+
+    def add_scale_rate(self, scale: pygame.Vector3) -> None:
+        """scale factor reached after one second"""
+        self.scale_rate = self.scale_rate.elementwise() * scale
+
+    def update(self, dt: float) -> None:
+        if dt <= 0 or not self.moving:
+            if self._previous is not None:
+                self._previous = None
+                self.version += 1  # the interpolated matrix reached the current one
+            return
+        previous = (
+            pygame.Vector3(self.translation),
+            self.rotation.copy(),
+            pygame.Vector3(self.scale),
+        )
+        if self.velocity.length_squared() > 0:
+            self.translation += self.velocity * dt
+        speed = self.angular_velocity.length()
+        if speed > 0:
+            self._turn(
+                transform.axis_angle_quaternions(self.angular_velocity, speed * dt)
+            )
+        if self.scale_rate != pygame.Vector3(1, 1, 1):
+            self.scale = self.scale.elementwise() * pygame.Vector3(
+                self.scale_rate.x**dt, self.scale_rate.y**dt, self.scale_rate.z**dt
+            )
+        self.mark_dirty()
+        self._previous = previous
+
+    def _turn(self, quaternion: NDArray) -> None:
+        transform.multiply_quaternions(self.rotation, quaternion, out=self.rotation)
+        transform.normalize_quaternions(self.rotation, out=self.rotation)
+
+    @property
+    def matrix(self) -> NDArray:
+        """translation @ rotation @ scale"""
+        if self._dirty:
+            transform.compose_matrix(
+                self.translation, self.rotation, self.scale, out=self._matrix
+            )
+            self._dirty = False
+        return self._matrix
+
+    @property
+    def previous_state(self) -> tuple[pygame.Vector3, NDArray, pygame.Vector3]:
+        """(translation, rotation, scale) before the last update, the current
+        ones when not interpolating"""
+        return self._previous or (self.translation, self.rotation, self.scale)
+
+    def interpolated_state(
+        self, alpha: float
+    ) -> tuple[pygame.Vector3, NDArray, pygame.Vector3]:
+        """(translation, rotation, scale) between the states before (0) and
+        after (1) the last update, see transform.compose_matrices"""
+        if self._previous is None or alpha >= 1:
+            return self.translation, self.rotation, self.scale
+        translation, rotation, scale = self.previous_state
+        return (
+            translation.lerp(self.translation, alpha),
+            transform.slerp_quaternions(rotation, self.rotation, alpha),
+            scale.lerp(self.scale, alpha),
+        )
+
+    def interpolated_matrix(self, alpha: float) -> NDArray:
+        """matrix between the states before (0) and after (1) the last update"""
+        if self._previous is None or alpha >= 1:
+            return self.matrix
+        return transform.compose_matrix(*self.interpolated_state(alpha))
+
+
+def _stack(vectors: list, width: int) -> NDArray:
+    """(N, width) float64 array, fromiter is much faster than np.array on Vector3s"""
+    values = itertools.chain.from_iterable(vectors)
+    return np.fromiter(values, np.float64, len(vectors) * width).reshape(-1, width)
+
+
+def interpolated_states(
+    transforms: list[Transform], alpha: float
+) -> tuple[NDArray, NDArray, NDArray]:
+    """(N, 3) translations, (N, 4) rotations and (N, 3) scales of
+    Transform.interpolated_state for many transforms in one go"""
+    translations = _stack([t.translation for t in transforms], 3)
+    rotations = np.array([t.rotation for t in transforms])
+    scales = _stack([t.scale for t in transforms], 3)
+    if alpha >= 1 or not any(t.interpolating for t in transforms):
+        return translations, rotations, scales
+    previous = [t.previous_state for t in transforms]
+    old_translations = _stack([state[0] for state in previous], 3)
+    old_scales = _stack([state[2] for state in previous], 3)
+    return (
+        old_translations + (translations - old_translations) * alpha,
+        transform.slerp_quaternions(
+            np.array([state[1] for state in previous]), rotations, alpha
+        ),
+        old_scales + (scales - old_scales) * alpha,
+    )
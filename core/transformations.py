@@ -1,14 +1,171 @@
 import pygame
 import dataclasses
+import math
 from numpy.typing import NDArray
 import numpy as np
 
 
 @dataclasses.dataclass(frozen=True, slots=True)
 class Rotation:
+    """angle degrees about axis, applied as a unit quaternion"""
+
     angle: float
     axis: pygame.Vector3
 
+    @property
+    def quaternion(self) -> NDArray:
+        return axis_angle_quaternions(self.axis, self.angle)
+
+
+# batched math below works on arrays of N transforms: (N, 3) translations and
+# scales, (N, 4) x, y, z, w unit quaternions and (N, 4, 4) matrices. Functions
+# taking out= write into it instead of allocating the result. Single (4,)
+# quaternions take a scalar path, numpy calls cost more than the math there.
+
+
+def axis_angle_quaternions(
+    axes: NDArray, angles: NDArray | float, out: NDArray | None = None
+) -> NDArray:
+    """quaternions rotating by angles degrees about axes, (3,) gives (4,)"""
+    if isinstance(axes, pygame.Vector3) or np.ndim(axes) == 1 and np.ndim(angles) == 0:
+        x, y, z = axes
+        half = math.radians(angles) / 2
+        scale = math.sin(half) / max(math.sqrt(x * x + y * y + z * z), 1e-12)
+        single = (x * scale, y * scale, z * scale, math.cos(half))
+        if out is None:
+            return np.array(single, dtype=np.float64)
+        out[:] = single
+        return out
+    axes = np.asarray(axes, dtype=np.float64)
+    half = np.radians(np.asarray(angles, dtype=np.float64)) / 2
+    if out is None:
+        out = np.empty((*np.broadcast_shapes(axes.shape[:-1], half.shape), 4))
+    lengths = np.linalg.norm(axes, axis=-1)
+    out[..., :3] = axes * (np.sin(half) / np.maximum(lengths, 1e-12))[..., None]
+    out[..., 3] = np.cos(half)
+    return out
+
+
+def multiply_quaternions(a: NDArray, b: NDArray, out: NDArray | None = None) -> NDArray:
+    """a * b, the rotation b followed by a"""
+    if np.ndim(a) == 1 and np.ndim(b) == 1:
+        ax, ay, az, aw = a.tolist() if isinstance(a, np.ndarray) else a
+        bx, by, bz, bw = b.tolist() if isinstance(b, np.ndarray) else b
+        single = (
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz,
+        )
+        if out is None:
+            return np.array(single, dtype=np.float64)
+        out[:] = single
+        return out
+    ax, ay, az, aw = np.moveaxis(np.asarray(a), -1, 0)
+    bx, by, bz, bw = np.moveaxis(np.asarray(b), -1, 0)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(np.shape(a), np.shape(b)))
+    # the right hand sides are evaluated before out is written, so out may be a
+    out[...] = np.stack(
+        (
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+            aw * bw - ax * bx - ay * by - az * bz,
+        ),
+        axis=-1,
+    )
+    return out
+
+
+def normalize_quaternions(q: NDArray, out: NDArray | None = None) -> NDArray:
+    """unit length again, repeated products slowly drift away from it"""
+    if np.ndim(q) == 1:
+        length = math.sqrt(sum(i * i for i in q.tolist()))
+        return np.divide(q, length, out=out)
+    return np.divide(q, np.linalg.norm(q, axis=-1, keepdims=True), out=out)
+
+
+def slerp_quaternions(
+    a: NDArray, b: NDArray, t: NDArray | float, out: NDArray | None = None
+) -> NDArray:
+    """spherical interpolation from a (t=0) to b (t=1) along the shorter arc"""
+    if np.ndim(a) == 1 and np.ndim(b) == 1 and np.ndim(t) == 0:
+        a, b = np.asarray(a).tolist(), np.asarray(b).tolist()
+        dot = sum(i * j for i, j in zip(a, b))
+        if dot < 0:
+            b, dot = [-j for j in b], -dot
+        angle = math.acos(min(dot, 1.0))
+        sin = math.sin(angle)
+        if sin < 1e-6:
+            wa, wb = 1 - t, t
+        else:
+            wa, wb = math.sin((1 - t) * angle) / sin, math.sin(t * angle) / sin
+        single = np.array([wa * i + wb * j for i, j in zip(a, b)], dtype=np.float64)
+        return normalize_quaternions(single, out=out)
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    dot = (a * b).sum(axis=-1, keepdims=True)
+    b = np.where(dot < 0, -b, b)
+    dot = np.abs(dot)
+    angle = np.arccos(np.minimum(dot, 1.0))
+    sin = np.sin(angle)
+    close = sin < 1e-6  # nearly equal, lerp avoids dividing by ~0
+    safe = np.where(close, 1.0, sin)
+    wa = np.where(close, 1 - t, np.sin((1 - t) * angle) / safe)
+    wb = np.where(close, t, np.sin(t * angle) / safe)
+    return normalize_quaternions(wa * a + wb * b, out=out)
+
+
+def compose_matrices(
+    translations: NDArray,
+    rotations: NDArray,
+    scales: NDArray,
+    out: NDArray | None = None,
+) -> NDArray:
+    """(N, 4, 4) translation @ rotation @ scale matrices
+
+    With out every step writes into it (the bottom row is scratch space until
+    the end), so composing allocates nothing but array views.
+    """
+    rotations = np.asarray(rotations)
+    if out is None:
+        out = np.empty((len(rotations), 4, 4), dtype=np.float32)
+    x, y, z, w = (rotations[:, i] for i in range(4))
+    multiply = np.multiply
+
+    # off diagonal cells come in pairs 2 (a - b), 2 (a + b) of two products
+    for (di, dj), (si, sj), first, second in (
+        ((0, 1), (1, 0), (x, y), (z, w)),
+        ((2, 0), (0, 2), (x, z), (y, w)),
+        ((1, 2), (2, 1), (y, z), (x, w)),
+    ):
+        difference, total = out[:, di, dj], out[:, si, sj]
+        multiply(*first, out=difference)
+        multiply(*second, out=total)
+        np.subtract(difference, total, out=difference)
+        multiply(total, 2, out=total)
+        np.add(total, difference, out=total)
+        multiply(difference, 2, out=difference)
+        multiply(total, 2, out=total)
+
+    squares = out[:, 3, :3]
+    multiply(rotations[:, :3], rotations[:, :3], out=squares)
+    for i, (j, k) in enumerate(((1, 2), (0, 2), (0, 1))):
+        diagonal = out[:, i, i]
+        np.add(squares[:, j], squares[:, k], out=diagonal)
+        multiply(diagonal, -2, out=diagonal)
+        np.add(diagonal, 1, out=diagonal)
+
+    scales = np.asarray(scales)
+    for j in range(3):
+        multiply(out[:, :3, j], scales[:, j, None], out=out[:, :3, j])
+    out[:, :3, 3] = translations
+    out[:, 3, :3] = 0
+    out[:, 3, 3] = 1
+    return out
+
 
 def identity_matrix() -> NDArray:
     return np.array(
@@ -72,38 +229,57 @@ def rotate_z_mat(angle: float) -> NDArray:
 
 def rotate_axis_matrix(theta: float, axis: pygame.Vector3) -> NDArray:
     """matrix that rotates about any axis"""
-    c = np.cos(np.radians(theta))
-    s = np.sin(np.radians(theta))
-    axis = axis.normalize()
-    ux2 = axis.x * axis.x
-    uy2 = axis.y * axis.y
-    uz2 = axis.z * axis.z
+    c = math.cos(math.radians(theta))
+    s = math.sin(math.radians(theta))
+    x, y, z = axis.normalize()
+    t = 1 - c
     return np.array(
-        [
-            [
-                ux2 + (1 - ux2) * c,
-                axis.x * axis.y * (1 - c) - axis.z * s,
-                axis.x * axis.z * (1 - c) + axis.y * s,
-                0,
-            ],
-            [
-                axis.x * axis.y * (1 - c) + axis.z * s,
-                uy2 + (1 - uy2) * c,
-                axis.y * axis.z * (1 - c) - axis.x * s,
-                0,
-            ],
-            [
-                axis.x * axis.z * (1 - c) - axis.y * s,
-                axis.y * axis.z * (1 - c) + axis.x * s,
-                uz2 + (1 - uz2) * c,
-                0,
-            ],
-            [0, 0, 0, 1],
-        ],
+        (
+            (x * x * t + c, x * y * t - z * s, x * z * t + y * s, 0),
+            (x * y * t + z * s, y * y * t + c, y * z * t - x * s, 0),
+            (x * z * t - y * s, y * z * t + x * s, z * z * t + c, 0),
+            (0, 0, 0, 1),
+        ),
         np.float32,
     )
 
 
+def compose_matrix(
+    translation: pygame.Vector3,
+    rotation: NDArray,
+    scale: pygame.Vector3,
+    out: NDArray | None = None,
+) -> NDArray:
+    """translation @ rotation @ scale of one transform, see compose_matrices"""
+    x, y, z, w = rotation.tolist()
+    sx, sy, sz = scale
+    rows = (
+        (
+            (1 - 2 * (y * y + z * z)) * sx,
+            2 * (x * y - z * w) * sy,
+            2 * (x * z + y * w) * sz,
+            translation[0],
+        ),
+        (
+            2 * (x * y + z * w) * sx,
+            (1 - 2 * (x * x + z * z)) * sy,
+            2 * (y * z - x * w) * sz,
+            translation[1],
+        ),
+        (
+            2 * (x * z - y * w) * sx,
+            2 * (y * z + x * w) * sy,
+            (1 - 2 * (x * x + y * y)) * sz,
+            translation[2],
+        ),
+        (0, 0, 0, 1),
+    )
+    if out is None:
+        return np.array(rows, np.float32)
+    out[:] = rows
+    return out
+
+
 def translate(matrix: NDArray, vec: pygame.Vector3, local: bool = False) -> NDArray:
     if local:
         return matrix @ translate_matrix(vec)
@@ -133,3 +309,20 @@ def rotateA(matrix: NDArray, theta: float, axis: pygame.Vector3, local: bool = T
     if local:
         return matrix @ rotate_axis_matrix(theta, axis)
     return rotate_axis_matrix(theta, axis) @ matrix
+
+
+def look_at_matrix(
+    eye: pygame.Vector3,
+    target: pygame.Vector3,
+    up: pygame.Vector3 = pygame.Vector3(0, 1, 0),
+) -> NDArray:
+    """view matrix of a camera at eye looking at target"""
+    forward = (pygame.Vector3(target) - eye).normalize()
+    right = forward.cross(up).normalize()
+    true_up = right.cross(forward)
+    view = identity_matrix()
+    view[0, :3] = right
+    view[1, :3] = true_up
+    view[2, :3] = -forward
+    view[:3, 3] = -(view[:3, :3] @ np.array(eye, dtype=np.float32))
+    return view
@@ -3,10 +3,11 @@ from typing import Iterable, Protocol
 from numpy.typing import NDArray
 import numpy as np
 from OpenGL.GL import *
+from core.shader import Shader
 
 
-def find_uniform_variable(program_id: int, variable_name: str) -> int:
-    result = glGetUniformLocation(program_id, variable_name)
+def find_uniform_variable(shader: Shader, variable_name: str) -> int:
+    result = shader.uniform_location(variable_name)
     if result == -1:
         raise Exception(f"Variable {variable_name} not found")
     return result
@@ -19,7 +20,7 @@ class Uniform(Protocol):
     def __init__(self, data: Iterable[Number] | NDArray) -> None:
         pass
 
-    def find_variable(self, program_id: int, variable_name: str) -> int:
+    def find_variable(self, shader: Shader, variable_name: str) -> int:
         pass
 
     def load_data(self) -> None:
@@ -27,16 +28,19 @@ class Uniform(Protocol):
 
 
 class UniformSampler2D:
-    def __init__(self, data: Iterable[Number] | NDArray):
+    """[texture id, texture unit], target is GL_TEXTURE_2D_ARRAY for arrays"""
+
+    def __init__(self, data: Iterable[Number] | NDArray, target: int = GL_TEXTURE_2D):
         self.data = np.array(data, dtype=np.int32)
+        self.target = target
         self.variable_id = None
 
-    def find_variable(self, program_id: int, variable_name: str) -> int:
-        self.variable_id = find_uniform_variable(program_id, variable_name)
+    def find_variable(self, shader: Shader, variable_name: str) -> int:
+        self.variable_id = find_uniform_variable(shader, variable_name)
 
     def load_data(self):
         glActiveTexture(GL_TEXTURE0 + self.data[1])
-        glBindTexture(GL_TEXTURE_2D, self.data[0])
+        glBindTexture(self.target, self.data[0])
         glUniform1i(self.variable_id, self.data[1])
 
 
@@ -47,8 +51,8 @@ class UniformVec3:
             self.data = np.array(data, dtype=np.float32)
         self.variable_id = None
 
-    def find_variable(self, program_id: int, variable_name: str) -> int:
-        self.variable_id = find_uniform_variable(program_id, variable_name)
+    def find_variable(self, shader: Shader, variable_name: str) -> int:
+        self.variable_id = find_uniform_variable(shader, variable_name)
 
     def load_data(self):
         glUniform3f(self.variable_id, *self.data)
@@ -61,8 +65,22 @@ class UniformMat4:
             self.data = np.array(data, dtype=np.float32).reshape((4, 4))
         self.variable_id = None
 
-    def find_variable(self, program_id: int, variable_name: str) -> int:
-        self.variable_id = find_uniform_variable(program_id, variable_name)
+    def find_variable(self, shader: Shader, variable_name: str) -> int:
+        self.variable_id = find_uniform_variable(shader, variable_name)
 
     def load_data(self):
         glUniformMatrix4fv(self.variable_id, 1, GL_TRUE, self.data)
+
+
+class UniformMat3:
+    def __init__(self, data: Iterable[Number] | NDArray):
+        self.data = data
+        if isinstance(data, Iterable):
+            self.data = np.array(data, dtype=np.float32).reshape((3, 3))
+        self.variable_id = None
+
+    def find_variable(self, shader: Shader, variable_name: str) -> int:
+        self.variable_id = find_uniform_variable(shader, variable_name)
+
+    def load_data(self):
+        glUniformMatrix3fv(self.variable_id, 1, GL_TRUE, self.data)
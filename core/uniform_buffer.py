@@ -0,0 +1,58 @@
+from OpenGL.GL import *
+import numpy as np
+from core.profiler import profiler
+
+FRAME_DATA_BLOCK = "FrameData"
+FRAME_DATA_BINDING = 0
+LIGHT_DATA_BLOCK = "LightData"
+LIGHT_DATA_BINDING = 1
+CLUSTER_DATA_BLOCK = "ClusterData"
+CLUSTER_DATA_BINDING = 2
+# LightData holds the first MAX_LIGHTS lights for shaders without clusters
+MAX_LIGHTS = 16
+# texture units of the clustered lighting buffers, see core.light_clusters
+TEXTURE_BUFFER_UNITS = {"cluster_lights": 4, "cluster_grid": 5, "cluster_indices": 6}
+
+# std140 layouts of the blocks declared in shaders/, matrices are column-major
+FRAME_DATA_DTYPE = np.dtype(
+    [
+        ("projection_mat", np.float32, (4, 4)),
+        ("view_mat", np.float32, (4, 4)),
+        ("inv_view_mat", np.float32, (4, 4)),
+        ("camera_position", np.float32, (4,)),
+    ]
+)
+LIGHT_DTYPE = np.dtype([("position", np.float32, (4,)), ("color", np.float32, (4,))])
+LIGHT_DATA_DTYPE = np.dtype(
+    [("light_count", np.int32, (4,)), ("light_data", LIGHT_DTYPE, (MAX_LIGHTS,))]
+)
+# tiles x, tiles y, depth slices, light count and the depth slice = log(depth)
+# * scale + bias mapping, tile width and height in pixels
+CLUSTER_DATA_DTYPE = np.dtype(
+    [("grid_size", np.int32, (4,)), ("slicing", np.float32, (4,))]
+)
+
+UNIFORM_BLOCK_BINDINGS = {
+    FRAME_DATA_BLOCK: FRAME_DATA_BINDING,
+    LIGHT_DATA_BLOCK: LIGHT_DATA_BINDING,
+    CLUSTER_DATA_BLOCK: CLUSTER_DATA_BINDING,
+}
+
+
+class UniformBuffer:
+    """uniform buffer object bound to a fixed binding point, data is a numpy record"""
+
+    def __init__(self, dtype: np.dtype, binding: int):
+        self.data = np.zeros((), dtype=dtype)
+        self.binding = binding
+        self.buffer_ref = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer_ref)
+        glBufferData(GL_UNIFORM_BUFFER, dtype.itemsize, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, binding, self.buffer_ref)
+
+    def load_data(self) -> None:
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer_ref)
+        glBufferSubData(
+            GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data.reshape(1).view(np.uint8)
+        )
+        profiler.count("bytes uploaded", self.data.nbytes)
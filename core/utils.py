@@ -1,10 +1,13 @@
+import dataclasses
 import io
+import mmap
+from collections import Counter
+from typing import Callable
 from numpy.typing import NDArray
 import numpy as np
 from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
 from pygame.locals import *
+from core import normals as normal_generation
 
 
 def compile_shaders(shader_type: int, shader_source: str) -> int:
@@ -20,75 +23,399 @@ def compile_shaders(shader_type: int, shader_source: str) -> int:
     return shader_id
 
 
-def create_program(vertex_shader_code: str, fragment_shader_code: str) -> int:
-    vertex_shader_id = compile_shaders(GL_VERTEX_SHADER, vertex_shader_code)
-    fragmet_shader_id = compile_shaders(GL_FRAGMENT_SHADER, fragment_shader_code)
-    program_id = glCreateProgram()
-    glAttachShader(program_id, vertex_shader_id)
-    glAttachShader(program_id, fragmet_shader_id)
-    glLinkProgram(program_id)
+def _check_link(program_id: int) -> None:
     result = glGetProgramiv(program_id, GL_LINK_STATUS)
     if not result:
         error = glGetProgramInfoLog(program_id)
         glDeleteProgram(program_id)
         error = "\n" + error.decode("utf-8")
         raise Exception(error)
+
+
+def create_program(
+    vertex_shader_code: str, fragment_shader_code: str, retrievable: bool = False
+) -> int:
+    """retrievable asks the driver to keep the binary for glGetProgramBinary"""
+    vertex_shader_id = compile_shaders(GL_VERTEX_SHADER, vertex_shader_code)
+    fragmet_shader_id = compile_shaders(GL_FRAGMENT_SHADER, fragment_shader_code)
+    program_id = glCreateProgram()
+    glAttachShader(program_id, vertex_shader_id)
+    glAttachShader(program_id, fragmet_shader_id)
+    if retrievable:
+        glProgramParameteri(program_id, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    glLinkProgram(program_id)
+    glDeleteShader(vertex_shader_id)
+    glDeleteShader(fragmet_shader_id)
+    _check_link(program_id)
+    return program_id
+
+
+def program_binary(program_id: int) -> tuple[int, bytes]:
+    """(binary format, binary) of a program linked with retrievable=True"""
+    size = int(glGetProgramiv(program_id, GL_PROGRAM_BINARY_LENGTH))
+    length = np.zeros(1, dtype=np.int32)
+    binary_format = np.zeros(1, dtype=np.uint32)
+    binary = np.zeros(size, dtype=np.uint8)
+    glGetProgramBinary(program_id, size, length, binary_format, binary)
+    return int(binary_format[0]), binary[: length[0]].tobytes()
+
+
+def load_program_binary(binary_format: int, binary: bytes) -> int:
+    """program from a glGetProgramBinary result, raises if the driver rejects it"""
+    program_id = glCreateProgram()
+    glProgramParameteri(program_id, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    data = np.frombuffer(binary, dtype=np.uint8)
+    glProgramBinary(program_id, binary_format, data, len(data))
+    _check_link(program_id)
     return program_id
 
 
+def add_defines(source: str, defines: dict[str, object]) -> str:
+    """source with a #define line per entry, placed after the #version line"""
+    if not defines:
+        return source
+    lines = "".join(f"#define {name} {value}\n" for name, value in defines.items())
+    if source.lstrip().startswith("#version"):
+        version, _, body = source.lstrip().partition("\n")
+        return f"{version}\n{lines}{body}"
+    return lines + source
+
+
+# driver round trips that should only happen at load time, see introspect_program
+gl_queries: Counter[str] = Counter()
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ShaderVariable:
+    location: int
+    gl_type: int
+    size: int
+
+
+def get_uniform_location(program_id: int, variable_name: str) -> int:
+    gl_queries["uniform_location"] += 1
+    return glGetUniformLocation(program_id, variable_name)
+
+
+def get_attrib_location(program_id: int, variable_name: str) -> int:
+    gl_queries["attrib_location"] += 1
+    return glGetAttribLocation(program_id, variable_name)
+
+
+def _active_variables(
+    program_id: int, count_param: int, get_active: Callable, get_location: Callable
+) -> dict[str, ShaderVariable]:
+    variables = {}
+    for index in range(glGetProgramiv(program_id, count_param)):
+        name, size, gl_type = get_active(program_id, index)
+        if not isinstance(name, (bytes, str)):
+            name = np.asarray(name).tobytes()  # raw char buffer on some versions
+        if isinstance(name, bytes):
+            name = name.rstrip(b"\0").decode()
+        names = [name]
+        if name.endswith("[0]"):
+            base = name[:-3]
+            names = [base, *(f"{base}[{i}]" for i in range(size))]
+        for element in names:
+            location = get_location(program_id, element)
+            if location >= 0:  # members of uniform blocks have no location
+                variables[element] = ShaderVariable(location, gl_type, size)
+    return variables
+
+
+def introspect_program(
+    program_id: int,
+) -> tuple[dict[str, ShaderVariable], dict[str, ShaderVariable]]:
+    """name -> location/type tables of the active uniforms and attributes"""
+    uniforms = _active_variables(
+        program_id, GL_ACTIVE_UNIFORMS, glGetActiveUniform, get_uniform_location
+    )
+    attributes = _active_variables(
+        program_id, GL_ACTIVE_ATTRIBUTES, glGetActiveAttrib, get_attrib_location
+    )
+    return uniforms, attributes
+
+
+def bind_uniform_blocks(program_id: int, bindings: dict[str, int]) -> set[str]:
+    """assigns binding points to the blocks the program declares, returns their names"""
+    found = set()
+    for name, binding in bindings.items():
+        index = glGetUniformBlockIndex(program_id, name)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(program_id, index, binding)
+            found.add(name)
+    return found
+
+
+def bind_sampler_units(
+    program_id: int, uniforms: dict[str, ShaderVariable], units: dict[str, int]
+) -> None:
+    """points the program's samplers among units at their fixed texture unit"""
+    used = {name: unit for name, unit in units.items() if name in uniforms}
+    if not used:
+        return
+    current = glGetIntegerv(GL_CURRENT_PROGRAM)
+    glUseProgram(program_id)
+    for name, unit in used.items():
+        glUniform1i(uniforms[name].location, unit)
+    glUseProgram(current)
+
+
 def read_file(path) -> str:
     with open(path) as f:
         return f.read()
 
 
+# bump whenever parse_obj/load_obj_arrays output changes, it invalidates mesh caches
+OBJ_PARSER_VERSION = 4
+
+_SPACE = ord(" ")
+_NEWLINE = ord("\n")
+_SLASH = ord("/")
+
+
+def _line_bounds(buf: NDArray[np.uint8]) -> tuple[NDArray, NDArray]:
+    """first non-blank byte and newline of every line, so indented records still
+    start with their keyword"""
+    newlines = np.flatnonzero(buf == _NEWLINE)
+    starts = np.concatenate(([0], newlines[:-1] + 1))
+    filled = np.flatnonzero(buf != _SPACE)
+    return filled[np.searchsorted(filled, starts)], newlines
+
+
+def _lines_with_prefix(
+    buf: NDArray[np.uint8], starts: NDArray, prefix: bytes
+) -> NDArray[np.bool_]:
+    mask = np.ones(len(starts), dtype=bool)
+    for i, char in enumerate(prefix):
+        mask &= buf[starts + i] == char
+    return mask
+
+
+def _select_lines(
+    buf: NDArray[np.uint8], starts: NDArray, ends: NDArray, mask: NDArray[np.bool_]
+) -> NDArray[np.uint8]:
+    """bytes of the masked lines, newlines included
+
+    Lines of one kind come in long runs in practice, so the runs are copied as
+    whole slices.
+    """
+    edges = np.flatnonzero(np.diff(mask.view(np.int8), prepend=0, append=0))
+    first, last = edges[::2], edges[1::2] - 1
+    return np.concatenate(
+        [buf[start : end + 1] for start, end in zip(starts[first], ends[last])]
+    )
+
+
+def _parse_records(
+    buf: NDArray[np.uint8],
+    starts: NDArray,
+    ends: NDArray,
+    mask: NDArray[np.bool_],
+    prefix: bytes,
+    width: int,
+) -> NDArray[np.float32]:
+    count = int(np.count_nonzero(mask))
+    if count == 0:
+        return np.empty((0, width), dtype=np.float32)
+    text = _select_lines(buf, starts, ends, mask).tobytes()
+    values = np.fromstring(text, dtype=np.float64, sep=" ")
+    if len(values) % count or len(values) // count < width:
+        raise ValueError(f"Malformed '{prefix.decode().strip()}' records in obj")
+    return values.reshape(count, -1)[:, :width].astype(np.float32)
+
+
+def _face_format(text: bytes) -> tuple[int, int, int]:
+    """column of the vertex, texture and normal index in a face corner (-1 if absent)"""
+    corner = text.split(None, 1)[0]
+    if b"//" in corner:
+        return 0, -1, 1
+    return {0: (0, -1, -1), 1: (0, 1, -1), 2: (0, 1, 2)}[corner.count(b"/")]
+
+
+def _resolve_indices(indices: NDArray, defined_before: NDArray) -> NDArray:
+    """obj indices are 1-based, negative ones count back from the last definition"""
+    return np.where(indices < 0, defined_before + indices, indices - 1)
+
+
 def parse_obj(
-    content: io.BytesIO,
+    content: io.BytesIO | bytes | memoryview | mmap.mmap,
 ) -> tuple[
-    list[tuple[float, float, float]],
-    list[tuple[float, float, float]],
-    list[tuple[float, float]],
-    list[int],
-    list[int],
-    list[int],
+    NDArray[np.float32],
+    NDArray[np.float32],
+    NDArray[np.float32],
+    NDArray[np.int64],
+    NDArray[np.int64],
+    NDArray[np.int64],
 ]:
-    coordinates = []
-    normals = []
-    textures = []
-    triangles = []
-    textures_ids = []
-    normals_ids = []
-
-    while line := content.readline():
-        if line.startswith(b"v "):
-            _, vx, vy, vz = line.split(b" ")
-            coordinates.append((float(vx), float(vy), float(vz)))
-        elif line.startswith(b"vn"):
-            _, nx, ny, nz = line.split(b" ")
-            normals.append((float(nx), float(ny), float(nz)))
-        elif line.startswith(b"vt"):
-            _, tx, ty = line.split(b" ")
-            textures.append((float(tx), float(ty)))
-        elif line.startswith(b"f "):
-            _, t1, t2, t3 = line.split(b" ")
-            for t in [t1, t2, t3]:
-                v, t, n = map(int, t.split(b"/"))
-                triangles.append(v - 1)
-                textures_ids.append(t - 1)
-                normals_ids.append(n - 1)
+    """parses an obj stream or buffer into numpy arrays in bulk
+
+    Faces with more than three corners are fan-triangulated. Index arrays hold one
+    entry per triangle corner; textures_ids/normals_ids are empty when the faces
+    do not reference texture coordinates/normals.
+    """
+    data = content.read() if hasattr(content, "read") else content
+    # trailing padding lets the prefix look-ahead run past the last line
+    buf = np.concatenate(
+        (np.frombuffer(data, dtype=np.uint8), np.frombuffer(b"\n   ", np.uint8))
+    )
+    buf[(buf == ord("\t")) | (buf == ord("\r"))] = _SPACE
+    starts, ends = _line_bounds(buf)
+
+    is_vertex = _lines_with_prefix(buf, starts, b"v ")
+    is_texture = _lines_with_prefix(buf, starts, b"vt ")
+    is_normal = _lines_with_prefix(buf, starts, b"vn ")
+    is_face = _lines_with_prefix(buf, starts, b"f ")
+
+    # keywords are blanked so the selected lines parse as plain numbers
+    for mask, prefix in ((is_vertex, b"v"), (is_texture, b"vt"), (is_normal, b"vn")):
+        for i in range(len(prefix)):
+            buf[starts[mask] + i] = _SPACE
+    buf[starts[is_face]] = _SPACE
 
+    coordinates = _parse_records(buf, starts, ends, is_vertex, b"v ", 3)
+    textures = _parse_records(buf, starts, ends, is_texture, b"vt ", 2)
+    normals = _parse_records(buf, starts, ends, is_normal, b"vn ", 3)
+
+    empty = np.empty(0, dtype=np.int64)
+    if not is_face.any():
+        return coordinates, normals, textures, empty, empty, empty
+
+    face_bytes = _select_lines(buf, starts, ends, is_face)
+    columns = _face_format(face_bytes.tobytes())
+    width = sum(column >= 0 for column in columns)
+
+    is_blank = (face_bytes == _SPACE) | (face_bytes == _NEWLINE)
+    token_starts = np.flatnonzero(~is_blank & np.concatenate(([True], is_blank[:-1])))
+    token_lines = np.searchsorted(np.flatnonzero(face_bytes == _NEWLINE), token_starts)
+    corners_per_face = np.bincount(token_lines, minlength=int(is_face.sum()))
+
+    face_bytes[face_bytes == _SLASH] = _SPACE
+    values = np.fromstring(face_bytes.tobytes(), dtype=np.int64, sep=" ")
+    if len(values) != len(token_starts) * width:
+        raise ValueError("Malformed 'f' records in obj, mixed face formats?")
+    values = values.reshape(-1, width)
+
+    face_lines = np.flatnonzero(is_face)
+    corner_face = np.repeat(np.arange(len(face_lines)), corners_per_face)
+    resolved = []
+    for column, is_defined in zip(columns, (is_vertex, is_texture, is_normal)):
+        if column < 0:
+            resolved.append(None)
+            continue
+        indices = values[:, column]
+        if indices.min() < 0:
+            defined_before = np.cumsum(is_defined)[face_lines][corner_face]
+            indices = _resolve_indices(indices, defined_before)
+        else:
+            indices = indices - 1
+        resolved.append(indices)
+
+    triangles_per_face = np.maximum(corners_per_face - 2, 0)
+    first_corner = np.cumsum(corners_per_face) - corners_per_face
+    triangle_face = np.repeat(np.arange(len(face_lines)), triangles_per_face)
+    fan_step = np.arange(len(triangle_face)) - np.repeat(
+        np.cumsum(triangles_per_face) - triangles_per_face, triangles_per_face
+    )
+    fan_root = first_corner[triangle_face]
+    corners = np.stack(
+        (fan_root, fan_root + fan_step + 1, fan_root + fan_step + 2), axis=1
+    ).ravel()
+
+    triangles, textures_ids, normals_ids = (
+        empty if indices is None else indices[corners] for indices in resolved
+    )
     return coordinates, normals, textures, triangles, textures_ids, normals_ids
 
 
 def form_vertices(
-    coordinates: list[tuple[float, float, float]], triangles: list[int]
+    coordinates: NDArray | list[tuple[float, ...]], triangles: NDArray | list[int]
 ) -> NDArray:
-    allTriangles = []
-    for t in range(0, len(triangles), 3):
-        allTriangles.extend(
-            [
-                coordinates[triangles[t]],
-                coordinates[triangles[t + 1]],
-                coordinates[triangles[t + 2]],
-            ]
+    return np.asarray(coordinates, dtype=np.float32)[np.asarray(triangles, np.intp)]
+
+
+def index_vertices(*corner_ids: NDArray) -> tuple[NDArray, NDArray]:
+    """deduplicates triangle corners that reference the same attribute indices
+
+    Takes one index array per attribute (empty arrays are ignored) and returns
+    the first corner of every unique vertex, in order of first use, together
+    with the element indices into those vertices, both empty without corners
+    (an obj without faces).
+    """
+    ids = [np.asarray(i, dtype=np.int64) for i in corner_ids if len(i)]
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16)
+    key = ids[0]
+    for i in ids[1:]:
+        key = key * (int(i.max()) + 1) + i
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    indices = rank[inverse.ravel()]
+    return first[order], indices.astype(index_dtype(len(first)))
+
+
+def index_dtype(vertex_count: int) -> type[np.unsignedinteger]:
+    return np.uint16 if vertex_count <= np.iinfo(np.uint16).max else np.uint32
+
+
+def load_obj_arrays(
+    content: io.BytesIO | bytes,
+    normals: str | None = "smooth",
+    crease_angle: float = normal_generation.DEFAULT_CREASE_ANGLE,
+    tangents: bool = True,
+) -> dict[str, NDArray]:
+    """gpu ready, indexed vertex arrays of an obj file
+
+    Keys are vertices, indices, vertex_normals and, when the file has texture
+    coordinates, vertex_textures and vertex_tangents. Files without normals
+    get smooth or flat ones (see core.normals), normals=None leaves them out.
+    """
+    coordinates, normal_table, textures, triangles, textures_ids, normals_ids = (
+        parse_obj(content)
+    )
+    if not len(normals_ids) and normals and len(triangles):
+        normal_table, normals_ids = normal_generation.generate_normals(
+            coordinates, triangles, normals, crease_angle
         )
-    return np.array(allTriangles, np.float32)
+    with_tangents = tangents and len(textures_ids) and len(normals_ids)
+    handedness = (
+        normal_generation.corner_handedness(textures, textures_ids)
+        if with_tangents
+        else []
+    )
+    first_corners, indices = index_vertices(
+        triangles, textures_ids, normals_ids, handedness
+    )
+    arrays = {
+        "vertices": form_vertices(coordinates, triangles[first_corners]),
+        "indices": indices,
+    }
+    if len(normals_ids):
+        arrays["vertex_normals"] = form_vertices(
+            normal_table, normals_ids[first_corners]
+        )
+    if len(textures_ids):
+        arrays["vertex_textures"] = form_vertices(textures, textures_ids[first_corners])
+    if with_tangents:
+        arrays["vertex_tangents"] = normal_generation.vertex_tangents(
+            arrays["vertices"],
+            arrays["vertex_normals"],
+            arrays["vertex_textures"],
+            indices,
+        )
+    return arrays
+
+
+def bounding_volumes(vertices: NDArray) -> tuple[NDArray, NDArray, NDArray, float]:
+    """aabb min, aabb max, bounding sphere center and radius of a point set"""
+    vertices = np.asarray(vertices, dtype=np.float32)
+    if len(vertices) == 0:
+        zero = np.zeros(3, dtype=np.float32)
+        return zero, zero, zero, 0.0
+    aabb_min = vertices.min(axis=0)
+    aabb_max = vertices.max(axis=0)
+    center = (aabb_min + aabb_max) / 2
+    radius = float(np.sqrt(((vertices - center) ** 2).sum(axis=1).max()))
+    return aabb_min, aabb_max, center, radius
@@ -3,10 +3,11 @@ from OpenGL.GL import *
 from core.camera import Camera
 from core.light import Light
 from core.shader import Shader
-from core.mesh import Axes, Mesh
+from core.mesh import Axes, Cube, Mesh
 from core.transformations import Rotation
 from core.screen import Screen
 from core.game_loop import GameLoop
+from core.asset_loader import AssetLoader
 from core.camera import Camera
 
 
@@ -14,8 +15,8 @@ class SimpleExample:
     def __init__(self) -> None:
         self.camera = Camera(800, 600)
         self.screen = Screen(0, 0, 800, 600, self.camera)
-        self.plane = None
         self.shader = None
+        self.loader = AssetLoader()
 
     def initialize(self):
         self.shader = Shader.from_file(
@@ -48,34 +49,38 @@ class SimpleExample:
             pygame.Vector3(0, 0, 0), color=pygame.Vector3(1, 1, 1), light_number=1
         )
 
-        self.plane = Mesh.from_file(
+        self.screen.add_light(self.light)
+        self.screen.add_light(self.light2)
+        self.screen.add_object(self.axes)
+        # both meshes stream in, the donut spins as a cube until it is ready
+        self.loader.load_mesh(
             "models/plane.obj",
-            pygame.image.load("images/crate.png"),
-            translation=pygame.Vector3(0, 0, 0),
+            "images/crate.png",
+            screen=self.screen,
             shader=self.shader,
+            translation=pygame.Vector3(0, 0, 0),
             scale=pygame.Vector3(2, 2, 2),
         )
-
-        self.donut = Mesh.from_file(
+        placeholder = Cube(self.axes_mat)
+        self.loader.load_mesh(
             "models/donut.obj",
+            screen=self.screen,
+            placeholder=placeholder,
             shader=self.shader,
             translation=pygame.Vector3(0, 0, 0),
             scale=pygame.Vector3(2, 2, 2),
         )
-        self.donut.add_lights([self.light, self.light2])
-        self.donut.rotate(Rotation(0.5, pygame.Vector3(0.5, 1, 0.5)))
-        self.screen.add_object(self.donut)
-        self.screen.add_object(self.axes)
-        self.screen.add_object(self.plane)
+        placeholder.rotate(Rotation(30, pygame.Vector3(0.5, 1, 0.5)))
 
-    def display(self):
-        self.shader.use()
-        self.screen.display_objects()
+    def display(self, alpha: float):
+        self.loader.update()
+        self.screen.display_objects(alpha)
 
 
 if __name__ == "__main__":
     game = SimpleExample()
     game.initialize()
     game_loop = GameLoop(60)
-    game_loop.register_display_function(game.display)
+    game_loop.register_update_function(game.screen.update_objects)
+    game_loop.register_render_function(game.display)
     game_loop.run()
@@ -0,0 +1,41 @@
+#version 330 core
+in vec3 position;
+layout(std140) uniform FrameData {
+    mat4 projection_mat;
+    mat4 view_mat;
+    mat4 inv_view_mat;
+    vec4 camera_position;
+};
+uniform mat4 model_mat;
+uniform mat4 mvp_mat;
+uniform mat3 normal_mat;
+in vec3 vertex_color;
+in vec3 vertex_normal;
+in vec2 vertex_uv;
+#ifdef TEXTURE_ARRAY
+in float vertex_layer;
+flat out float layer;
+#endif
+in mat4 instance_model;
+in mat3 instance_normal;
+in vec4 instance_tint;
+out vec3 color;
+out vec3 normal;
+out vec3 fragpos;
+out vec3 view_pos;
+out vec2 uv;
+void main() {
+
+    vec4 instance_pos = instance_model * vec4(position, 1.0);
+    view_pos = camera_position.xyz;
+    gl_Position = mvp_mat * instance_pos;
+    normal = normal_mat * instance_normal * vertex_normal;
+    fragpos = vec3(model_mat * instance_pos);
+
+    color = vertex_color * instance_tint.rgb;
+    uv = vertex_uv;
+#ifdef TEXTURE_ARRAY
+    layer = vertex_layer;
+#endif
+
+}
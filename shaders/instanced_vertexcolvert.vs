@@ -0,0 +1,18 @@
+#version 330 core
+in vec3 position;
+in vec3 vertex_color;
+in mat4 instance_model;
+in vec4 instance_tint;
+layout(std140) uniform FrameData {
+    mat4 projection_mat;
+    mat4 view_mat;
+    mat4 inv_view_mat;
+    vec4 camera_position;
+};
+uniform mat4 mvp_mat;
+out vec3 color;
+
+void main() {
+    gl_Position = mvp_mat * instance_model * vec4(position, 1.0);
+    color = vertex_color * instance_tint.rgb;
+}
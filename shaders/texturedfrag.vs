@@ -4,25 +4,55 @@ in vec3 normal;
 in vec3 fragpos;
 in vec3 view_pos;
 in vec2 uv;
+#ifdef TEXTURE_ARRAY
+flat in float layer;
+uniform sampler2DArray tex;
+#else
 uniform sampler2D tex;
+#endif
 out vec4 FragColor;
 
-struct Light {
-    vec3 position;
-    vec3 color;
+layout(std140) uniform FrameData {
+    mat4 projection_mat;
+    mat4 view_mat;
+    mat4 inv_view_mat;
+    vec4 camera_position;
 };
 
-#define NUM_LIGHTS 2
-uniform Light light_data[NUM_LIGHTS];
+// lights binned into view frustum clusters, see core/light_clusters.py
+layout(std140) uniform ClusterData {
+    ivec4 grid_size;  // tiles x, tiles y, depth slices, light count
+    vec4 slicing;  // slice = log(depth) * x + y, tile width and height in pixels
+};
+uniform samplerBuffer cluster_lights;  // position and radius, color
+uniform usamplerBuffer cluster_grid;  // offset and count into cluster_indices
+uniform usamplerBuffer cluster_indices;
+
+int ClusterIndex(vec3 fragpos) {
+    ivec2 tile = min(ivec2(gl_FragCoord.xy / slicing.zw), grid_size.xy - 1);
+    float depth = -(view_mat * vec4(fragpos, 1.0)).z;
+    int slice = int(floor(log(max(depth, 1e-6)) * slicing.x + slicing.y));
+    slice = clamp(slice, 0, grid_size.z - 1);
+    return (slice * grid_size.y + tile.y) * grid_size.x + tile.x;
+}
+
+vec4 CreateLight(vec4 light_pos, vec3 light_color, vec3 normal, vec3 fragpos, vec3 view_dir) {
+    //fades to 0 at the radius, lights without one (0) reach everything
+    float radius = light_pos.w;
+    float falloff = 1.0;
+    if (radius > 0.0) {
+        float reach = clamp(1.0 - pow(length(light_pos.xyz - fragpos) / radius, 4.0), 0.0, 1.0);
+        falloff = reach * reach;
+    }
+    light_color *= falloff;
 
-vec4 CreateLight(vec3 light_pos, vec3 light_color, vec3 normal, vec3 fragpos, vec3 view_dir) {
     //ambient
     float a_stength = 0.1;
     vec3 ambient = light_color * a_stength;
 
     //diffuse
     vec3 norm = normalize(normal);
-    vec3 light_dir = normalize(light_pos - fragpos);
+    vec3 light_dir = normalize(light_pos.xyz - fragpos);
     float diff = max(dot(norm, light_dir), 0.0);
     vec3 diffuse = light_color * diff;
 
@@ -40,9 +70,20 @@ void main() {
 
     vec3 view_dir = normalize(view_pos - fragpos);
 
-    for (int i = 0; i < NUM_LIGHTS; i++) {
-        FragColor += CreateLight(light_data[i].position, light_data[i].color, normal, fragpos, view_dir);
+    FragColor = vec4(0.0);
+    uvec2 cluster = texelFetch(cluster_grid, ClusterIndex(fragpos)).xy;
+    for (uint i = cluster.x; i < cluster.x + cluster.y; i++) {
+        int light = int(texelFetch(cluster_indices, int(i)).x);
+        vec4 light_pos = texelFetch(cluster_lights, 2 * light);
+        vec3 light_color = texelFetch(cluster_lights, 2 * light + 1).rgb;
+        FragColor += CreateLight(light_pos, light_color, normal, fragpos, view_dir);
     }
+    // opaque also where no light reaches, the alpha comes from the texture
+    FragColor.a = 1.0;
+#ifdef TEXTURE_ARRAY
+    FragColor = FragColor * texture(tex, vec3(uv, layer));
+#else
     FragColor = FragColor * texture(tex, uv);
+#endif
 
 }
@@ -1,12 +1,16 @@
 #version 330 core
 in vec3 position;
 in vec3 vertex_color;
-uniform mat4 projection_mat;
-uniform mat4 model_mat;
-uniform mat4 view_mat;
+layout(std140) uniform FrameData {
+    mat4 projection_mat;
+    mat4 view_mat;
+    mat4 inv_view_mat;
+    vec4 camera_position;
+};
+uniform mat4 mvp_mat;
 out vec3 color;
 
 void main() {
-    gl_Position = projection_mat * inverse(view_mat) * model_mat * vec4(position, 1.0);
+    gl_Position = mvp_mat * vec4(position, 1.0);
     color = vertex_color;
 }
\ No newline at end of file
@@ -0,0 +1,87 @@
+import numpy as np
+from core.light_clusters import assign_lights, depth_slicing
+
+TILES = (16, 9)
+SLICES = 24
+DEPTH_RANGE = (1.0, 100.0)
+rng = np.random.default_rng(3)
+
+
+def perspective(aspect: float, fov: float, near: float, far: float) -> np.ndarray:
+    d = 1 / np.tan(np.radians(fov) / 2)
+    return np.array(
+        [
+            [d / aspect, 0, 0, 0],
+            [0, d, 0, 0],
+            [0, 0, (near + far) / (near - far), 2 * near * far / (near - far)],
+            [0, 0, -1, 0],
+        ]
+    )
+
+
+def cluster_index(points: np.ndarray, projection: np.ndarray) -> np.ndarray:
+    """cluster of view space points, computed like ClusterIndex in
+    shaders/texturedfrag.vs"""
+    tiles_x, tiles_y = TILES
+    depth = -points[:, 2]
+    ndc = points[:, :2] * projection[[0, 1], [0, 1]] / depth[:, None]
+    tile = np.floor((ndc + 1) / 2 * TILES).astype(np.int64)
+    tile = np.minimum(tile, np.array(TILES) - 1)
+    scale, bias = depth_slicing(SLICES, *DEPTH_RANGE)
+    slice_ = np.floor(np.log(np.maximum(depth, 1e-6)) * scale + bias)
+    slice_ = np.clip(slice_, 0, SLICES - 1).astype(np.int64)
+    return (slice_ * tiles_y + tile[:, 1]) * tiles_x + tile[:, 0]
+
+
+def visible_points(count: int, projection: np.ndarray) -> np.ndarray:
+    """view space points spread over the frustum up to past its far slice"""
+    depth = np.exp(rng.uniform(np.log(0.2), np.log(150), count))
+    ndc = rng.uniform(-1, 1, (count, 2))
+    xy = ndc * depth[:, None] / projection[[0, 1], [0, 1]]
+    return np.column_stack([xy, -depth])
+
+
+def test_every_point_lists_the_lights_reaching_it():
+    projection = perspective(16 / 9, 60, 0.1, 1000)
+    count = 120
+    centers = rng.uniform((-40, -25, -110), (40, 25, 5), (count, 3))
+    radii = rng.uniform(0.2, 12, count)
+    radii[:2] = np.inf
+    grid, indices = assign_lights(
+        centers, radii, projection, TILES, SLICES, DEPTH_RANGE
+    )
+    assert grid.shape == (TILES[0] * TILES[1] * SLICES, 2)
+    assert grid[:, 1].sum() == len(indices)
+
+    # points near the lights, where tile and slice borders cut their spheres
+    near_lights = centers.repeat(200, axis=0) + rng.normal(
+        scale=np.repeat(np.minimum(radii, 20), 200)[:, None], size=(count * 200, 3)
+    )
+    near_lights = near_lights[near_lights[:, 2] < -0.2]
+    inside = (
+        np.abs(near_lights[:, :2] * projection[[0, 1], [0, 1]]) < -near_lights[:, 2:]
+    )
+    points = np.concatenate(
+        [near_lights[inside.all(axis=1)], visible_points(20000, projection)]
+    )
+    clusters = cluster_index(points, projection)
+
+    distances = np.linalg.norm(points[:, None] - centers[None], axis=2)
+    reached = distances <= radii
+    # the unbounded lights reach everything, most checks are of bounded ones
+    assert reached[:, 2:].sum() > 10000
+    for point, cluster in enumerate(clusters):
+        offset, length = grid[cluster]
+        listed = set(indices[offset : offset + length].tolist())
+        lights = np.flatnonzero(reached[point])
+        assert set(lights.tolist()) <= listed, (points[point], cluster)
+
+
+def test_lights_behind_the_camera_are_not_listed():
+    projection = perspective(1, 90, 0.1, 1000)
+    centers = np.array([[0, 0, 5.0], [0, 0, -5.0]])
+    grid, indices = assign_lights(
+        centers, [1.0, 1.0], projection, TILES, SLICES, DEPTH_RANGE
+    )
+    assert set(indices.tolist()) == {1}
+    assert grid[:, 1].max() == 1
@@ -0,0 +1,104 @@
+import numpy as np
+from core.normals import smooth_normals
+from core.utils import load_obj_arrays
+
+# unit cube, counter-clockwise faces seen from outside
+CUBE = b"""v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+f 1 4 3 2
+f 5 6 7 8
+f 1 2 6 5
+f 4 8 7 3
+f 1 5 8 4
+f 2 3 7 6
+"""
+
+
+def quad(last_uv: bytes) -> bytes:
+    """two triangles sharing the 1-3 diagonal and its uvs"""
+    return (
+        b"v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+        b"vt 0 0\nvt 1 0\nvt 1 1\nvt " + last_uv + b"\n"
+        b"f 1/1 2/2 3/3\nf 1/1 3/3 4/4\n"
+    )
+
+
+def corner_face_normals(arrays: dict) -> np.ndarray:
+    triangles = arrays["vertices"][arrays["indices"].astype(np.intp)].reshape(-1, 3, 3)
+    normals = np.cross(
+        triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    )
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.repeat(normals, 3, axis=0)
+
+
+def test_cube_gets_exact_face_normals_and_24_vertices():
+    arrays = load_obj_arrays(CUBE)
+    assert len(arrays["vertices"]) == 24
+    assert len(arrays["indices"]) == 36
+    normals = arrays["vertex_normals"]
+    np.testing.assert_allclose(
+        normals[arrays["indices"].astype(np.intp)],
+        corner_face_normals(arrays),
+        atol=1e-6,
+    )
+    # axis aligned: one component is exactly +-1, the others exactly 0
+    assert np.array_equal(np.sort(np.abs(normals), axis=1), np.tile([0, 0, 1], (24, 1)))
+
+
+def test_cube_without_creases_shares_its_corners():
+    arrays = load_obj_arrays(CUBE, crease_angle=180)
+    assert len(arrays["vertices"]) == 8
+    outward = arrays["vertices"] - 0.5
+    outward /= np.linalg.norm(outward, axis=1, keepdims=True)
+    np.testing.assert_allclose(arrays["vertex_normals"], outward, atol=1e-6)
+
+
+def test_flat_normals_split_every_triangle():
+    arrays = load_obj_arrays(CUBE, normals="flat")
+    assert len(arrays["vertices"]) == 36
+    np.testing.assert_allclose(
+        arrays["vertex_normals"][arrays["indices"].astype(np.intp)],
+        corner_face_normals(arrays),
+        atol=1e-6,
+    )
+
+
+def test_gentle_angles_stay_smooth():
+    # a roof ridge of 2 x 20 degrees, under the default crease angle
+    height = np.tan(np.radians(20))
+    coordinates = np.array(
+        [[0, 0, 0], [1, height, 0], [2, 0, 0], [0, 0, -1], [1, height, -1], [2, 0, -1]]
+    )
+    triangles = np.array([0, 1, 4, 0, 4, 3, 1, 2, 5, 1, 5, 4])
+    normals, normals_ids = smooth_normals(coordinates, triangles)
+    ridge = normals[normals_ids[triangles == 1]]
+    np.testing.assert_allclose(ridge, np.tile([0, 1, 0], (len(ridge), 1)), atol=1e-6)
+
+
+def test_mirrored_uvs_do_not_share_vertices():
+    arrays = load_obj_arrays(quad(b"1 0"))  # second triangle's uvs run clockwise
+    first, second = arrays["indices"].astype(np.intp).reshape(2, 3)
+    assert len(arrays["vertices"]) == 6
+    assert not set(first) & set(second)
+    tangents = arrays["vertex_tangents"]
+    np.testing.assert_allclose(
+        tangents[first], np.tile([1, 0, 0, 1], (3, 1)), atol=1e-6
+    )
+    np.testing.assert_allclose(
+        tangents[second], np.tile([0, 1, 0, -1], (3, 1)), atol=1e-6
+    )
+
+
+def test_regular_uvs_share_the_diagonal():
+    arrays = load_obj_arrays(quad(b"0 1"))
+    assert len(arrays["vertices"]) == 4
+    np.testing.assert_allclose(
+        arrays["vertex_tangents"], np.tile([1, 0, 0, 1], (4, 1)), atol=1e-6
+    )
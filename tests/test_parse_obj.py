@@ -0,0 +1,64 @@
+import numpy as np
+from core.utils import parse_obj
+
+SQUARE = b"v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+
+
+def test_quads_and_ngons_are_fan_triangulated():
+    obj = SQUARE + b"v 0.5 2 0\nf 1 2 3 4\nf 1 2 3 5 4\nf 1 2 3\n"
+    triangles = parse_obj(obj)[3]
+    assert triangles.tolist() == [
+        *(0, 1, 2, 0, 2, 3),
+        *(0, 1, 2, 0, 2, 4, 0, 4, 3),
+        *(0, 1, 2),
+    ]
+
+
+def test_negative_indices_count_back_from_the_last_definition():
+    obj = SQUARE + b"f -4 -3 -2\nv 2 2 2\nf -1 -2 -3\n"
+    assert parse_obj(obj)[3].tolist() == [0, 1, 2, 4, 3, 2]
+
+
+def test_vertex_and_normal_faces():
+    obj = SQUARE + b"vn 0 0 1\nvn 0 0 -1\nf 1//2 2//2 3//1\n"
+    coordinates, normals, textures, triangles, textures_ids, normals_ids = parse_obj(
+        obj
+    )
+    assert triangles.tolist() == [0, 1, 2]
+    assert normals_ids.tolist() == [1, 1, 0]
+    assert normals.tolist() == [[0, 0, 1], [0, 0, -1]]
+    assert len(textures) == 0 and len(textures_ids) == 0
+
+
+def test_vertex_texture_normal_faces():
+    obj = SQUARE + b"vt 0 0\nvt 1 1\nvn 0 0 1\nf 1/1/1 2/2/1 3/1/1\n"
+    _, _, textures, triangles, textures_ids, normals_ids = parse_obj(obj)
+    assert triangles.tolist() == [0, 1, 2]
+    assert textures_ids.tolist() == [0, 1, 0]
+    assert normals_ids.tolist() == [0, 0, 0]
+    assert textures.tolist() == [[0, 0], [1, 1]]
+
+
+def test_vertex_only_faces_have_no_attribute_ids():
+    _, _, _, triangles, textures_ids, normals_ids = parse_obj(SQUARE + b"f 1 2 3\n")
+    assert triangles.tolist() == [0, 1, 2]
+    assert len(textures_ids) == 0 and len(normals_ids) == 0
+
+
+def test_repeated_spaces_tabs_and_crlf():
+    obj = b"v  0 0\t0\r\nv 1   0 0\r\nv 1 1 0  \r\n# comment\r\n\r\nf  1  2\t3 \r\n"
+    coordinates, _, _, triangles, _, _ = parse_obj(obj)
+    np.testing.assert_array_equal(coordinates, [[0, 0, 0], [1, 0, 0], [1, 1, 0]])
+    assert triangles.tolist() == [0, 1, 2]
+
+
+def test_indented_records_are_not_dropped():
+    obj = b"v 0 0 0\n  v 1 0 0\n\tv 1 1 0\nv 0 1 0\n  f 1 2 3\nf 2 3 4\n"
+    coordinates, _, _, triangles, _, _ = parse_obj(obj)
+    assert coordinates.tolist() == [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+    assert triangles.tolist() == [0, 1, 2, 1, 2, 3]
+
+
+def test_file_without_faces():
+    coordinates, _, _, triangles, _, _ = parse_obj(SQUARE)
+    assert len(coordinates) == 4 and len(triangles) == 0
@@ -0,0 +1,24 @@
+import types
+from core.render_queue import RenderQueue
+
+
+def fake_mesh(program: int, texture: int, vao: int, blended: bool = False):
+    return types.SimpleNamespace(state_key=(program, texture, vao), blended=blended)
+
+
+def test_opaque_items_sharing_program_and_texture_come_nearest_first():
+    queue = RenderQueue()
+    # vaos in creation order, depths in the opposite order
+    for vao, depth in enumerate((9.0, 1.0, 5.0, 3.0)):
+        queue.submit(fake_mesh(1, 7, vao), depth)
+    queue.submit(fake_mesh(2, 7, 10), 0.5)
+    items = queue.sorted_items()
+    assert [item.depth for item in items] == [1.0, 3.0, 5.0, 9.0, 0.5]
+
+
+def test_blended_items_come_last_farthest_first():
+    queue = RenderQueue()
+    queue.submit(fake_mesh(1, 0, 0, blended=True), 2.0)
+    queue.submit(fake_mesh(1, 0, 1, blended=True), 8.0)
+    queue.submit(fake_mesh(1, 0, 2), 4.0)
+    assert [item.depth for item in queue.sorted_items()] == [4.0, 8.0, 2.0]
@@ -0,0 +1,150 @@
+import numpy as np
+import pygame
+import core.transformations as transform
+from core.transform_component import Transform
+
+rng = np.random.default_rng(7)
+
+
+def random_transforms(count: int):
+    translations = rng.uniform(-10, 10, (count, 3))
+    axes = [pygame.Vector3(*rng.normal(size=3)) for _ in range(count)]
+    angles = rng.uniform(-360, 360, count)
+    scales = rng.uniform(0.1, 4, (count, 3))
+    return translations, axes, angles, scales
+
+
+def reference_matrix(translation, axis, angle, scale) -> np.ndarray:
+    return (
+        transform.translate_matrix(pygame.Vector3(*translation))
+        @ transform.rotate_axis_matrix(angle, axis)
+        @ transform.scale_matrix(pygame.Vector3(*scale))
+    )
+
+
+def rotation_matrices(quaternions: np.ndarray) -> np.ndarray:
+    count = len(quaternions)
+    return transform.compose_matrices(
+        np.zeros((count, 3)), quaternions, np.ones((count, 3))
+    )[:, :3, :3]
+
+
+def test_compose_matrices_matches_the_matrix_product():
+    translations, axes, angles, scales = random_transforms(64)
+    rotations = transform.axis_angle_quaternions(np.array(axes), angles)
+    expected = np.array(
+        [
+            reference_matrix(t, axis, angle, s)
+            for t, axis, angle, s in zip(translations, axes, angles, scales)
+        ]
+    )
+    np.testing.assert_allclose(
+        transform.compose_matrices(translations, rotations, scales),
+        expected,
+        atol=1e-5,
+    )
+
+
+def test_compose_matrices_overwrites_every_cell_of_out():
+    translations, axes, angles, scales = random_transforms(16)
+    rotations = transform.axis_angle_quaternions(np.array(axes), angles)
+    out = np.full((16, 4, 4), np.nan, dtype=np.float32)
+    result = transform.compose_matrices(translations, rotations, scales, out=out)
+    assert result is out
+    np.testing.assert_allclose(
+        out, transform.compose_matrices(translations, rotations, scales), atol=1e-6
+    )
+    # stale values from an earlier call must not leak into the next one
+    transform.compose_matrices(translations[::-1], rotations[::-1], scales[::-1], out)
+    np.testing.assert_allclose(
+        out,
+        transform.compose_matrices(translations[::-1], rotations[::-1], scales[::-1]),
+        atol=1e-6,
+    )
+
+
+def test_compose_matrix_matches_compose_matrices():
+    translations, axes, angles, scales = random_transforms(8)
+    rotations = transform.axis_angle_quaternions(np.array(axes), angles)
+    batched = transform.compose_matrices(translations, rotations, scales)
+    for i in range(8):
+        single = transform.compose_matrix(
+            pygame.Vector3(*translations[i]), rotations[i], pygame.Vector3(*scales[i])
+        )
+        np.testing.assert_allclose(single, batched[i], atol=1e-6)
+
+
+def test_multiply_quaternions_applies_b_then_a():
+    _, axes_a, angles_a, _ = random_transforms(32)
+    _, axes_b, angles_b, _ = random_transforms(32)
+    a = transform.axis_angle_quaternions(np.array(axes_a), angles_a)
+    b = transform.axis_angle_quaternions(np.array(axes_b), angles_b)
+    product = transform.multiply_quaternions(a, b)
+    np.testing.assert_allclose(
+        rotation_matrices(product),
+        rotation_matrices(a) @ rotation_matrices(b),
+        atol=1e-5,
+    )
+    for i in range(4):
+        np.testing.assert_allclose(
+            transform.multiply_quaternions(a[i], b[i]), product[i], atol=1e-12
+        )
+
+
+def test_multiply_quaternions_may_write_into_an_input():
+    a = transform.axis_angle_quaternions(np.array([[0.0, 1, 0], [1, 0, 0]]), [30, 60])
+    b = transform.axis_angle_quaternions(np.array([[1.0, 0, 0], [0, 0, 1]]), [45, 90])
+    expected = transform.multiply_quaternions(a, b)
+    transform.multiply_quaternions(a, b, out=a)
+    np.testing.assert_allclose(a, expected)
+
+
+def test_slerp_quaternions_ends_and_midpoint():
+    axis = np.array([0.3, -0.5, 0.8])
+    a = transform.axis_angle_quaternions(axis, 10.0)
+    b = transform.axis_angle_quaternions(axis, 70.0)
+    np.testing.assert_allclose(transform.slerp_quaternions(a, b, 0.0), a, atol=1e-12)
+    np.testing.assert_allclose(transform.slerp_quaternions(a, b, 1.0), b, atol=1e-12)
+    middle = transform.axis_angle_quaternions(axis, 40.0)
+    np.testing.assert_allclose(
+        transform.slerp_quaternions(a, b, 0.5), middle, atol=1e-12
+    )
+    # -b is the same rotation, the shorter arc gives the same result
+    np.testing.assert_allclose(
+        transform.slerp_quaternions(a, -b, 0.5), middle, atol=1e-12
+    )
+
+
+def test_slerp_quaternions_batched_matches_single():
+    _, axes_a, angles_a, _ = random_transforms(16)
+    _, axes_b, angles_b, _ = random_transforms(16)
+    a = transform.axis_angle_quaternions(np.array(axes_a), angles_a)
+    b = transform.axis_angle_quaternions(np.array(axes_b), angles_b)
+    t = rng.uniform(0, 1, 16)
+    batched = transform.slerp_quaternions(a, b, t)
+    np.testing.assert_allclose(np.linalg.norm(batched, axis=1), 1.0, atol=1e-12)
+    for i in range(16):
+        np.testing.assert_allclose(
+            transform.slerp_quaternions(a[i], b[i], float(t[i])), batched[i], atol=1e-9
+        )
+    # nearly equal rotations take the lerp path without dividing by ~0
+    close = transform.slerp_quaternions(a, a + 1e-9, 0.5)
+    np.testing.assert_allclose(close, a, atol=1e-8)
+
+
+def test_transform_rotate_matches_the_old_matrix_product():
+    translation = pygame.Vector3(1, -2, 3)
+    scale = pygame.Vector3(2, 0.5, 1.5)
+    turns = [
+        transform.Rotation(30, pygame.Vector3(0, 1, 0)),
+        transform.Rotation(-75, pygame.Vector3(1, 1, 0)),
+        transform.Rotation(120, pygame.Vector3(0.2, -0.4, 1)),
+    ]
+    matrix = transform.translate_matrix(translation)
+    moved = Transform(translation)
+    for turn in turns:
+        matrix = transform.rotateA(matrix, turn.angle, turn.axis)
+        moved.rotate(turn)
+    matrix = transform.do_scale(matrix, scale)
+    moved.set_scale(scale)
+    np.testing.assert_allclose(moved.matrix, matrix, atol=1e-5)